@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import sys
 import time
 import threading
 import collections
 from enum import Enum
 import numpy as np
-from scipy.signal import butter, lfilter, lfilter_zi
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ToNTUT"))
+from sos_filter import RealTimeFilter
+from actuator_driver import ActuatorDriver
 
 # --- Matplotlib 設定 ---
 import matplotlib
@@ -51,6 +55,7 @@ running = True
 in1 = 23
 in2 = 24
 en = 25
+actuator = ActuatorDriver(in1, in2)
 
 # --- Parameters ---
 sampling_rate = 1.0 / 60.0  
@@ -65,18 +70,6 @@ success_threshold = 15
 fail_threshold = 50
 warmup_duration = 5.0
 
-# --- Filter Class ---
-class RealTimeFilter:
-    def __init__(self, order, cutoff, fs, initial_value=0.0):
-        nyquist = 0.5 * fs
-        normal_cutoff = cutoff / nyquist
-        self.b, self.a = butter(order, normal_cutoff, btype='low', analog=False)
-        self.zi = lfilter_zi(self.b, self.a) * initial_value
-    
-    def process(self, value):
-        filtered_value, self.zi = lfilter(self.b, self.a, [value], zi=self.zi)
-        return filtered_value[0]
-
 # --- Helper Functions ---
 def validate_stable(breath_times, target_breath_time):
     if len(breath_times) < sampling_window:
@@ -100,15 +93,7 @@ def validate_stable(breath_times, target_breath_time):
 def move_linear_actuator(direction):
     if not running: return
     try:
-        if direction == 1:
-            GPIO.output(in1, GPIO.HIGH)
-            GPIO.output(in2, GPIO.LOW)
-        elif direction == -1:
-            GPIO.output(in1, GPIO.LOW)
-            GPIO.output(in2, GPIO.HIGH)
-        else:
-            GPIO.output(in1, GPIO.LOW)
-            GPIO.output(in2, GPIO.LOW)
+        actuator.move(direction)  # 方向沒變時不寫 GPIO
     except Exception:
         pass
 
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import sys
 import time
 import numpy as np
 from enum import Enum
-from scipy.signal import butter, lfilter, lfilter_zi
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ToNTUT"))
+from sos_filter import RealTimeFilter
+from actuator_driver import ActuatorDriver
 
 # --- GPIO & Sensor Imports ---
 try:
@@ -35,6 +39,7 @@ class EvalState(Enum):
 in1 = 23
 in2 = 24
 en = 25
+actuator = ActuatorDriver(in1, in2)
 
 # --- Parameters ---
 sampling_rate = 1.0 / 60.0  
@@ -51,18 +56,6 @@ fail_threshold = 50
 warmup_duration = 5.0
 mirror_duration = 60.0
 
-# --- Filter Class ---
-class RealTimeFilter:
-    def __init__(self, order, cutoff, fs, initial_value=0.0):
-        nyquist = 0.5 * fs
-        normal_cutoff = cutoff / nyquist
-        self.b, self.a = butter(order, normal_cutoff, btype='low', analog=False)
-        self.zi = lfilter_zi(self.b, self.a) * initial_value
-    
-    def process(self, value):
-        filtered_value, self.zi = lfilter(self.b, self.a, [value], zi=self.zi)
-        return filtered_value[0]
-
 # --- Helper Functions ---
 def validate_stable(breath_times, target_breath_time):
     if len(breath_times) < sampling_window:
@@ -81,21 +74,14 @@ def validate_stable(breath_times, target_breath_time):
 # ★★★ 修改重點在此 ★★★
 def move_linear_actuator(direction):
     try:
+        actuator.move(direction)  # 方向沒變時不寫 GPIO
         if direction == 1:
-            GPIO.output(in1, GPIO.HIGH)
-            GPIO.output(in2, GPIO.LOW)
             # 馬達伸出 -> 對應吸氣 -> 通知 Unity
             print("ANIM:INHALE", flush=True) 
             
         elif direction == -1:
-            GPIO.output(in1, GPIO.LOW)
-            GPIO.output(in2, GPIO.HIGH)
             # 馬達縮回 -> 對應吐氣 -> 通知 Unity
             print("ANIM:EXHALE", flush=True)
-            
-        else:
-            GPIO.output(in1, GPIO.LOW)
-            GPIO.output(in2, GPIO.LOW)
     except Exception:
         pass
 
@@ -1,3 +1,4 @@
+import os
 import sys
 import time
 import csv
@@ -5,15 +6,12 @@ from enum import Enum
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from scipy.signal import butter, filtfilt
+from scipy.signal import filtfilt
 from matplotlib.ticker import MultipleLocator
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ToNTUT"))
+from filter_design import butter_lowpass
 
-def butter_lowpass(cutoff=2, fs=60, order=4):
-    nyquist = 0.5 * fs
-    normal_cutoff = cutoff / nyquist
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    return b, a
 
 def lowpass_filter(data, cutoff=2, fs=60, order=4):
     b, a = butter_lowpass(cutoff, fs, order=order)
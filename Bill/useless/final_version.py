@@ -1,12 +1,17 @@
 #!/usr/bin/env python
 
+import os
 import sys
 import time
 from enum import Enum
 import RPi.GPIO as GPIO
 from bmp280 import BMP280
 import numpy as np
-from scipy.signal import butter, filtfilt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ToNTUT"))
+from pressure_window import PressureWindow
+from breath_cycles import extract_breath_cycles
+from actuator_driver import ActuatorDriver
 
 try:
     from smbus2 import SMBus
@@ -30,6 +35,7 @@ class EvalState (Enum):
 in1 = 23
 in2 = 24
 en = 25
+actuator = ActuatorDriver(in1, in2)
 vibration_pin = 27
 vibrate_duty_cycle = 0
 
@@ -41,83 +47,54 @@ user_exhale_time = 0
 sampling_rate = 0.1 # 100ms 10Hz
 lowpass_fs = 60.0
 lowpass_cutoff = 2.0
+lowpass_order = 5
+pressure_window_size = 1200 # bounded history for zero-phase smoothing
 sampling_window = 4
 increase_breath_time = 0.5
 linear_actuator_max_distance = 50
 success_threshold = 15
 fail_threshold = 50
 
-def butter_lowpass(cutoff, fs, order=5):
-    nyquist = 0.5 * fs
-    normal_cutoff = cutoff / nyquist
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    return b, a
-
-def lowpass_filter(data, cutoff, fs, order=5):
-    b, a = butter_lowpass(cutoff, fs, order=order)
-    y = filtfilt(b, a, data)
-    return y
-
 def init_guide_phase(pressures):
-    filtered_pressures = lowpass_filter(pressures, lowpass_cutoff, lowpass_fs)
-    state = UserState["INHALE"]
-    filtered_breath_times = []
-    
-    count = 0
-    
+    filtered_pressures = pressures.smoothed()
+    cycles = extract_breath_cycles(filtered_pressures, sampling_rate)
+    filtered_breath_times = [round(float(t), 2) for t in cycles.durations]
+
     print("===== BREATH TIMES =====")
-    
-    for i in range(1, len(filtered_pressures)):
-        print("Pressure: ", pressures[i-1])
-        print("Filtered pressure: ", filtered_pressures[i-1])
-        if filtered_pressures[i] < filtered_pressures[i - 1]:
-            if state == UserState["INHALE"]:
-                state = UserState["EXHALE"]
-        elif filtered_pressures[i] > filtered_pressures[i - 1]:
-            if state == UserState["EXHALE"]:
-                state = UserState["INHALE"]
-                breath_time = float(count) * float(sampling_rate)
-                print("Breath time: ", breath_time.__round__(2))
-                filtered_breath_times.append(breath_time.__round__(2))
-                count = 0
-
-        count += 1
+    for breath_time in filtered_breath_times:
+        print("Breath time: ", breath_time)
 
     # use median as the breath time
     target_breath_time = np.median(filtered_breath_times)
 
     return target_breath_time
 
+# 因果濾波值：與原本「整段 filtfilt 取最後一點」不同，會落後約 15 個樣本（濾波器以 60 Hz 設計，
+# 迴圈 10 Hz 時約 1.5 s），但沒有 filtfilt 末端的邊緣效應
 def real_time_lowpass_filter(pressures):
-    filtered_pressures = lowpass_filter(pressures, lowpass_cutoff, lowpass_fs)
-    return filtered_pressures[-1]
+    return pressures.latest
 
 def validate_stable(pressures, target_breath_time, validate_count, remove_count):
-    filtered_pressures = lowpass_filter(pressures, lowpass_cutoff, lowpass_fs)
-    state = UserState["INHALE"]
-    filtered_breath_times = []
-    
-    count = 0
-    pressure_index = [0]
+    filtered_pressures = pressures.smoothed()
     eval_state = EvalState["NONE"]
     next_target_breath_time = target_breath_time
 
-    print("===== BREATH TIMES =====")
+    cycles = extract_breath_cycles(filtered_pressures, sampling_rate)
+    filtered_breath_times = [round(float(t), 2) for t in cycles.durations]
+    pressure_index = [0] + cycles.onsets.tolist()
 
-    for i in range(1, len(filtered_pressures)):
-        if filtered_pressures[i] < filtered_pressures[i - 1]:
-            if state == UserState["INHALE"]:
-                state = UserState["EXHALE"]
-        elif filtered_pressures[i] > filtered_pressures[i - 1]:
-            if state == UserState["EXHALE"]:
-                state = UserState["INHALE"]
-                pressure_index.append(i)
-                breath_time = float(count) * float(sampling_rate)
-                print("Breath time: ", breath_time.__round__(2))
-                filtered_breath_times.append(breath_time.__round__(2))
-                count = 0 
-
-        count += 1
+    if pressures.evicted:
+        # 視窗滿了、最舊的樣本被自動丟掉：最前面的呼吸不完整，remove_count 也不再對應視窗開頭。
+        # 已經不在視窗裡的呼吸無法評估；切到最近 sampling_window 個完整呼吸的起點、重新對齊計數後再評估。
+        print("Pressure window evicted", pressures.evicted, "samples; realigning breath count")
+        if len(cycles.onsets) == 0:
+            return eval_state, validate_count, remove_count, pressures, next_target_breath_time
+        pressures.discard(cycles.onsets[max(0, len(cycles.onsets) - sampling_window - 1)])
+        return validate_stable(pressures, target_breath_time, validate_count, validate_count)
+
+    print("===== BREATH TIMES =====")
+    for breath_time in filtered_breath_times:
+        print("Breath time: ", breath_time)
 
     len_breath = len(filtered_breath_times) + remove_count - validate_count
 
@@ -129,7 +106,7 @@ def validate_stable(pressures, target_breath_time, validate_count, remove_count)
         end_idx = start_idx + sampling_window
         filtered_breath_times = filtered_breath_times[start_idx:end_idx]
         cutoff_index = pressure_index[start_idx]
-        pressures = pressures[cutoff_index:]
+        pressures.discard(cutoff_index)
         remove_count = validate_count
         validate_count += 1
 
@@ -146,17 +123,7 @@ def validate_stable(pressures, target_breath_time, validate_count, remove_count)
     return eval_state, validate_count, remove_count, pressures, next_target_breath_time
 
 def move_linear_actuator(direction):
-    if (direction == 1):
-        GPIO.output(in1, GPIO.HIGH)
-        GPIO.output(in2, GPIO.LOW)
-
-    elif (direction == -1):
-        GPIO.output(in1, GPIO.LOW)
-        GPIO.output(in2, GPIO.HIGH)
-
-    else:
-        GPIO.output(in1, GPIO.LOW)
-        GPIO.output(in2 ,GPIO.LOW)
+    actuator.move(direction)  # 方向沒變時不寫 GPIO
 
 def mirror_breathing(curr_pressure, prev_pressure, position, direction, vibration_pwm):
     global vibrate_duty_cycle
@@ -240,7 +207,7 @@ def main():
 
     # user state
     curr_pressure = 0
-    pressures = []
+    pressures = PressureWindow(lowpass_order, lowpass_cutoff, lowpass_fs, pressure_window_size)
     prev_filtered_pressure = 0
 
     user_state = -1
@@ -273,6 +240,7 @@ def main():
 
         elif (machine_state == MachineState["GUIDE"]):
             curr_state_count += sampling_rate
+            # 注意：real_time_lowpass_filter 現在是因果濾波，延遲與原本的 filtfilt 不同
             # curr_pressure = real_time_lowpass_filter(pressures)
             # pressures.pop(0)
             machine_breath, la_position = guide_breathing(machine_breath, target_breath_time, la_position)
@@ -290,7 +258,7 @@ def main():
 
                     machine_state = MachineState["GUIDE"]
                     curr_state_count = 0
-                    pressures = []
+                    pressures.clear()
 
                     vibrate_duty_cycle = 0
                     vibration_pwm.ChangeDutyCycle(vibrate_duty_cycle)
@@ -313,7 +281,7 @@ def main():
                         eval_state = EvalState["NONE"]
                         validate_count = 0
                         remove_count = 0
-                        pressures = []
+                        pressures.clear()
                         print("Target breath time: ", target_breath_time)
 
                 # RESET STATE
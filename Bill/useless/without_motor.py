@@ -1,12 +1,16 @@
 #!/usr/bin/env python
 
+import os
 import sys
 import time
 from enum import Enum
 import RPi.GPIO as GPIO
 from bmp280 import BMP280
 import numpy as np
-from scipy.signal import butter, lfilter, lfilter_zi
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ToNTUT"))
+from sos_filter import RealTimeFilter
+from actuator_driver import ActuatorDriver
 
 try:
     from smbus2 import SMBus
@@ -30,6 +34,7 @@ class EvalState(Enum):
 in1 = 23
 in2 = 24
 en = 25
+actuator = ActuatorDriver(in1, in2)
 # Vibration pin removed
 
 # --- Parameters from Thesis ---
@@ -45,18 +50,6 @@ linear_actuator_max_distance = 50
 success_threshold = 15
 fail_threshold = 50
 
-# --- Real-time Filter Class ---
-class RealTimeFilter:
-    def __init__(self, order, cutoff, fs):
-        nyquist = 0.5 * fs
-        normal_cutoff = cutoff / nyquist
-        self.b, self.a = butter(order, normal_cutoff, btype='low', analog=False)
-        self.zi = lfilter_zi(self.b, self.a)
-    
-    def process(self, value):
-        filtered_value, self.zi = lfilter(self.b, self.a, [value], zi=self.zi)
-        return filtered_value[0]
-
 # --- Helper Functions ---
 
 def init_guide_phase(breath_times):
@@ -92,15 +85,7 @@ def move_linear_actuator(direction):
     global last_actuator_print_state
     
     # --- GPIO Logic (Safe to keep even if disconnected) ---
-    if direction == 1:
-        GPIO.output(in1, GPIO.HIGH)
-        GPIO.output(in2, GPIO.LOW)
-    elif direction == -1:
-        GPIO.output(in1, GPIO.LOW)
-        GPIO.output(in2, GPIO.HIGH)
-    else:
-        GPIO.output(in1, GPIO.LOW)
-        GPIO.output(in2, GPIO.LOW)
+    actuator.move(direction)  # 方向沒變時不寫 GPIO
         
     # --- Simulation Print Logic (Only print on change) ---
     if direction != last_actuator_print_state:
@@ -176,7 +161,7 @@ def main():
     bmp280 = BMP280(i2c_dev=bus)
     bmp280.setup(mode="forced")
 
-    rt_filter = RealTimeFilter(lowpass_order, lowpass_cutoff, lowpass_fs)
+    rt_filter = RealTimeFilter(lowpass_order, lowpass_cutoff, lowpass_fs, initial_value=1.0) # same start state as lfilter_zi(b, a)
 
     # State Variables
     machine_state = MachineState.MIRROR 
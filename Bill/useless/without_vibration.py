@@ -1,12 +1,17 @@
 #!/usr/bin/env python
 
+import os
 import sys
 import time
 from enum import Enum
 import RPi.GPIO as GPIO
 from bmp280 import BMP280
 import numpy as np
-from scipy.signal import butter, filtfilt
+from scipy.signal import filtfilt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ToNTUT"))
+from filter_design import butter_lowpass
+from actuator_driver import ActuatorDriver
 
 try:
     from smbus2 import SMBus
@@ -30,6 +35,7 @@ class EvalState (Enum):
 in1 = 23
 in2 = 24
 en = 25
+actuator = ActuatorDriver(in1, in2)
 #vibration_pin = 27
 #vibrate_duty_cycle = 0
 
@@ -47,12 +53,6 @@ linear_actuator_max_distance = 50
 success_threshold = 15
 fail_threshold = 50
 
-def butter_lowpass(cutoff, fs, order=5):
-    nyquist = 0.5 * fs
-    normal_cutoff = cutoff / nyquist
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    return b, a
-
 def lowpass_filter(data, cutoff, fs, order=5):
     b, a = butter_lowpass(cutoff, fs, order=order)
     y = filtfilt(b, a, data)
@@ -146,17 +146,7 @@ def validate_stable(pressures, target_breath_time, validate_count, remove_count)
     return eval_state, validate_count, remove_count, pressures, next_target_breath_time
 
 def move_linear_actuator(direction):
-    if (direction == 1):
-        GPIO.output(in1, GPIO.HIGH)
-        GPIO.output(in2, GPIO.LOW)
-
-    elif (direction == -1):
-        GPIO.output(in1, GPIO.LOW)
-        GPIO.output(in2, GPIO.HIGH)
-
-    else:
-        GPIO.output(in1, GPIO.LOW)
-        GPIO.output(in2 ,GPIO.LOW)
+    actuator.move(direction)  # 方向沒變時不寫 GPIO
 
 def mirror_breathing(curr_pressure, prev_pressure, position, direction):
     if (prev_pressure != 0 and curr_pressure > prev_pressure): # inhale
@@ -17,6 +17,14 @@ public class RpiTcpClient : MonoBehaviour
     private bool isConnected = false;
     private bool isActivated = false;
 
+    // sync_protocol.py 的二進位訊框（版本 1）
+    private const byte SyncFrameMagic = 0xBF;
+    private const byte SyncProtocolVersion = 1;
+    private const byte SyncFrameProgress = 1;
+    private const int SyncFrameHeaderSize = 4;
+    private uint lastFrameSeq = 0;
+    private bool hasFrameSeq = false;
+
     void Start()
     {
         /// 初始化時調用，負責啟動 TCP 客戶端連接。
@@ -86,6 +94,7 @@ public class RpiTcpClient : MonoBehaviour
         /// - 嘗試連接到 serverIp 和 serverPort。
         /// - 如果成功，獲取 NetworkStream，設置 isConnected 為 true，記錄成功訊息。
         /// - 啟動 receiveThread 線程調用 ReceiveLoop() 以接收伺服器數據。
+        /// - 發送 "PROTOCOL BINARY 1" 要求以二進位訊框接收同步數據。
         /// - 如果失敗，記錄錯誤訊息。
         try
         {
@@ -98,6 +107,8 @@ public class RpiTcpClient : MonoBehaviour
             receiveThread = new Thread(ReceiveLoop);
             receiveThread.IsBackground = true;
             receiveThread.Start();
+
+            SendCommand("PROTOCOL BINARY " + SyncProtocolVersion + "\n");
         }
         catch (Exception e)
         {
@@ -136,24 +147,61 @@ public class RpiTcpClient : MonoBehaviour
     {
         /// 接收線程函數，持續接收來自伺服器的數據。
         /// 行為:
-        /// - 初始化 1024 字節緩衝區。
+        /// - 初始化 4096 字節緩衝區，累積不完整的訊框或文字行。
         /// - 在循環中調用 stream.Read() 接收數據。
-        /// - 如果接收到數據，將字節解碼為 UTF-8 字串，記錄到 Debug Log。
+        /// - 以 0xBF 開頭的是二進位同步訊框（magic, version, type, length + body），
+        ///   解出 seq 與進度記錄到 Debug Log，seq 跳號時記錄遺失數。
+        /// - 其他數據以換行分隔，解碼為 UTF-8 字串記錄到 Debug Log。
         /// - 如果接收到 0 字節，表示伺服器斷開，記錄訊息並退出。
         /// - 如果發生異常，記錄錯誤並設置 isConnected 為 false。
-        byte[] buffer = new byte[1024];
+        byte[] buffer = new byte[4096];
+        int count = 0;
         try
         {
             while (isConnected)
             {
-                int bytesRead = stream.Read(buffer, 0, buffer.Length);
+                int bytesRead = stream.Read(buffer, count, buffer.Length - count);
                 if (bytesRead <= 0)
                 {
                     Debug.Log("[CLIENT] Server disconnected");
                     break;
                 }
-                string msg = Encoding.UTF8.GetString(buffer, 0, bytesRead);
-                Debug.Log("[CLIENT] Received: " + msg.Trim());
+                count += bytesRead;
+
+                int pos = 0;
+                while (pos < count)
+                {
+                    if (buffer[pos] == SyncFrameMagic)
+                    {
+                        if (count - pos < SyncFrameHeaderSize) break;
+                        int frameSize = SyncFrameHeaderSize + buffer[pos + 3];
+                        if (count - pos < frameSize) break;
+                        if (buffer[pos + 1] == SyncProtocolVersion && buffer[pos + 2] == SyncFrameProgress
+                            && frameSize >= SyncFrameHeaderSize + 16)
+                        {
+                            uint seq = BitConverter.ToUInt32(buffer, pos + SyncFrameHeaderSize);
+                            float progress = BitConverter.ToSingle(buffer, pos + SyncFrameHeaderSize + 12);
+                            if (hasFrameSeq && seq - lastFrameSeq > 1)
+                                Debug.LogWarning("[CLIENT] Lost " + (seq - lastFrameSeq - 1) + " sync frames");
+                            hasFrameSeq = true;
+                            lastFrameSeq = seq;
+                            Debug.Log("[CLIENT] Received: SYNC #" + seq + " progress " + progress.ToString("F3"));
+                        }
+                        pos += frameSize;
+                    }
+                    else
+                    {
+                        int newline = Array.IndexOf(buffer, (byte)'\n', pos, count - pos);
+                        if (newline < 0) break;
+                        string msg = Encoding.UTF8.GetString(buffer, pos, newline - pos);
+                        Debug.Log("[CLIENT] Received: " + msg.Trim());
+                        pos = newline + 1;
+                    }
+                }
+
+                Buffer.BlockCopy(buffer, pos, buffer, 0, count - pos);
+                count -= pos;
+                if (count == buffer.Length) count = 0;
             }
         }
         catch (Exception e)
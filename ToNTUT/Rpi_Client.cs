@@ -1,6 +1,7 @@
 using System;
 using System.Collections;
 using System.Globalization;
+using System.Net;
 using System.Net.Sockets;
 using System.Text;
 using System.Threading;
@@ -15,18 +16,28 @@ public class RpiTcpClient : MonoBehaviour
     [Header("Raspberry Pi Settings")]
     public string serverIp = "192.168.50.251";
     public int serverPort = 5005;
+    [Tooltip("一台 Pi 接多組設備時，這台 Quest 控制的 rig 名稱（rpi_server.py 的 RIGS）；空白 = 預設")]
+    public string rigName = "";
     [SerializeField] private float connectTimeoutSeconds = 3f;
 
     [Header("Animation Control")]
     public Animator targetAnimator;
     public string progressParameterName = "BreathProgress";
     public string progressSpeedParameterName = "BreathSpeed";
+    [Tooltip("只接收每個呼吸週期的參數，在本地外插進度（流量約為逐樣本串流的百分之一）")]
+    public bool cycleSyncMode = false;
+    [Tooltip("同步訊框改走 UDP：只保留最新值，不會被 TCP 的重送卡住")]
+    public bool udpSync = false;
+    [Tooltip("週期模式下超過這個時間（秒）沒有收到 CYCLE 訊框就停止外插；伺服器至少每 2 秒送一個校正")]
+    [SerializeField] private float cycleStaleSeconds = 4f;
     public UnityEvent onActivate;
     public UnityEvent onDisconnect;
 
     private TcpClient client;
     private NetworkStream stream;
     private Thread receiveThread;
+    private UdpClient udpClient;
+    private Thread udpReceiveThread;
     private readonly object streamLock = new object();
     private readonly object progressLock = new object();
 
@@ -39,6 +50,43 @@ public class RpiTcpClient : MonoBehaviour
     public bool IsConnecting { get { return connecting; } }
     public string LastStatusMessage { get; private set; } = "Disconnected";
 
+    // sync_protocol.py 的二進位訊框（版本 1）
+    private const byte SyncFrameMagic = 0xBF;
+    private const byte SyncProtocolVersion = 1;
+    private const byte SyncFrameProgress = 1;
+    private const byte SyncFrameCycle = 2;
+    private const int SyncFrameHeaderSize = 4;
+    private const int SyncProgressBodySize = 22;
+    private const int SyncCycleBodySize = 40;
+    private const float CycleCorrectionDecaySeconds = 0.5f;
+
+    // PROGRESS 與 CYCLE 的 seq 各自遞增（伺服器依連線編號），分開追蹤
+    private bool hasProgressSeq = false;
+    private uint lastProgressSeq = 0;
+    private bool hasCycleSeq = false;
+    private uint lastCycleSeq = 0;
+    private long minFrameOffsetNs = long.MaxValue;
+    private static readonly double NanosecondsPerTick = 1e9 / System.Diagnostics.Stopwatch.Frequency;
+
+    public long ReceivedFrames { get; private set; }
+    public long DroppedFrames { get; private set; }
+    // 比已收到的還舊或重複的訊框（UDP 亂序），直接丟棄
+    public long StaleFrames { get; private set; }
+    // 相對延遲：(接收時間 - 樣本時間) 減去觀察到的最小值；兩端時鐘不同，只能看變化
+    public float FrameLatencyMs { get; private set; }
+    public float TargetBreathPeriod { get; private set; }
+    public int MachineState { get; private set; }
+    public int UserState { get; private set; }
+
+    // 週期模式的參數（progressLock 保護）；時間都是 Pi 的 monotonic 奈秒
+    private bool hasCycle = false;
+    private long cycleStartNs = 0;
+    private float cyclePeriod = 4f;
+    private float cycleProgressMin = 0.3f;
+    private float cycleProgressRange = 0.4f;
+    private long cycleCorrectionNs = 0;
+    private float cycleCorrection = 0f;
+
     private float targetProgress = 0f;
     private float smoothProgress = 0f;
     private float animSpeed = 0.3f;
@@ -74,12 +122,22 @@ public class RpiTcpClient : MonoBehaviour
         }
 
         float latestTarget;
+        bool extrapolated;
         lock (progressLock)
         {
-            latestTarget = targetProgress;
+            long piNowNs = LocalNowNs() - minFrameOffsetNs;
+            if (hasCycle && piNowNs - cycleCorrectionNs > (long)(cycleStaleSeconds * 1e9f))
+            {
+                // 引擎崩潰或網路中斷：不要讓狗一直自己呼吸下去
+                Debug.LogWarning("[CLIENT] No CYCLE frame for " + cycleStaleSeconds + " s; stop extrapolating");
+                StopExtrapolating(piNowNs);
+            }
+            extrapolated = hasCycle;
+            latestTarget = extrapolated ? ExtrapolateProgress(piNowNs) : targetProgress;
         }
 
-        smoothProgress = Mathf.Lerp(smoothProgress, latestTarget, Time.deltaTime * 5f);
+        // 外插的進度本身就是連續的，不需要再平滑（平滑會多出約 200 ms 的延遲）
+        smoothProgress = extrapolated ? latestTarget : Mathf.Lerp(smoothProgress, latestTarget, Time.deltaTime * 5f);
         targetAnimator.SetFloat(progressParameterName, smoothProgress);
 
         if (smoothProgress <= 0.3f || smoothProgress >= 0.7f)
@@ -186,6 +244,17 @@ public class RpiTcpClient : MonoBehaviour
             connected = true;
         }
 
+        lock (progressLock)
+        {
+            hasProgressSeq = false;
+            hasCycleSeq = false;
+            minFrameOffsetNs = long.MaxValue;
+            hasCycle = false;
+            ReceivedFrames = 0;
+            DroppedFrames = 0;
+            StaleFrames = 0;
+        }
+
         receiveThread = new Thread(ReceiveLoop);
         receiveThread.IsBackground = true;
         receiveThread.Start();
@@ -194,6 +263,19 @@ public class RpiTcpClient : MonoBehaviour
         LastStatusMessage = "Connected to Raspberry Pi";
         Debug.Log("[CLIENT] Connected to Raspberry Pi");
         Debug.Log("[AUTO] 連線成功，已自動發送 ACTIVATE 指令啟動設備...");
+        SendCommand("PROTOCOL BINARY " + SyncProtocolVersion + "\n");
+        if (!string.IsNullOrEmpty(rigName))
+        {
+            SendCommand("RIG " + rigName + "\n");
+        }
+        if (udpSync)
+        {
+            StartUdpReceiver();
+        }
+        if (cycleSyncMode)
+        {
+            SendCommand("SYNC_MODE CYCLE\n");
+        }
         SendCommand("ACTIVATE\n");
         onActivate?.Invoke();
     }
@@ -228,8 +310,8 @@ public class RpiTcpClient : MonoBehaviour
 
     private void ReceiveLoop()
     {
-        byte[] buffer = new byte[1024];
-        StringBuilder lineBuffer = new StringBuilder();
+        byte[] buffer = new byte[4096];
+        int count = 0;
 
         try
         {
@@ -246,15 +328,25 @@ public class RpiTcpClient : MonoBehaviour
                     break;
                 }
 
-                int bytesRead = currentStream.Read(buffer, 0, buffer.Length);
+                int bytesRead = currentStream.Read(buffer, count, buffer.Length - count);
                 if (bytesRead <= 0)
                 {
                     Debug.Log("[CLIENT] Server disconnected");
                     break;
                 }
 
-                string chunk = Encoding.UTF8.GetString(buffer, 0, bytesRead);
-                AppendAndProcessLines(lineBuffer, chunk);
+                count += bytesRead;
+                int consumed = ProcessReceived(buffer, count);
+                if (consumed > 0)
+                {
+                    Buffer.BlockCopy(buffer, consumed, buffer, 0, count - consumed);
+                    count -= consumed;
+                }
+                if (count == buffer.Length)
+                {
+                    Debug.LogWarning("[CLIENT] Receive buffer full without a complete message; discarding");
+                    count = 0;
+                }
             }
         }
         catch (Exception e)
@@ -273,19 +365,256 @@ public class RpiTcpClient : MonoBehaviour
         }
     }
 
-    private void AppendAndProcessLines(StringBuilder lineBuffer, string chunk)
+    // 處理 buffer 中完整的訊框與文字行，返回已處理的 byte 數（剩下的留待下次 Read 補齊）
+    private int ProcessReceived(byte[] buffer, int count)
+    {
+        int pos = 0;
+        while (pos < count)
+        {
+            if (buffer[pos] == SyncFrameMagic)
+            {
+                if (count - pos < SyncFrameHeaderSize)
+                {
+                    break;
+                }
+
+                int frameSize = SyncFrameHeaderSize + buffer[pos + 3];
+                if (count - pos < frameSize)
+                {
+                    break;
+                }
+
+                ProcessFrame(buffer, pos);
+                pos += frameSize;
+            }
+            else
+            {
+                int newline = Array.IndexOf(buffer, (byte)'\n', pos, count - pos);
+                if (newline < 0)
+                {
+                    break;
+                }
+
+                ProcessLine(Encoding.UTF8.GetString(buffer, pos, newline - pos).Trim());
+                pos = newline + 1;
+            }
+        }
+
+        return pos;
+    }
+
+    private void ProcessFrame(byte[] buffer, int offset)
     {
-        foreach (char c in chunk)
+        if (buffer[offset + 1] != SyncProtocolVersion)
+        {
+            return;
+        }
+
+        if (buffer[offset + 2] == SyncFrameCycle && buffer[offset + 3] >= SyncCycleBodySize)
+        {
+            ProcessCycleFrame(buffer, offset + SyncFrameHeaderSize);
+            return;
+        }
+
+        if (buffer[offset + 2] != SyncFrameProgress || buffer[offset + 3] < SyncProgressBodySize)
         {
-            if (c == '\n')
+            return;
+        }
+
+        int body = offset + SyncFrameHeaderSize;
+        uint seq = BitConverter.ToUInt32(buffer, body);
+        long sampleNs = BitConverter.ToInt64(buffer, body + 4);
+        // TCP 與 UDP 接收執行緒都會進來：檢查 seq 與套用數值要在同一個鎖內，舊訊框才不會蓋掉新的
+        lock (progressLock)
+        {
+            if (!TrackFrame(ref hasProgressSeq, ref lastProgressSeq, seq, sampleNs))
             {
-                ProcessLine(lineBuffer.ToString().Trim());
-                lineBuffer.Length = 0;
+                return;
             }
-            else if (c != '\r')
+
+            float p = BitConverter.ToSingle(buffer, body + 12);
+            TargetBreathPeriod = BitConverter.ToSingle(buffer, body + 16);
+            MachineState = (sbyte)buffer[body + 20];
+            UserState = buffer[body + 21];
+            SetTargetProgress(p);
+        }
+    }
+
+    // 週期參數：之後每一幀由 Update() 以三角波外插，直到下一個 CYCLE 訊框
+    private void ProcessCycleFrame(byte[] buffer, int body)
+    {
+        uint seq = BitConverter.ToUInt32(buffer, body);
+        long sentNs = BitConverter.ToInt64(buffer, body + 4);
+        long startNs = BitConverter.ToInt64(buffer, body + 12);
+        float period = BitConverter.ToSingle(buffer, body + 20);
+        float p = BitConverter.ToSingle(buffer, body + 24);
+        float progressMin = BitConverter.ToSingle(buffer, body + 28);
+        float progressRange = BitConverter.ToSingle(buffer, body + 32);
+
+        lock (progressLock)
+        {
+            if (!TrackFrame(ref hasCycleSeq, ref lastCycleSeq, seq, sentNs))
+            {
+                return;
+            }
+
+            MachineState = (sbyte)buffer[body + 36];
+            UserState = buffer[body + 37];
+            TargetBreathPeriod = period;
+            if (period <= 0f)
             {
-                lineBuffer.Append(c);
+                // CYCLE_STOP：伺服器在馬達停下時送出，停在當下的進度
+                StopExtrapolating(sentNs);
+                return;
             }
+
+            cycleStartNs = startNs;
+            cyclePeriod = period;
+            cycleProgressMin = progressMin;
+            cycleProgressRange = progressRange;
+            // 模型與實際進度的差，之後逐漸衰減
+            cycleCorrection = p - ExtrapolateProgress(sentNs, false);
+            cycleCorrectionNs = sentNs;
+            hasCycle = true;
+            targetProgress = p;
+        }
+    }
+
+    // 停止週期外插，之後 Update() 停在 piNowNs 時的外插進度；呼叫端需持有 progressLock
+    private void StopExtrapolating(long piNowNs)
+    {
+        if (!hasCycle)
+        {
+            return;
+        }
+        targetProgress = ExtrapolateProgress(piNowNs);
+        hasCycle = false;
+    }
+
+    // 呼叫端需持有 progressLock
+    private float ExtrapolateProgress(long piNowNs, bool withCorrection = true)
+    {
+        double elapsed = (piNowNs - cycleStartNs) / 1e9;
+        double phase = (elapsed % cyclePeriod) / cyclePeriod;
+        if (phase < 0)
+        {
+            phase += 1.0;
+        }
+        float ratio = (float)(phase < 0.5 ? 2.0 * phase : 2.0 * (1.0 - phase));
+        float progress = cycleProgressMin + cycleProgressRange * ratio;
+        if (withCorrection)
+        {
+            float age = (piNowNs - cycleCorrectionNs) / 1e9f;
+            progress += cycleCorrection * Mathf.Exp(-Mathf.Max(age, 0f) / CycleCorrectionDecaySeconds);
+        }
+        return Mathf.Clamp01(progress);
+    }
+
+    private static long LocalNowNs()
+    {
+        return (long)(System.Diagnostics.Stopwatch.GetTimestamp() * NanosecondsPerTick);
+    }
+
+    // 記錄 seq 與延遲；返回 false 表示這個訊框比同種類已收到的舊（只保留最新值）
+    // 呼叫端需持有 progressLock（計數、seq 與 minFrameOffsetNs 都由它保護）
+    private bool TrackFrame(ref bool hasSeq, ref uint lastSeq, uint seq, long sampleNs)
+    {
+        if (hasSeq)
+        {
+            uint gap = unchecked(seq - lastSeq);
+            if (gap == 0 || gap >= 0x80000000u)
+            {
+                StaleFrames++;
+                return false;
+            }
+            if (gap > 1)
+            {
+                DroppedFrames += gap - 1;
+            }
+        }
+        hasSeq = true;
+        lastSeq = seq;
+        ReceivedFrames++;
+
+        long offsetNs = LocalNowNs() - sampleNs;
+        // Update() 也用這個值把本地時間換算成 Pi 的時間
+        if (offsetNs < minFrameOffsetNs)
+        {
+            minFrameOffsetNs = offsetNs;
+        }
+        FrameLatencyMs = (offsetNs - minFrameOffsetNs) / 1e6f;
+        return true;
+    }
+
+    // 開一個 UDP port 接收同步訊框，並以 TCP 告訴伺服器這個 port
+    private void StartUdpReceiver()
+    {
+        try
+        {
+            UdpClient udp = new UdpClient(new IPEndPoint(IPAddress.Any, 0));
+            int port = ((IPEndPoint)udp.Client.LocalEndPoint).Port;
+            lock (streamLock)
+            {
+                udpClient = udp;
+            }
+
+            udpReceiveThread = new Thread(UdpReceiveLoop);
+            udpReceiveThread.IsBackground = true;
+            udpReceiveThread.Start();
+            SendCommand("UDP " + port + "\n");
+        }
+        catch (Exception e)
+        {
+            Debug.LogWarning("[CLIENT] UDP sync unavailable, using TCP: " + e.Message);
+        }
+    }
+
+    private void UdpReceiveLoop()
+    {
+        IPEndPoint remote = new IPEndPoint(IPAddress.Any, 0);
+        try
+        {
+            while (connected && !closing)
+            {
+                UdpClient udp;
+                lock (streamLock)
+                {
+                    udp = udpClient;
+                }
+
+                if (udp == null)
+                {
+                    break;
+                }
+
+                byte[] datagram = udp.Receive(ref remote);
+                // 一個 datagram 一個完整訊框
+                if (datagram.Length >= SyncFrameHeaderSize && datagram[0] == SyncFrameMagic
+                    && datagram.Length >= SyncFrameHeaderSize + datagram[3])
+                {
+                    ProcessFrame(datagram, 0);
+                }
+            }
+        }
+        catch (Exception e)
+        {
+            if (!closing && connected)
+            {
+                Debug.LogWarning("[CLIENT] UDP receive error: " + e.Message);
+            }
+        }
+    }
+
+    private void SetTargetProgress(float p)
+    {
+        if (p < 0f)
+            p = 0f;
+        else if (p > 1f)
+            p = 1f;
+
+        lock (progressLock)
+        {
+            targetProgress = p;
         }
     }
 
@@ -301,15 +630,7 @@ public class RpiTcpClient : MonoBehaviour
             string valueStr = line.Substring("SYNC_PROGRESS:".Length);
             if (float.TryParse(valueStr, NumberStyles.Float, CultureInfo.InvariantCulture, out float p))
             {
-                if (p < 0f)
-                    p = 0f;
-                else if (p > 1f)
-                    p = 1f;
-
-                lock (progressLock)
-                {
-                    targetProgress = p;
-                }
+                SetTargetProgress(p);
             }
             return;
         }
@@ -336,6 +657,10 @@ public class RpiTcpClient : MonoBehaviour
         {
             SendCommand("DEACTIVATE\n");
         }
+        lock (progressLock)
+        {
+            StopExtrapolating(LocalNowNs() - minFrameOffsetNs);
+        }
 
         connected = false;
         connecting = false;
@@ -348,6 +673,7 @@ public class RpiTcpClient : MonoBehaviour
         }
 
         receiveThread = null;
+        udpReceiveThread = null;
         LastStatusMessage = "Disconnected";
         onDisconnect?.Invoke();
     }
@@ -367,6 +693,12 @@ public class RpiTcpClient : MonoBehaviour
                 client.Close();
                 client = null;
             }
+
+            if (udpClient != null)
+            {
+                udpClient.Close();
+                udpClient = null;
+            }
         }
     }
 }
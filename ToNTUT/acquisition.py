@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+獨立的感測器擷取執行緒。
+
+原本控制迴圈依序做 I2C 讀值、濾波、狀態機、GPIO 與 SYNC_PROGRESS 輸出，
+任何一段變慢都會延後下一次讀值。這裡把讀值移到自己的執行緒，依固定週期
+取樣並把 (時間戳, 數值) 寫進 SampleRing，控制邏輯改成消費者，
+取樣時間不再受下游工作影響。
+"""
+
+import threading
+import time
+
+from ring_buffer import SampleRing
+from scheduler import DeadlineScheduler
+
+
+class AcquisitionThread(threading.Thread):
+    """
+    以固定週期呼叫 read_fn 並寫入環狀緩衝區的執行緒。
+
+    屬性:
+    - ring: SampleRing，消費者從這裡取資料。
+    - scheduler: DeadlineScheduler，取樣週期的抖動與超時統計。
+    - samples: 成功讀到的樣本數。
+    - missed_periods: 因讀值或排程延遲而跳過的取樣週期數（drop）。
+    - read_errors: read_fn 拋出例外的次數。
+    - error: 連續錯誤過多而停止時的最後一個例外；正常時為 None。
+    """
+    def __init__(self, read_fn, period_s, ring=None, capacity=256, max_consecutive_errors=10, spin_us=500):
+        """
+        參數:
+        - read_fn: 無參數、返回一個數值的讀值函數（例如 ContinuousBMP280.get_pressure）。
+        - period_s: 取樣週期（秒）。
+        - ring: 要寫入的 SampleRing；None 時建立一個 capacity 大小的新緩衝區。
+        - max_consecutive_errors: 連續讀值失敗達此次數就停止執行緒。
+        - spin_us: 期限前改用忙等的時間（微秒），見 DeadlineScheduler。
+        """
+        super().__init__(name="acquisition", daemon=True)
+        self.read_fn = read_fn
+        self.ring = ring if ring is not None else SampleRing(capacity)
+        self.max_consecutive_errors = max_consecutive_errors
+
+        self.samples = 0
+        self.read_errors = 0
+        self.error = None
+        self._stop_event = threading.Event()
+        self.scheduler = DeadlineScheduler(period_s, spin_us=spin_us, sleep_fn=self._stop_event.wait)
+
+    @property
+    def missed_periods(self):
+        return self.scheduler.missed_periods
+
+    def run(self):
+        """
+        行為:
+        - 由 DeadlineScheduler 以 monotonic 絕對期限排程，不因讀值耗時而漂移。
+        - 時間戳取讀值開始的時刻。
+        - 落後超過一個週期時，排程器跳到下一個未來的期限並把跳過的週期記為 drop。
+        """
+        consecutive_errors = 0
+        self.scheduler.reset()
+        while not self._stop_event.is_set():
+            timestamp = time.monotonic_ns()
+            try:
+                value = self.read_fn()
+            except Exception as e:
+                self.read_errors += 1
+                consecutive_errors += 1
+                if consecutive_errors >= self.max_consecutive_errors:
+                    self.error = e
+                    self.ring.wake()
+                    return
+            else:
+                consecutive_errors = 0
+                self.ring.push(timestamp, value)
+                self.samples += 1
+
+            self.scheduler.wait()
+
+    def stop(self, timeout=1.0):
+        """要求執行緒停止並等待它結束。"""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def check(self):
+        """執行緒因連續錯誤而停止時，把原本的例外拋給消費者。"""
+        if self.error is not None:
+            raise RuntimeError(f"acquisition stopped after {self.read_errors} read errors: {self.error}")
+
+    def report(self):
+        r = self.ring.stats()
+        return (f"[Acquisition] samples {self.samples}, missed periods {self.missed_periods}, "
+                f"read errors {self.read_errors}, consumer overruns {r['overrun_samples']} samples "
+                f"in {r['overrun_events']} events (ring {r['capacity']})")
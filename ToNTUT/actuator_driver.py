@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+線性致動器 (L298N in1/in2 + en PWM) 的驅動物件。
+
+原本 move_linear_actuator 每個樣本都寫 in1、in2 兩支腳位（60 Hz 下每秒
+約 120 次 GPIO 呼叫），即使方向沒變。ActuatorDriver 記住腳位與 duty 目前
+的狀態，只有改變時才真的呼叫 GPIO，並統計實際寫入、省略的次數與 GPIO
+耗時。也可以排入帶時間的指令（例如「伸出 2 秒後停止」），由控制迴圈
+呼叫 poll() 執行到期的指令。
+
+FakeGPIO 模擬 RPi.GPIO 的介面，可在非 Pi 環境做測試與基準測試。
+
+用法（比較每樣本寫入與合併寫入的 GPIO 次數）:
+    python3 actuator_driver.py [秒數]
+"""
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+
+
+class ActuatorDriver:
+    """
+    具寫入合併與指令佇列的致動器驅動。
+
+    屬性:
+    - direction: 目前輸出的方向（1 伸出、-1 縮回、0 停止；None = 尚未寫入）。
+    - duty: 目前 en 腳位的 PWM duty（%）；沒有 en 或尚未啟動時為 None。
+    - writes: 實際呼叫 GPIO（output / ChangeDutyCycle）的次數。
+    - suppressed: 因狀態沒變而省略的寫入次數。
+    - gpio_ns: 花在 GPIO 呼叫上的總時間（奈秒）。
+    - commands_executed: 從佇列執行的指令數。
+    - halted: halt() 之後為 True，直到下一次 setup()；期間所有寫入都被忽略。
+    """
+    def __init__(self, in1, in2, en=None, gpio=None, pwm_frequency=800):
+        """
+        參數:
+        - in1, in2: 方向腳位（BCM 編號）。
+        - en: PWM 腳位；None 表示腳位由呼叫端自行處理，不控制 duty。
+        - gpio: RPi.GPIO 相容的模組或物件（例如 FakeGPIO）；None 時第一次使用才 import RPi.GPIO。
+        - pwm_frequency: en 腳位的 PWM 頻率（Hz）。
+
+        行為:
+        - 建構時不碰硬體，可以放在模組層級。
+        """
+        self.in1 = in1
+        self.in2 = in2
+        self.en = en
+        self.pwm_frequency = pwm_frequency
+        self._gpio = gpio
+        self._pwm = None
+        self._levels = {}
+        self.direction = None
+        self.duty = None
+        self.halted = False
+        self._write_lock = threading.Lock()
+
+        self.writes = 0
+        self.suppressed = 0
+        self.gpio_ns = 0
+        self.commands_executed = 0
+        self._queue = []
+        self._queue_lock = threading.Lock()
+        self._seq = itertools.count()
+
+    @property
+    def gpio(self):
+        if self._gpio is None:
+            import RPi.GPIO as GPIO
+            self._gpio = GPIO
+        return self._gpio
+
+    def setup(self, duty=100):
+        """
+        設定腳位並啟動 PWM，方向設為停止。
+
+        參數:
+        - duty: en 腳位的初始 duty（%）；沒有 en 時忽略。
+        """
+        gpio = self.gpio
+        self.halted = False
+        gpio.setmode(gpio.BCM)
+        gpio.setup(self.in1, gpio.OUT)
+        gpio.setup(self.in2, gpio.OUT)
+        self.invalidate()
+        if self.en is not None:
+            gpio.setup(self.en, gpio.OUT)
+            self._pwm = gpio.PWM(self.en, self.pwm_frequency)
+            self._pwm.start(duty)
+            self.duty = duty
+        self.move(0)
+
+    def invalidate(self):
+        """忘記快取的腳位狀態（腳位被其他程式碼改過，或 GPIO.cleanup 之後）。"""
+        self._levels.clear()
+        self.direction = None
+
+    def _output(self, pin, level):
+        if self._levels.get(pin) == level:
+            self.suppressed += 1
+            return
+        with self._write_lock:
+            # halt() 可能由其他執行緒呼叫：檢查與寫入在同一個鎖內，停止之後不會再被寫回
+            if self.halted:
+                return
+            start = time.perf_counter_ns()
+            self.gpio.output(pin, level)
+            self.gpio_ns += time.perf_counter_ns() - start
+        self.writes += 1
+        self._levels[pin] = level
+
+    def move(self, direction, duty=None):
+        """
+        設定方向（以及選擇性的 duty），只寫入有改變的腳位。
+
+        參數:
+        - direction: 1 = 伸出（in1 HIGH）、-1 = 縮回（in2 HIGH）、其他 = 停止。
+        - duty: 新的 PWM duty（%）；None 表示不變。
+        """
+        gpio = self.gpio
+        if direction == 1:
+            self._output(self.in1, gpio.HIGH)
+            self._output(self.in2, gpio.LOW)
+        elif direction == -1:
+            self._output(self.in1, gpio.LOW)
+            self._output(self.in2, gpio.HIGH)
+        else:
+            direction = 0
+            self._output(self.in1, gpio.LOW)
+            self._output(self.in2, gpio.LOW)
+        self.direction = direction
+        if duty is not None:
+            self.set_duty(duty)
+
+    def set_duty(self, duty):
+        """設定 en 腳位的 PWM duty（%），與目前相同時不呼叫 GPIO。"""
+        if self._pwm is None:
+            return
+        if duty == self.duty:
+            self.suppressed += 1
+            return
+        with self._write_lock:
+            if self.halted:
+                return
+            start = time.perf_counter_ns()
+            self._pwm.ChangeDutyCycle(duty)
+            self.gpio_ns += time.perf_counter_ns() - start
+        self.writes += 1
+        self.duty = duty
+
+    def halt(self, timeout=0.5):
+        """
+        從其他執行緒強制停止馬達，並封鎖之後的寫入直到下一次 setup()。
+
+        給被放棄（停不下來）的控制執行緒用：它之後的 move()、set_duty()、poll() 都不會再碰腳位。
+
+        參數:
+        - timeout: 等待控制執行緒進行中的 GPIO 呼叫完成的秒數。
+
+        返回: True 表示已寫入停止電位；GPIO 呼叫卡住、等不到鎖時為 False（仍會封鎖之後的寫入）。
+        """
+        self.clear_commands()
+        if not self._write_lock.acquire(timeout=timeout):
+            self.halted = True
+            return False
+        try:
+            self.halted = True
+            gpio = self.gpio
+            # 不相信快取的電位，一定寫入
+            gpio.output(self.in1, gpio.LOW)
+            gpio.output(self.in2, gpio.LOW)
+            self._levels[self.in1] = gpio.LOW
+            self._levels[self.in2] = gpio.LOW
+            self.direction = 0
+            self.writes += 2
+        finally:
+            self._write_lock.release()
+        return True
+
+    # --- 指令佇列 ---
+    def submit(self, direction, duty=None, delay=0.0, at_ns=None):
+        """
+        排入一個帶時間的指令（可由其他執行緒呼叫）。
+
+        參數:
+        - direction, duty: 同 move()。
+        - delay: 從現在起多少秒後執行。
+        - at_ns: 以 time.monotonic_ns() 表示的執行時間；給定時忽略 delay。
+        """
+        if at_ns is None:
+            at_ns = time.monotonic_ns() + int(delay * 1e9)
+        with self._queue_lock:
+            heapq.heappush(self._queue, (at_ns, next(self._seq), direction, duty))
+
+    def poll(self, now_ns=None):
+        """
+        依時間順序執行所有已到期的指令。
+
+        返回: 這次執行的指令數。
+        """
+        if not self._queue:
+            return 0
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        due = []
+        with self._queue_lock:
+            while self._queue and self._queue[0][0] <= now_ns:
+                due.append(heapq.heappop(self._queue))
+        for _, _, direction, duty in due:
+            self.move(direction, duty)
+        self.commands_executed += len(due)
+        return len(due)
+
+    def pending(self):
+        """佇列中尚未執行的指令數。"""
+        return len(self._queue)
+
+    def next_due_ns(self):
+        """最早一個尚未執行的指令的執行時間（monotonic 奈秒）；佇列為空時為 None。"""
+        with self._queue_lock:
+            return self._queue[0][0] if self._queue else None
+
+    def clear_commands(self):
+        """丟棄所有尚未執行的指令。"""
+        with self._queue_lock:
+            self._queue.clear()
+
+    def close(self):
+        """停止馬達、丟棄佇列、停止 PWM 並釋放這個驅動的腳位（其他致動器的腳位不受影響）。"""
+        self.clear_commands()
+        try:
+            self.move(0)
+            if self._pwm is not None:
+                self._pwm.stop()
+                self._pwm = None
+        finally:
+            pins = [self.in1, self.in2] + ([self.en] if self.en is not None else [])
+            self.gpio.cleanup(pins)
+            self.invalidate()
+
+    def stats(self):
+        total = self.writes + self.suppressed
+        return {
+            "writes": self.writes,
+            "suppressed": self.suppressed,
+            "suppressed_ratio": self.suppressed / total if total else 0.0,
+            "gpio_us_total": self.gpio_ns / 1000.0,
+            "gpio_us_per_write": self.gpio_ns / self.writes / 1000.0 if self.writes else 0.0,
+            "commands_executed": self.commands_executed,
+            "commands_pending": self.pending(),
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"[Actuator] GPIO writes {s['writes']}, suppressed {s['suppressed']} "
+                f"({s['suppressed_ratio'] * 100:.0f}%), GPIO time {s['gpio_us_total'] / 1000.0:.1f} ms "
+                f"({s['gpio_us_per_write']:.1f} us/write), queued commands {s['commands_executed']}")
+
+
+class FakeGPIO:
+    """
+    RPi.GPIO 的替身：記錄腳位電位與呼叫次數，可模擬每次呼叫的耗時。
+
+    屬性:
+    - levels: {pin: level} 目前電位。
+    - calls: output() 與 ChangeDutyCycle() 的呼叫次數。
+    """
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+    PUD_UP = 22
+
+    def __init__(self, call_us=0.0):
+        """call_us: 每次 output/ChangeDutyCycle 忙等的時間（微秒），模擬實機 GPIO 開銷。"""
+        self.call_ns = int(call_us * 1000)
+        self.levels = {}
+        self.duty = {}
+        self.calls = 0
+
+    def _cost(self):
+        self.calls += 1
+        if self.call_ns:
+            end = time.perf_counter_ns() + self.call_ns
+            while time.perf_counter_ns() < end:
+                pass
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode, pull_up_down=None):
+        self.levels.setdefault(pin, self.LOW)
+
+    def output(self, pin, level):
+        self._cost()
+        self.levels[pin] = level
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def cleanup(self, pins=None):
+        # 與 RPi.GPIO 相同：不給腳位時釋放全部，否則只釋放指定的腳位
+        if pins is None:
+            self.levels.clear()
+            return
+        for pin in ([pins] if isinstance(pins, int) else pins):
+            self.levels.pop(pin, None)
+
+    def PWM(self, pin, frequency):
+        gpio = self
+
+        class _PWM:
+            def start(self, duty):
+                gpio.duty[pin] = duty
+
+            def ChangeDutyCycle(self, duty):
+                gpio._cost()
+                gpio.duty[pin] = duty
+
+            def stop(self):
+                gpio.duty[pin] = 0
+
+        return _PWM()
+
+
+def _legacy_move(gpio, in1, in2, direction):
+    # 原本 move_linear_actuator 的寫法：每次都寫兩支腳位
+    if direction == 1:
+        gpio.output(in1, gpio.HIGH)
+        gpio.output(in2, gpio.LOW)
+    elif direction == -1:
+        gpio.output(in1, gpio.LOW)
+        gpio.output(in2, gpio.HIGH)
+    else:
+        gpio.output(in1, gpio.LOW)
+        gpio.output(in2, gpio.LOW)
+
+
+def main(argv):
+    seconds = float(argv[1]) if len(argv) > 1 else 60.0
+    fs = 60.0
+    period = 4.0
+    call_us = 5.0
+    # 引導模式的方向序列：半週期伸出、半週期縮回
+    directions = [1 if (i / fs) % period < period / 2 else -1 for i in range(int(seconds * fs))]
+
+    gpio = FakeGPIO(call_us)
+    start = time.perf_counter_ns()
+    for d in directions:
+        _legacy_move(gpio, 23, 24, d)
+    legacy_ms = (time.perf_counter_ns() - start) / 1e6
+    print(f"legacy : {gpio.calls} GPIO calls, {legacy_ms:.1f} ms "
+          f"({len(directions)} samples, {call_us:.0f} us/call simulated)")
+
+    gpio = FakeGPIO(call_us)
+    driver = ActuatorDriver(23, 24, 25, gpio=gpio)
+    driver.setup()
+    start = time.perf_counter_ns()
+    for d in directions:
+        driver.move(d)
+    driver_ms = (time.perf_counter_ns() - start) / 1e6
+    print(f"driver : {gpio.calls} GPIO calls, {driver_ms:.1f} ms")
+    print("  " + driver.report())
+
+
+if __name__ == "__main__":
+    main(sys.argv)
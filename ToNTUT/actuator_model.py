@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+以時間為基準的線性致動器軌跡模型。
+
+原本 guide_breathing_logic 每個樣本 pos += direct，碰到
+linear_actuator_max_distance (50) 就停；在 60 Hz 下不到一秒就走完，
+半個週期剩下的時間馬達都停著，而且行程會跟著迴圈速率改變。
+
+ActuatorModel 依目標呼吸週期規劃連續的「位置-時間」三角波軌跡：
+吸氣半週期剛好推完整個行程、吐氣半週期剛好收回。速度由 en 腳位的
+PWM duty 控制，位置則以「實測全速速度 × duty × 實際驅動時間」估計，
+所以不論迴圈速率多少，動作與 SYNC_PROGRESS 都一致。
+"""
+
+
+class ActuatorModel:
+    """
+    致動器位置估計與軌跡追蹤。
+
+    屬性:
+    - stroke_mm: 引導使用的行程（mm）。
+    - speed_mm_s: duty 100% 時的實測速度（mm/s）。
+    - min_duty: 低於此 duty 馬達推不動，視為停止（%）。
+    - position_mm: 由驅動時間估計的目前位置（0 = 全縮）。
+    - direction / duty: 目前輸出的方向（1 伸出、-1 縮回、0 停止）與 duty（%）。
+    - drive_time: 累計的實際驅動時間（秒）。
+    """
+    def __init__(self, stroke_mm, speed_mm_s, min_duty=20.0, gain=4.0):
+        """
+        參數:
+        - stroke_mm, speed_mm_s, min_duty: 見類別說明。
+        - gain: 位置誤差的比例修正（1/s）；誤差 1 mm 時額外要求 gain mm/s 的速度。
+        """
+        if stroke_mm <= 0 or speed_mm_s <= 0:
+            raise ValueError("stroke_mm and speed_mm_s must be positive")
+        self.stroke_mm = float(stroke_mm)
+        self.speed_mm_s = float(speed_mm_s)
+        self.min_duty = float(min_duty)
+        self.gain = float(gain)
+        self.reset()
+
+    def reset(self, position_mm=0.0):
+        """重設位置估計（預設為全縮），並停止輸出。"""
+        self.position_mm = min(max(position_mm, 0.0), self.stroke_mm)
+        self.direction = 0
+        self.duty = 0.0
+        self.drive_time = 0.0
+
+    def speed_at(self, duty):
+        """duty（%）對應的速度（mm/s），以線性近似；低於 min_duty 為 0。"""
+        if duty < self.min_duty:
+            return 0.0
+        return self.speed_mm_s * min(duty, 100.0) / 100.0
+
+    def advance(self, dt):
+        """
+        以上一次的輸出（direction、duty）持續 dt 秒，更新位置估計。
+
+        行為:
+        - 位置限制在 [0, stroke_mm]；到端點後不再累計驅動時間。
+        """
+        if self.direction == 0 or dt <= 0:
+            return self.position_mm
+        pos = self.position_mm + self.direction * self.speed_at(self.duty) * dt
+        clamped = min(max(pos, 0.0), self.stroke_mm)
+        if clamped == pos:
+            self.drive_time += dt
+        self.position_mm = clamped
+        return clamped
+
+    def planned_speed(self, period):
+        """目標週期下的規劃速度（mm/s）：半個週期走完整個行程。"""
+        return self.stroke_mm / (period / 2.0)
+
+    def planned_duty(self, period):
+        """規劃速度對應的前饋 duty（%）；超過全速時為 100，行程會走不完。"""
+        duty = self.planned_speed(period) / self.speed_mm_s * 100.0
+        return min(100.0, max(self.min_duty, duty))
+
+    def planned_position(self, timer, period):
+        """週期內時間 timer（秒）時的規劃位置：前半週期線性伸出、後半週期線性縮回。"""
+        half = period / 2.0
+        if timer < half:
+            return self.stroke_mm * timer / half
+        return self.stroke_mm * max(0.0, period - timer) / half
+
+    def command(self, timer, period):
+        """
+        計算下一段時間的輸出。
+
+        參數:
+        - timer: 目前引導週期內已經過的時間（秒）。
+        - period: 目標呼吸週期（秒）。
+
+        返回: (direction, duty)
+
+        行為:
+        - 前饋速度 = ±規劃速度，加上 gain × 位置誤差的修正。
+        - 已到端點就不再往外推；需要的 duty 低於 min_duty 時停止。
+        """
+        v = self.planned_speed(period) if timer < period / 2.0 else -self.planned_speed(period)
+        v += self.gain * (self.planned_position(timer, period) - self.position_mm)
+
+        direction = 1 if v > 0 else -1 if v < 0 else 0
+        if (direction == 1 and self.position_mm >= self.stroke_mm) or (direction == -1 and self.position_mm <= 0.0):
+            direction = 0
+        duty = min(100.0, abs(v) / self.speed_mm_s * 100.0)
+        if duty < self.min_duty:
+            direction = 0
+        if direction == 0:
+            duty = 0.0
+
+        self.direction = direction
+        self.duty = duty
+        return direction, duty
+
+    def ratio(self):
+        """目前伸出比例（0.0 全縮 ~ 1.0 全伸）。"""
+        return self.position_mm / self.stroke_mm
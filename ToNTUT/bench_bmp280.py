@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BMP280 讀值路徑的效能與正確性比較（不需要硬體）。
+
+在 FakeSMBus 上量測 BMP280Driver 的每樣本 CPU 時間、I2C 傳輸次數與
+估算的匯流排時間，並以資料手冊範例值驗證補償結果。
+若已安裝 bmp280 函式庫且能在 FakeSMBus 上運作，一併列出它的數據。
+
+用法:
+    python3 bench_bmp280.py [樣本數]
+"""
+
+import sys
+import time
+
+from bmp280_driver import BMP280Driver, FakeSMBus, breathing_waveform
+
+
+def bench(sensor, bus, n):
+    bus.transactions = 0
+    bus.bus_us = 0.0
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        sensor.get_pressure()
+    elapsed = time.perf_counter_ns() - start
+    return elapsed / n / 1000.0, bus.transactions / n, bus.bus_us / n
+
+
+def main(argv):
+    n = int(argv[1]) if len(argv) > 1 else 20000
+
+    bus = FakeSMBus()
+    driver = BMP280Driver(bus)
+    driver.setup()
+    pressure, temperature = driver.read()
+    print(f"datasheet check: {temperature:.2f} C (expect 25.08), {pressure * 100:.2f} Pa (expect 100653.27)")
+
+    bus = FakeSMBus(waveform=breathing_waveform())
+    driver = BMP280Driver(bus)
+    driver.setup()
+    cpu_us, transactions, bus_us = bench(driver, bus, n)
+    print(f"{'driver':>8}: {cpu_us:6.2f} us CPU/sample, {transactions:.1f} I2C transactions/sample, "
+          f"~{bus_us:.0f} us bus/sample @ 400 kHz")
+    raw_start = time.perf_counter_ns()
+    for _ in range(n):
+        driver.read(raw=True)
+    print(f"{'raw':>8}: {(time.perf_counter_ns() - raw_start) / n / 1000.0:6.2f} us CPU/sample (no compensation)")
+
+    try:
+        from bmp280 import BMP280
+        bus = FakeSMBus(waveform=breathing_waveform())
+        library = BMP280(i2c_dev=bus)
+        library.setup(mode="normal")
+        cpu_us, transactions, bus_us = bench(library, bus, n)
+    except Exception as e:
+        print(f"{'library':>8}: unavailable ({type(e).__name__}: {e})")
+    else:
+        print(f"{'library':>8}: {cpu_us:6.2f} us CPU/sample, {transactions:.1f} I2C transactions/sample, "
+              f"~{bus_us:.0f} us bus/sample @ 400 kHz")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+比較舊版 lfilter 單樣本濾波與 SOS 串流引擎的每樣本耗時與輸出誤差。
+
+用法:
+    python3 bench_filter.py [樣本數]
+"""
+
+import sys
+import time
+import numpy as np
+from scipy.signal import butter, lfilter, lfilter_zi
+
+from sos_filter import RealTimeFilter
+
+lowpass_fs = 60.0
+lowpass_cutoff = 2.0
+lowpass_order = 4
+
+
+class LegacyRealTimeFilter:
+    """原本各控制迴圈中的實作：每個樣本呼叫一次 lfilter。"""
+    def __init__(self, order, cutoff, fs, initial_value=0.0):
+        nyquist = 0.5 * fs
+        normal_cutoff = cutoff / nyquist
+        self.b, self.a = butter(order, normal_cutoff, btype='low', analog=False)
+        self.zi = lfilter_zi(self.b, self.a) * initial_value
+
+    def process(self, value):
+        filtered_value, self.zi = lfilter(self.b, self.a, [value], zi=self.zi)
+        return filtered_value[0]
+
+
+def make_breathing_signal(n, fs=lowpass_fs):
+    """產生類似呼吸的壓力訊號（約 1013 hPa，0.25 Hz 起伏加雜訊）。"""
+    rng = np.random.default_rng(0)
+    t = np.arange(n) / fs
+    return 1013.25 + 0.08 * np.sin(2 * np.pi * 0.25 * t) + 0.01 * rng.standard_normal(n)
+
+
+def time_filter(flt, samples):
+    out = np.empty(len(samples))
+    process = flt.process
+    start = time.perf_counter_ns()
+    for i, x in enumerate(samples):
+        out[i] = process(x)
+    elapsed = time.perf_counter_ns() - start
+    return out, elapsed / 1000.0 / len(samples)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    samples = make_breathing_signal(n).tolist()
+
+    legacy = LegacyRealTimeFilter(lowpass_order, lowpass_cutoff, lowpass_fs, initial_value=samples[0])
+    fast = RealTimeFilter(lowpass_order, lowpass_cutoff, lowpass_fs, initial_value=samples[0])
+
+    ref, legacy_us = time_filter(legacy, samples)
+    out, fast_us = time_filter(fast, samples)
+
+    print(f"samples          : {n}")
+    print(f"lfilter (legacy) : {legacy_us:8.2f} us/sample")
+    print(f"SOS scalar path  : {fast_us:8.2f} us/sample  ({legacy_us / fast_us:.1f}x)")
+    print(f"max |diff|       : {np.max(np.abs(out - ref)):.3e} hPa")
+
+    # 區塊模式：一次濾波 64 個樣本
+    block = RealTimeFilter(lowpass_order, lowpass_cutoff, lowpass_fs, initial_value=samples[0])
+    arr = np.asarray(samples)
+    start = time.perf_counter_ns()
+    blk_out = np.concatenate([block.process_block(arr[i:i + 64]) for i in range(0, n, 64)])
+    block_us = (time.perf_counter_ns() - start) / 1000.0 / n
+    print(f"process_block(64): {block_us:8.2f} us/sample  max |diff| {np.max(np.abs(blk_out - ref)):.3e} hPa")
+
+    # 單樣本與區塊交錯呼叫，確認 zi 在兩條路徑之間銜接
+    mixed = RealTimeFilter(lowpass_order, lowpass_cutoff, lowpass_fs, initial_value=samples[0])
+    mixed_out = np.empty(n)
+    for i in range(0, n, 8):
+        chunk = arr[i:i + 8]
+        if (i // 8) % 2:
+            mixed_out[i:i + 8] = mixed.process_block(chunk)
+        else:
+            mixed_out[i:i + 8] = [mixed.process(v) for v in chunk]
+    print(f"mixed continuity : max |diff| {np.max(np.abs(mixed_out - ref)):.3e} hPa")
+
+if __name__ == "__main__":
+    main()
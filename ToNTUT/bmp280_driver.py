@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BMP280 暫存器層級驅動程式。
+
+bmp280 函式庫每次 get_pressure() 會做好幾次小的 I2C 傳輸再做浮點補償。
+這裡啟動時只讀一次校正 (trim) 參數並預先換算常數，之後每個樣本只做
+一次 6 bytes 的 burst read（0xF7~0xFC，壓力與溫度一起），
+也可以直接返回原始 ADC 計數給整數濾波使用。
+
+FakeSMBus 模擬感測器暫存器，可在沒有硬體的環境做正確性與速度測試。
+"""
+
+import math
+import struct
+
+REG_CALIBRATION = 0x88
+REG_CHIP_ID = 0xD0
+REG_RESET = 0xE0
+REG_DATA = 0xF7
+
+CHIP_ID = 0x58
+CALIBRATION_LENGTH = 24
+DATA_LENGTH = 6
+
+
+class BMP280Driver:
+    """
+    直接讀寫暫存器的 BMP280 驅動。
+
+    屬性:
+    - calibration: dig_T1..dig_T3、dig_P1..dig_P9 的 dict（setup 後才有）。
+    - last_temperature: 最近一次補償得到的溫度（°C）。
+    """
+    def __init__(self, bus, i2c_addr=0x76):
+        self.bus = bus
+        self.i2c_addr = i2c_addr
+        self.calibration = None
+        self.last_temperature = None
+
+    def chip_id(self):
+        """讀取晶片 ID 暫存器（BMP280 應為 0x58）。"""
+        return self.bus.read_byte_data(self.i2c_addr, REG_CHIP_ID)
+
+    def setup(self, mode="normal"):
+        """
+        確認晶片 ID 並快取校正參數。
+
+        參數:
+        - mode: 與 bmp280 函式庫相容而保留；取樣模式由 ContinuousBMP280 設定。
+
+        行為:
+        - 晶片 ID 不符時拋出 RuntimeError。
+        - 只讀一次 24 bytes 的校正區塊，並預先算好補償公式用到的常數。
+        """
+        chip = self.chip_id()
+        if chip != CHIP_ID:
+            raise RuntimeError(f"Unexpected BMP280 chip id 0x{chip:02X} at 0x{self.i2c_addr:02X}")
+        if self.calibration is not None:
+            return
+
+        block = bytes(self.bus.read_i2c_block_data(self.i2c_addr, REG_CALIBRATION, CALIBRATION_LENGTH))
+        names = ("dig_T1", "dig_T2", "dig_T3",
+                 "dig_P1", "dig_P2", "dig_P3", "dig_P4", "dig_P5", "dig_P6", "dig_P7", "dig_P8", "dig_P9")
+        self.calibration = dict(zip(names, struct.unpack("<HhhHhhhhhhhh", block)))
+
+        c = self.calibration
+        # 資料手冊 8.1 節浮點補償公式中與樣本無關的部分
+        self._t1 = c["dig_T1"] / 1024.0
+        self._t2 = float(c["dig_T2"])
+        self._t1b = c["dig_T1"] / 8192.0
+        self._t3 = float(c["dig_T3"])
+        self._p1 = float(c["dig_P1"])
+        self._p2 = c["dig_P2"] / 524288.0
+        self._p3 = c["dig_P3"] / 524288.0 / 524288.0
+        self._p4 = c["dig_P4"] * 65536.0
+        self._p5 = c["dig_P5"] * 2.0
+        self._p6 = c["dig_P6"] / 32768.0
+        self._p7 = float(c["dig_P7"])
+        self._p8 = c["dig_P8"] / 32768.0
+        self._p9 = c["dig_P9"] / 2147483648.0
+
+    def read_raw(self):
+        """
+        一次 burst read 讀出壓力與溫度的原始 ADC 值。
+
+        返回: (adc_P, adc_T)，皆為 20-bit 整數。
+        """
+        d = self.bus.read_i2c_block_data(self.i2c_addr, REG_DATA, DATA_LENGTH)
+        adc_p = (d[0] << 12) | (d[1] << 4) | (d[2] >> 4)
+        adc_t = (d[3] << 12) | (d[4] << 4) | (d[5] >> 4)
+        return adc_p, adc_t
+
+    def compensate(self, adc_p, adc_t):
+        """
+        以快取的常數做溫度與壓力補償。
+
+        返回: (pressure_hpa, temperature_c)。
+        """
+        x = adc_t / 16384.0 - self._t1
+        y = adc_t / 131072.0 - self._t1b
+        t_fine = x * self._t2 + y * y * self._t3
+        temperature = t_fine / 5120.0
+
+        var1 = t_fine / 2.0 - 64000.0
+        var2 = var1 * var1 * self._p6 + var1 * self._p5
+        var2 = var2 / 4.0 + self._p4
+        var1 = self._p3 * var1 * var1 + self._p2 * var1
+        var1 = (1.0 + var1 / 32768.0) * self._p1
+        if var1 == 0.0:
+            return 0.0, temperature
+
+        p = 1048576.0 - adc_p
+        p = (p - var2 / 4096.0) * 6250.0 / var1
+        p = p + (self._p9 * p * p + self._p8 * p + self._p7) / 16.0
+        return p / 100.0, temperature
+
+    def read(self, raw=False):
+        """
+        讀取一個樣本。
+
+        參數:
+        - raw: True 時返回原始 ADC 計數 (adc_P, adc_T)，否則返回 (hPa, °C)。
+        """
+        adc_p, adc_t = self.read_raw()
+        if raw:
+            return adc_p, adc_t
+        pressure, self.last_temperature = self.compensate(adc_p, adc_t)
+        return pressure, self.last_temperature
+
+    def get_pressure(self):
+        """與 bmp280 函式庫相容的介面：返回壓力（hPa）。"""
+        return self.read()[0]
+
+    def get_temperature(self):
+        """與 bmp280 函式庫相容的介面：返回溫度（°C）。"""
+        return self.read()[1]
+
+
+# 資料手冊 8.2 節的範例校正值與原始讀值（25.08 °C、1006.53 hPa）
+DATASHEET_CALIBRATION = (27504, 26435, -1000, 36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+DATASHEET_ADC_T = 519888
+DATASHEET_ADC_P = 415148
+
+
+class FakeSMBus:
+    """
+    模擬 BMP280 暫存器的 SMBus 替身。
+
+    屬性:
+    - transactions: 已執行的 I2C 傳輸次數。
+    - bus_us: 以 clock_hz 估算的匯流排佔用時間（微秒）。
+    - waveform: 可選的 callable(n) -> (adc_P, adc_T)，第 n 次讀資料暫存器時呼叫。
+    """
+    def __init__(self, bus=1, chip_id=CHIP_ID, calibration=DATASHEET_CALIBRATION,
+                 adc_p=DATASHEET_ADC_P, adc_t=DATASHEET_ADC_T, waveform=None, clock_hz=400000):
+        self.regs = bytearray(256)
+        self.regs[REG_CHIP_ID] = chip_id
+        self.regs[REG_CALIBRATION:REG_CALIBRATION + CALIBRATION_LENGTH] = struct.pack("<HhhHhhhhhhhh", *calibration)
+        self.waveform = waveform
+        self.clock_hz = clock_hz
+        self.transactions = 0
+        self.bus_us = 0.0
+        self._data_reads = 0
+        self.set_raw(adc_p, adc_t)
+
+    def set_raw(self, adc_p, adc_t):
+        """設定資料暫存器中的原始 ADC 值。"""
+        self.regs[REG_DATA:REG_DATA + DATA_LENGTH] = bytes((
+            (adc_p >> 12) & 0xFF, (adc_p >> 4) & 0xFF, (adc_p & 0x0F) << 4,
+            (adc_t >> 12) & 0xFF, (adc_t >> 4) & 0xFF, (adc_t & 0x0F) << 4,
+        ))
+
+    def _account(self, payload_bytes):
+        # 位址 + 暫存器 + 重複起始位址，再加上資料；每個 byte 9 個時脈
+        self.transactions += 1
+        self.bus_us += (3 + payload_bytes) * 9 * 1e6 / self.clock_hz
+
+    def _touch_data(self, register, length):
+        if self.waveform is not None and register <= REG_DATA < register + length:
+            self.set_raw(*self.waveform(self._data_reads))
+            self._data_reads += 1
+
+    def read_byte_data(self, i2c_addr, register):
+        self._account(1)
+        self._touch_data(register, 1)
+        return self.regs[register]
+
+    def write_byte_data(self, i2c_addr, register, value):
+        self._account(1)
+        self.regs[register] = value & 0xFF
+
+    def read_i2c_block_data(self, i2c_addr, register, length):
+        self._account(length)
+        self._touch_data(register, length)
+        return list(self.regs[register:register + length])
+
+    def write_i2c_block_data(self, i2c_addr, register, data):
+        self._account(len(data))
+        self.regs[register:register + len(data)] = bytes(data)
+
+    def close(self):
+        pass
+
+
+def breathing_waveform(fs=60.0, period=4.0, counts=400):
+    """FakeSMBus 用的呼吸波形：adc_P 以 period 秒為週期起伏 counts 個計數。"""
+    def waveform(n):
+        adc_p = DATASHEET_ADC_P + int(counts * math.sin(2 * math.pi * n / (fs * period)))
+        return adc_p, DATASHEET_ADC_T
+    return waveform
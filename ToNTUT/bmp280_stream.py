@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BMP280 連續模式 (normal mode) 取樣後端。
+
+forced mode 每次讀值都要觸發一次轉換並等它完成，實際取樣率被轉換時間
+卡在 60 Hz 以下。這裡讓感測器在 normal mode 自己持續轉換，控制迴圈
+只讀結果暫存器，並統計實際拿到的新樣本速率與讀取耗時。
+"""
+
+import time
+
+from bmp280_driver import BMP280Driver
+
+REG_STATUS = 0xF3
+REG_CTRL_MEAS = 0xF4
+REG_CONFIG = 0xF5
+
+MODE_SLEEP = 0b00
+MODE_NORMAL = 0b11
+
+# 資料手冊 3.3 / 3.6 / 3.8 節的暫存器編碼
+OVERSAMPLING = {0: 0, 1: 1, 2: 2, 4: 3, 8: 4, 16: 5}
+STANDBY_MS = {0.5: 0, 62.5: 1, 125: 2, 250: 3, 500: 4, 1000: 5, 2000: 6, 4000: 7}
+IIR_FILTER = {0: 0, 2: 1, 4: 2, 8: 3, 16: 4}
+
+
+def _encode(table, value, name):
+    if value not in table:
+        raise ValueError(f"Unsupported {name}: {value} (choose from {sorted(table)})")
+    return table[value]
+
+
+class ContinuousBMP280:
+    """
+    以 normal mode 執行的 BMP280。
+
+    屬性:
+    - pressure_oversampling / temperature_oversampling: 過取樣倍數。
+    - iir_filter: 晶片內 IIR 濾波係數（0 = 關閉）。
+    - standby_ms: 兩次轉換之間的待機時間（毫秒）。
+    """
+    def __init__(self, bus, i2c_addr=0x76, pressure_oversampling=4, temperature_oversampling=1,
+                 iir_filter=0, standby_ms=0.5, sensor=None):
+        """
+        初始化設定（尚未寫入感測器，需呼叫 start）。
+
+        參數:
+        - bus: SMBus 實例。
+        - i2c_addr: 感測器位址（0x76 或 0x77）。
+        - pressure_oversampling, temperature_oversampling: 1/2/4/8/16（溫度可為 0 = 略過）。
+        - iir_filter: 0/2/4/8/16。
+        - standby_ms: 0.5/62.5/125/250/500/1000/2000/4000。
+        - sensor: 提供 setup()/get_pressure() 的讀值物件；None 時使用 BMP280Driver。
+        """
+        self.bus = bus
+        self.i2c_addr = i2c_addr
+        self.pressure_oversampling = pressure_oversampling
+        self.temperature_oversampling = temperature_oversampling
+        self.iir_filter = iir_filter
+        self.standby_ms = standby_ms
+        self.sensor = sensor
+
+        self._ctrl_meas = (
+            _encode(OVERSAMPLING, temperature_oversampling, "temperature oversampling") << 5
+            | _encode(OVERSAMPLING, pressure_oversampling, "pressure oversampling") << 2
+        )
+        self._config = (
+            _encode(STANDBY_MS, standby_ms, "standby time") << 5
+            | _encode(IIR_FILTER, iir_filter, "IIR filter") << 2
+        )
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._reads = 0
+        self._fresh = 0
+        self._read_ns_total = 0
+        self._read_ns_max = 0
+        self._last_value = None
+        self._first_ns = None
+        self._last_ns = None
+
+    def measurement_time_ms(self, maximum=False):
+        """
+        一次轉換所需時間（資料手冊 9.1 節）。
+
+        參數:
+        - maximum: True 返回最大值，False 返回典型值。
+        """
+        t = self.temperature_oversampling
+        p = self.pressure_oversampling
+        if maximum:
+            return 1.25 + 2.3 * t + (2.3 * p + 0.575 if p else 0.0)
+        return 1.0 + 2.0 * t + (2.0 * p + 0.5 if p else 0.0)
+
+    def nominal_rate_hz(self):
+        """normal mode 的理論輸出速率 = 1 / (轉換時間 + 待機時間)。"""
+        return 1000.0 / (self.measurement_time_ms() + self.standby_ms)
+
+    def configure(self):
+        """
+        寫入取樣設定並切換到 normal mode。
+
+        行為:
+        - 先進入 sleep mode，因為 normal mode 下寫入 config 暫存器可能被忽略。
+        - 寫入 config（待機時間、IIR），再寫入 ctrl_meas（過取樣、normal mode）。
+        """
+        self.bus.write_byte_data(self.i2c_addr, REG_CTRL_MEAS, self._ctrl_meas | MODE_SLEEP)
+        self.bus.write_byte_data(self.i2c_addr, REG_CONFIG, self._config)
+        self.bus.write_byte_data(self.i2c_addr, REG_CTRL_MEAS, self._ctrl_meas | MODE_NORMAL)
+
+    def open(self):
+        """
+        確認晶片 ID 並快取校正參數（setup），只讀取、不改變感測器的模式。
+
+        行為:
+        - 可以在其他程式仍在使用感測器時預先呼叫（例如 standby worker）。
+        """
+        if self.sensor is None:
+            self.sensor = BMP280Driver(self.bus, self.i2c_addr)
+        self.sensor.setup(mode="normal")
+
+    def start(self):
+        """
+        初始化感測器並開始連續轉換。
+
+        行為:
+        - open() 之後寫入本物件的取樣設定。
+        - 等待第一次轉換完成，避免讀到重置值。
+        """
+        self.open()
+        self.configure()
+        time.sleep(self.measurement_time_ms(maximum=True) / 1000.0)
+        self._reset_stats()
+
+    def stop(self):
+        """讓感測器回到 sleep mode。"""
+        self.bus.write_byte_data(self.i2c_addr, REG_CTRL_MEAS, self._ctrl_meas | MODE_SLEEP)
+
+    def get_pressure(self):
+        """
+        讀取最新一次轉換的壓力值（hPa），不觸發新的轉換。
+
+        行為:
+        - 記錄讀取耗時；數值與上一次不同時視為拿到新樣本。
+        """
+        start = time.perf_counter_ns()
+        value = self.sensor.get_pressure()
+        end = time.perf_counter_ns()
+
+        elapsed = end - start
+        self._reads += 1
+        self._read_ns_total += elapsed
+        if elapsed > self._read_ns_max:
+            self._read_ns_max = elapsed
+        if value != self._last_value:
+            self._fresh += 1
+            self._last_value = value
+        if self._first_ns is None:
+            self._first_ns = start
+        self._last_ns = end
+        return value
+
+    def stats(self):
+        """
+        返回取樣統計（dict）。
+
+        - reads / fresh_samples: 讀取次數與拿到新樣本的次數。
+        - read_rate_hz / sample_rate_hz: 讀取速率與實際新樣本速率。
+        - read_us_mean / read_us_max: 每次讀取的 I2C 耗時。
+        - conversion_ms: 一次轉換的典型時間。
+        - data_age_ms: 讀到的資料平均已經過多久（轉換時間 + 半個輸出週期）。
+        """
+        span = (self._last_ns - self._first_ns) / 1e9 if self._reads > 1 else 0.0
+        period_ms = 1000.0 / self.nominal_rate_hz()
+        return {
+            "reads": self._reads,
+            "fresh_samples": self._fresh,
+            "read_rate_hz": (self._reads - 1) / span if span > 0 else 0.0,
+            "sample_rate_hz": (self._fresh - 1) / span if span > 0 else 0.0,
+            "read_us_mean": self._read_ns_total / self._reads / 1000.0 if self._reads else 0.0,
+            "read_us_max": self._read_ns_max / 1000.0,
+            "nominal_rate_hz": self.nominal_rate_hz(),
+            "conversion_ms": self.measurement_time_ms(),
+            "data_age_ms": self.measurement_time_ms() + period_ms / 2.0,
+        }
+
+    def describe(self):
+        return (f"normal mode, osrs_p x{self.pressure_oversampling}, osrs_t x{self.temperature_oversampling}, "
+                f"IIR {self.iir_filter}, standby {self.standby_ms} ms, ~{self.nominal_rate_hz():.0f} Hz")
+
+    def report(self):
+        s = self.stats()
+        return (f"[BMP280] reads {s['reads']} @ {s['read_rate_hz']:.1f} Hz, "
+                f"fresh {s['fresh_samples']} @ {s['sample_rate_hz']:.1f} Hz (nominal {s['nominal_rate_hz']:.1f} Hz), "
+                f"read {s['read_us_mean']:.0f}/{s['read_us_max']:.0f} us mean/max, "
+                f"conversion {s['conversion_ms']:.1f} ms, data age ~{s['data_age_ms']:.1f} ms")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量化的呼吸週期擷取器。
+
+與 init_guide_phase / validate_stable 中逐樣本的狀態機結果相同
+（吐氣 -> 吸氣 的轉換視為一次呼吸的開始），但整段陣列一次算完，
+可以離線分析 csv_save.py 產生的 raw_data.csv，也可以讓即時引擎批次評估。
+
+用法:
+    python3 breath_cycles.py raw_data.csv [more.csv ...]
+"""
+
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+INHALE = 1
+EXHALE = -1
+
+BreathCycles = namedtuple(
+    "BreathCycles",
+    ["onsets", "exhale_starts", "durations", "inhale_durations", "exhale_durations"],
+)
+BreathCycles.__doc__ = """
+擷取結果（皆為 numpy 陣列）。
+
+- onsets: 每次呼吸開始（吐氣 -> 吸氣）的樣本索引。
+- exhale_starts: 每次 吸氣 -> 吐氣 轉換的樣本索引。
+- durations: 每個 onset 對應的呼吸時間（秒），與迴圈版 count * sampling_rate 相同。
+- inhale_durations / exhale_durations: 每次呼吸中吸氣與吐氣各佔的時間（秒）。
+"""
+
+
+def find_transitions(actions, initial_state=INHALE):
+    """
+    找出動作序列中狀態真正切換的位置。
+
+    參數:
+    - actions: 每個樣本的動作，1 = 吸氣、-1 = 吐氣、0 = 無變化。
+    - initial_state: 序列開始前的狀態（INHALE 或 EXHALE）。
+
+    返回: (indices, states)，切換發生的索引與切換後的新狀態。
+    """
+    actions = np.asarray(actions, dtype=np.int8)
+    moving = np.flatnonzero(actions)
+    if moving.size == 0:
+        return moving, actions[:0]
+
+    seq = actions[moving]
+    prev = np.concatenate(([initial_state], seq[:-1]))
+    changed = seq != prev
+    return moving[changed], seq[changed]
+
+
+def extract_breath_cycles(filtered, sampling_rate, initial_state=INHALE, timestamps=None):
+    """
+    從濾波後的壓力陣列一次擷取所有呼吸週期。
+
+    參數:
+    - filtered: 濾波後的壓力陣列。
+    - sampling_rate: 取樣間隔（秒），用於 count * sampling_rate 的時間計算。
+    - initial_state: 狀態機的初始狀態（thesis 版為 INHALE，fix_version 版為 EXHALE）。
+    - timestamps: 可選，每個樣本的實際時間戳（秒）；提供時改用時間差計算時長。
+
+    返回: BreathCycles。
+
+    行為:
+    - 與迴圈版相同，第 i 個樣本的動作由 filtered[i] 與 filtered[i - 1] 比較決定。
+    - 第一次呼吸的長度從索引 1 開始計算，其後為相鄰 onset 的間隔。
+    """
+    filtered = np.asarray(filtered, dtype=float)
+    actions = np.sign(np.diff(filtered)).astype(np.int8)
+    idx, states = find_transitions(actions, initial_state)
+    idx = idx + 1
+
+    onsets = idx[states == INHALE]
+    exhale_starts = idx[states == EXHALE]
+    starts = np.concatenate(([1], onsets[:-1]))[:onsets.size].astype(onsets.dtype)
+
+    # 每個 onset 之前最近的一次 吸氣 -> 吐氣 轉換（狀態交替，所以必落在同一週期內）
+    if exhale_starts.size:
+        pos = np.searchsorted(exhale_starts, onsets) - 1
+        split = np.where(pos >= 0, exhale_starts[np.maximum(pos, 0)], starts)
+    else:
+        split = starts
+
+    if timestamps is None:
+        durations = (onsets - starts) * float(sampling_rate)
+        inhale = (split - starts) * float(sampling_rate)
+        exhale = (onsets - split) * float(sampling_rate)
+    else:
+        t = np.asarray(timestamps, dtype=float)
+        durations = t[onsets] - t[starts]
+        inhale = t[split] - t[starts]
+        exhale = t[onsets] - t[split]
+
+    return BreathCycles(onsets, exhale_starts, durations, inhale, exhale)
+
+
+def load_session(path):
+    """讀取 csv_save.py 格式的 raw_data.csv（欄位 time, pressure）。返回 (time, pressure)。"""
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    return data[:, 0], data[:, 1]
+
+
+def main(paths):
+    from filter_design import get_filter
+    from scipy.signal import sosfiltfilt
+
+    sos = get_filter(4, 2.0, 60.0, "low").sos
+    for path in paths:
+        t, pressure = load_session(path)
+        try:
+            filtered = sosfiltfilt(sos, pressure)
+        except ValueError:
+            filtered = pressure
+        cycles = extract_breath_cycles(filtered, 0.0, timestamps=t)
+        n = len(cycles.onsets)
+        if n == 0:
+            print(f"{path}: no breaths detected ({len(pressure)} samples)")
+            continue
+        print(f"{path}: {n} breaths, median {np.median(cycles.durations):.2f}s, "
+              f"inhale {np.mean(cycles.inhale_durations):.2f}s / exhale {np.mean(cycles.exhale_durations):.2f}s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 breath_cycles.py raw_data.csv [more.csv ...]")
+        sys.exit(1)
+    main(sys.argv[1:])
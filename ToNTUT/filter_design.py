@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共用的濾波器設計登錄表。
+
+所有入口（RealTimeFilter、PressureWindow、舊腳本的 butter_lowpass）都從這裡
+取得 Butterworth 係數，以 (order, cutoff, fs, btype) 為鍵記憶起來。
+預先計算好的表格存在 filter_tables.json，執行期命中表格時完全不需要
+import scipy.signal，縮短子程序冷啟動時間。
+
+用法（重新產生表格）:
+    python3 filter_design.py
+"""
+
+import os
+import json
+from collections import namedtuple
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_PATH = os.path.join(CURRENT_DIR, "filter_tables.json")
+
+# 各腳本實際使用的設計：RealTimeFilter (4 階) 與 thesis/舊版 filtfilt (5 階)
+STANDARD_DESIGNS = [
+    (4, 2.0, 60.0, "low"),
+    (5, 2.0, 60.0, "low"),
+]
+
+FilterDesign = namedtuple("FilterDesign", ["b", "a", "sos", "zi", "sos_zi"])
+FilterDesign.__doc__ = """
+一組濾波器係數。
+
+- b, a: 傳遞函數係數（lfilter / filtfilt 使用）。
+- sos: 二階節係數 (n_sections, 6)。
+- zi: lfilter_zi(b, a)，單位階躍的穩態狀態模板。
+- sos_zi: sosfilt_zi(sos)，同上，SOS 版本。
+"""
+
+_designs = {}
+_tables_loaded = False
+
+
+def design_key(order, cutoff, fs, btype="low"):
+    return (int(order), float(cutoff), float(fs), str(btype))
+
+
+def _key_to_str(key):
+    return "{}:{!r}:{!r}:{}".format(*key)
+
+
+def _key_from_str(text):
+    order, cutoff, fs, btype = text.split(":")
+    return design_key(order, cutoff, fs, btype)
+
+
+def design_filter(order, cutoff, fs, btype="low"):
+    """
+    用 scipy 設計一組 Butterworth 濾波器（不經過快取）。
+
+    參數:
+    - order: 濾波器階數（整數）。
+    - cutoff: 截止頻率（Hz）。
+    - fs: 採樣頻率（Hz）。
+    - btype: 'low'、'high' 等，直接傳給 scipy.signal.butter。
+
+    返回: FilterDesign。
+    """
+    from scipy.signal import butter, lfilter_zi, sosfilt_zi
+
+    nyquist = 0.5 * fs
+    normal_cutoff = cutoff / nyquist
+    b, a = butter(order, normal_cutoff, btype=btype, analog=False)
+    sos = butter(order, normal_cutoff, btype=btype, analog=False, output='sos')
+    return FilterDesign(b, a, sos, lfilter_zi(b, a), sosfilt_zi(sos))
+
+
+def load_tables(path=TABLE_PATH):
+    """
+    從 JSON 檔載入預先計算的係數表並併入快取。
+
+    返回: 載入的設計數量；檔案不存在時返回 0。
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        tables = json.load(f)
+    for text, entry in tables.items():
+        _designs.setdefault(_key_from_str(text), FilterDesign(
+            np.asarray(entry["b"]), np.asarray(entry["a"]), np.asarray(entry["sos"]),
+            np.asarray(entry["zi"]), np.asarray(entry["sos_zi"]),
+        ))
+    return len(tables)
+
+
+def save_tables(path=TABLE_PATH):
+    """把目前快取中的所有設計寫入 JSON 檔。"""
+    tables = {
+        _key_to_str(key): {field: value.tolist() for field, value in design._asdict().items()}
+        for key, design in sorted(_designs.items())
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(tables, f, indent=1)
+        f.write("\n")
+
+
+def get_filter(order, cutoff, fs, btype="low"):
+    """
+    取得 (order, cutoff, fs, btype) 的濾波器設計。
+
+    行為:
+    - 先查記憶體快取；第一次查詢時載入 filter_tables.json。
+    - 都沒有時才呼叫 design_filter（import scipy.signal）並記憶結果。
+    """
+    global _tables_loaded
+    key = design_key(order, cutoff, fs, btype)
+    design = _designs.get(key)
+    if design is not None:
+        return design
+
+    if not _tables_loaded:
+        _tables_loaded = True
+        load_tables()
+        design = _designs.get(key)
+        if design is not None:
+            return design
+
+    design = design_filter(*key)
+    _designs[key] = design
+    return design
+
+
+def dc_group_delay(sos):
+    """
+    計算 SOS 濾波器在 0 Hz 附近的群延遲（樣本數），呼吸頻率 (<1 Hz) 下近似成立。
+
+    行為:
+    - 每節 H(z) = B(z)/A(z) 的 DC 群延遲為 Σk·b_k/Σb_k − Σk·a_k/Σa_k，各節相加。
+    - 只用 numpy，執行期不需要 scipy.signal.group_delay。
+    """
+    sos = np.atleast_2d(np.asarray(sos, dtype=float))
+    k = np.arange(3)
+    b, a = sos[:, :3], sos[:, 3:]
+    return float(np.sum(b @ k / b.sum(axis=1) - a @ k / a.sum(axis=1)))
+
+
+def butter_lowpass(cutoff, fs, order=5):
+    """與舊腳本 butter_lowpass 相同的介面，但係數只設計一次。返回 (b, a)。"""
+    design = get_filter(order, cutoff, fs, "low")
+    return design.b, design.a
+
+
+if __name__ == "__main__":
+    for key in STANDARD_DESIGNS:
+        _designs[design_key(*key)] = design_filter(*key)
+    save_tables()
+    print(f"Saved {len(_designs)} filter designs to {TABLE_PATH}")
@@ -1,17 +1,25 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import sys
 import time
 import signal
+import threading
 import numpy as np
 from enum import Enum
-from scipy.signal import butter, lfilter, lfilter_zi
+from breath_cycles import find_transitions, INHALE, EXHALE
+from onset_detector import make_detector
+from bmp280_stream import ContinuousBMP280
+from acquisition import AcquisitionThread
+from guide_table import GuidePlayer, PROGRESS_MIN, PROGRESS_RANGE
+from actuator_driver import ActuatorDriver
+from sync_protocol import (ProgressFrameWriter, CycleFrameWriter, StopFrameWriter, CYCLE_START, CYCLE_WRAP,
+                           CYCLE_PERIOD, CYCLE_CORRECTION, STOP_ACK, STOP_PARKED, STOP_RELEASED)
 
 # --- GPIO & Sensor Imports ---
 try:
     import RPi.GPIO as GPIO
-    from bmp280 import BMP280
     from smbus2 import SMBus
 except ImportError:
     from smbus import SMBus
@@ -37,71 +45,40 @@ in1 = 23
 in2 = 24
 en = 25
 
+actuator = ActuatorDriver(in1, in2, en)
+
+# --- Sensor Definition ---
+i2c_bus_number = 1
+bmp280_i2c_addr = 0x76               # SDO 接 VCC 的感測器為 0x77（同一條 bus 可接兩個）
+
 # --- Parameters ---
 sampling_rate = 1.0 / 60.0  
 lowpass_fs = 60.0          
 lowpass_cutoff = 2.0        
 lowpass_order = 4          
+bmp280_pressure_oversampling = 4     # normal mode: 轉換約 11.5 ms，輸出約 83 Hz
+bmp280_temperature_oversampling = 1
+bmp280_iir_filter = 0                # 晶片內 IIR；平滑交給軟體濾波，避免額外延遲
+bmp280_standby_ms = 0.5
+acquisition_spin_us = 500            # 取樣期限前最後這段改用忙等，降低喚醒抖動；0 = 只用 sleep
+block_detection_min = 96             # lag 模式下一批至少這麼多樣本才整批 sosfilt（sosfilt 每次呼叫約 60 us，
+                                     # 逐樣本約 0.7 us/樣本，約 100 個樣本才划算；60 Hz 下通常一批 1~2 個）
+breath_detector_mode = "lag"         # "lag": 原本的 Butterworth 相鄰比較（預設）；"predictive": 斜率/曲率預測轉折點，
+                                     # 延遲較低但最短相位 0.8 s 的遲滯會吃掉週期短於約 1.6 s 的快速呼吸，需自行開啟
 
 sampling_window = 4
 increase_breath_time = 0.5
-linear_actuator_max_distance = 50
+actuator_stroke_mm = 10.0            # 引導行程；原本 50 步 @ 60 Hz 約等於 0.83 秒全速行程
+actuator_speed_mm_s = 12.0           # duty 100% 時的實測速度（換致動器時需重新量測）
+actuator_min_duty = 20.0             # 低於此 duty 推不動
+guide_schedule_horizon = 0.25        # 每批樣本後把之後這段時間的引導指令排進致動器佇列，下一批晚到時馬達仍照表切換
 success_threshold = 15
 fail_threshold = 50
 
 warmup_duration = 5.0
 mirror_duration = 60.0
-shutdown_requested = False
-
-
-def request_shutdown(signum, frame):
-    global shutdown_requested
-    shutdown_requested = True
-    print(f"\n>>> 收到停止訊號 ({signum})，準備安全關閉...", flush=True)
-
-class RealTimeFilter:
-    """
-    實時低通濾波器類別，用於平滑壓力感測器數據，減少噪聲。
-    
-    屬性:
-    - b, a: 濾波器係數，由 butter 函數生成。
-    - zi: 初始狀態向量，用於維持濾波器狀態。
-    """
-    def __init__(self, order, cutoff, fs, initial_value=0.0):
-        """
-        初始化濾波器。
-        
-        參數:
-        - order: 濾波器階數（整數）。
-        - cutoff: 截止頻率（Hz）。
-        - fs: 採樣頻率（Hz）。
-        - initial_value: 初始值，用於設置 zi。
-        
-        行為:
-        - 計算正規化截止頻率。
-        - 使用 scipy.signal.butter 生成濾波器係數。
-        - 初始化 zi 為初始值的狀態。
-        """
-        nyquist = 0.5 * fs
-        normal_cutoff = cutoff / nyquist
-        self.b, self.a = butter(order, normal_cutoff, btype='low', analog=False)
-        self.zi = lfilter_zi(self.b, self.a) * initial_value
-    
-    def process(self, value):
-        """
-        處理單個輸入值，返回濾波後的值。
-        
-        參數:
-        - value: 輸入的原始壓力值（浮點數）。
-        
-        返回: 濾波後的值（浮點數）。
-        
-        行為:
-        - 使用 lfilter 應用濾波器，更新 zi 狀態。
-        - 返回濾波結果的第一個元素。
-        """
-        filtered_value, self.zi = lfilter(self.b, self.a, [value], zi=self.zi)
-        return filtered_value[0]
+cycle_correction_interval = 2.0  # 週期參數模式下，兩次 CYCLE 訊框之間最長間隔（秒）
+STANDBY_READY = "STANDBY_READY"   # standby worker 準備好時印出的行（rpi_server 等待這一行）
 
 # --- Helper Functions ---
 def validate_stable(breath_times, target_breath_time):
@@ -137,237 +114,513 @@ def validate_stable(breath_times, target_breath_time):
         
     return EvalState.NONE, target_breath_time
 
-def move_linear_actuator(direction):
+def detect_user_actions(prev_filtered, filtered_block):
+    """
+    一次判斷一整段濾波後壓力值的吸吐動作（搭配 LagDetector.filter_block，對應 "lag" 模式）。
+
+    參數:
+    - prev_filtered: 這段資料之前最後一個濾波值。
+    - filtered_block: 濾波後的壓力陣列。
+
+    返回: int8 陣列，1 = INHALE、-1 = EXHALE、0 = 無變化；與逐樣本比較
+    `curr_filtered > prev_filtered` 的結果相同。
+    """
+    filtered_block = np.asarray(filtered_block, dtype=float)
+    return np.sign(np.diff(filtered_block, prepend=prev_filtered)).astype(np.int8)
+
+def find_user_transitions(user_state, actions):
+    """
+    找出一段動作序列中使用者狀態真正切換的位置，不需逐樣本跑狀態機。
+
+    參數:
+    - user_state: 這段資料開始前的 UserState。
+    - actions: detect_user_actions 的輸出。
+
+    返回: (indices, states)
+    - indices: 狀態切換發生的樣本索引（int 陣列）。
+    - states: 每個切換後的新狀態（1 = INHALE、-1 = EXHALE）。
+    """
+    initial = INHALE if user_state == UserState.INHALE else EXHALE
+    return find_transitions(actions, initial)
+
+def move_linear_actuator(direction, duty=None, driver=None):
+    # 方向與 duty 沒變時 ActuatorDriver 不會呼叫 GPIO；driver 為 None 時使用預設腳位的 actuator
     try:
-        if direction == 1:
-            GPIO.output(in1, GPIO.HIGH)
-            GPIO.output(in2, GPIO.LOW)
-        elif direction == -1:
-            GPIO.output(in1, GPIO.LOW)
-            GPIO.output(in2, GPIO.HIGH)
-        else:
-            GPIO.output(in1, GPIO.LOW)
-            GPIO.output(in2, GPIO.LOW)
+        (driver or actuator).move(direction, duty)
     except Exception:
         pass
 
-def guide_breathing_logic(timer, target, pos):
-    direct = 0
-    half = target / 2.0
-    
-    if timer < half:
-        # 吸氣階段：馬達伸出
-        if pos <= linear_actuator_max_distance: direct = 1
-        else: direct = 0
-        timer += sampling_rate
-    elif timer >= half and timer < target:
-        # 吐氣階段：馬達縮回
-        if pos >= 0: direct = -1
-        else: direct = 0
-        timer += sampling_rate
-    
-    if timer >= target: timer = 0
+def guide_breathing_logic(guide, dt=sampling_rate):
+    """
+    引導模式下每個樣本的查表。
+
+    參數:
+    - guide: GuidePlayer，播放目前目標週期預先編譯好的波形表。
+    - dt: 與上一個樣本的實際時間差（秒），由樣本時間戳算出。
 
-    move_linear_actuator(direct)
-    pos += direct
-    return timer, pos, direct
+    返回: (direct, duty, progress)
 
-# --- Main Logic ---
-def main():
-    global shutdown_requested
+    行為:
+    - 前半週期伸出、後半週期縮回；方向、duty 與進度值都直接查表。
+    - 不直接控制馬達；整批樣本處理完後由 schedule_guide_moves 依實際時間下指令。
+    """
+    return guide.step(dt)
 
+def schedule_guide_moves(guide, driver, sample_ns, horizon=guide_schedule_horizon):
     """
-    呼吸控制系統的主函數，實現暖機、鏡像和引導階段。
-    
+    依引導表把馬達指令排進致動器的指令佇列。
+
+    參數:
+    - guide: GuidePlayer，計時器停在 sample_ns 那個樣本。
+    - driver: 要控制的 ActuatorDriver。
+    - sample_ns: 這批最後一個樣本的 monotonic 時間戳。
+    - horizon: 往後排多少秒的指令。
+
     行為:
-    - 印出啟動訊息。
-    - 初始化 GPIO 和 PWM 控制馬達。
-    - 初始化 BMP280 感測器，讀取初始壓力值。
-    - 初始化濾波器、狀態變數和計時器。
-    - 進入主循環：
-      - 讀取和濾波壓力數據。
-      - 檢測用戶呼吸動作（吸氣/吐氣）。
-      - 根據機器狀態處理：
-        - WARMUP: 等待暖機時間，記錄用戶動作。
-        - MIRROR: 記錄用戶呼吸時間，計算平均目標。
-        - GUIDE: 控制馬達引導呼吸，評估穩定性，發送 SYNC_PROGRESS。
-      - 控制循環時間以維持採樣率。
-    - 處理中斷和異常，清理 GPIO。
+    - 樣本時間戳落後於現在，所以先把現在對應的表格指令立即送出，
+      再把 horizon 內方向或 duty 改變的格子以絕對時間 submit，由主迴圈每輪 poll() 執行。
+    - 每批都會清掉上一批排的指令重排（set_period 換表後也會跟著更新）。
     """
-    print(">>> 呼吸控制系統啟動 (0.3~0.7 範圍控制模式)...", flush=True)
-    signal.signal(signal.SIGTERM, request_shutdown)
-    signal.signal(signal.SIGINT, request_shutdown)
-    
-    # GPIO 初始化
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(in1, GPIO.OUT)
-    GPIO.setup(in2, GPIO.OUT)
-    GPIO.setup(en, GPIO.OUT)
-    GPIO.output(in1, GPIO.LOW)
-    GPIO.output(in2, GPIO.LOW)
-    
-    p = GPIO.PWM(en, 800)
-    p.start(100)
+    ahead = max(0.0, (time.monotonic_ns() - sample_ns) / 1e9)
+    commands = guide.commands(ahead, horizon)
+    driver.clear_commands()
+    _, direct, duty = commands[0]
+    move_linear_actuator(direct, duty, driver)
+    for offset, direct, duty in commands[1:]:
+        driver.submit(direct, duty, at_ns=sample_ns + int(offset * 1e9))
+
+# --- Main Logic ---
+def _print_line(line):
+    print(line, flush=True)
+
+class BreathingEngine:
+    """
+    呼吸控制引擎，可以在獨立程序（main()）或伺服器程序內的執行緒中執行。
+
+    屬性:
+    - emit: 輸出一行文字的函數（預設印到 stdout）。
+    - frame_sink: 接收二進位同步訊框（memoryview，見 sync_protocol）的函數；
+      None 時改用 emit 印出 SYNC_PROGRESS 文字行。
+    - error: run() 因例外結束時的例外；正常停止時為 None。
+    - started_ns / first_sample_ns: run() 開始與第一批樣本處理完成的 monotonic 時間（尚未發生時為 None）。
+    - actuator: 這個引擎控制的 ActuatorDriver。
+    - stop_requested_ns: request_stop() 第一次被呼叫的 monotonic 時間（沒有時為 None）。
+    - stop_stages: STOP_ACK / STOP_PARKED / STOP_RELEASED -> 完成的 monotonic 時間。
+    - i2c_bus / i2c_addr: BMP280 所在的 I2C bus 編號與位址。
+
+    同一個程序內可以同時執行多個引擎（一台 Pi 接多組感測器與致動器），
+    只要每個引擎的腳位與感測器位址不重複。
+    """
+    def __init__(self, emit=None, frame_sink=None, pins=None, i2c_bus=None, i2c_addr=None):
+        """
+        參數:
+        - pins: 致動器腳位 (in1, in2, en)；None 表示預設腳位（模組層級的 actuator）。
+        - i2c_bus / i2c_addr: None 表示 i2c_bus_number / bmp280_i2c_addr。
+        """
+        self.emit = emit if emit is not None else _print_line
+        self.frame_sink = frame_sink
+        if pins is None or tuple(pins) == (in1, in2, en):
+            self.actuator = actuator
+        else:
+            self.actuator = ActuatorDriver(*pins)
+        self.i2c_bus = i2c_bus_number if i2c_bus is None else i2c_bus
+        self.i2c_addr = bmp280_i2c_addr if i2c_addr is None else i2c_addr
+        self.error = None
+        self.started_ns = None
+        self.first_sample_ns = None
+        self.bus = None
+        self.bmp280 = None
+        self.stop_requested_ns = None
+        self.stop_stages = {}
+        self._stop_frames = StopFrameWriter()
+        self._acquisition = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def open_sensor(self):
+        """
+        開啟 I2C bus 並讀取 BMP280 的晶片 ID 與校正參數（不改變感測器模式、不碰 GPIO）。
+
+        行為:
+        - 已開啟時不重複開啟；run() 會在需要時自動呼叫。
+        """
+        if self.bmp280 is not None:
+            return self.bmp280
+        bus = SMBus(self.i2c_bus)
+        try:
+            bmp280 = ContinuousBMP280(
+                bus,
+                i2c_addr=self.i2c_addr,
+                pressure_oversampling=bmp280_pressure_oversampling,
+                temperature_oversampling=bmp280_temperature_oversampling,
+                iir_filter=bmp280_iir_filter,
+                standby_ms=bmp280_standby_ms,
+            )
+            bmp280.open()
+        except Exception:
+            bus.close()
+            raise
+        self.bus = bus
+        self.bmp280 = bmp280
+        return bmp280
+
+    def close_sensor(self):
+        """讓感測器回到 sleep mode 並關閉 I2C bus。"""
+        bmp280, bus = self.bmp280, self.bus
+        self.bmp280 = None
+        self.bus = None
+        try:
+            if bmp280 is not None:
+                bmp280.stop()
+        finally:
+            if bus is not None:
+                bus.close()
+
+    def request_stop(self):
+        """
+        要求主循環結束（可由任何執行緒或 signal handler 呼叫）。
+
+        行為:
+        - 喚醒正在等待樣本的主循環，不必等到下一個樣本或 wait 逾時；
+          處理中的批次在下一個樣本前就會中斷，馬達在一個取樣週期內停下。
+        """
+        if self.stop_requested_ns is None:
+            self.stop_requested_ns = time.monotonic_ns()
+        self._stop_event.set()
+        acquisition = self._acquisition
+        if acquisition is not None:
+            acquisition.ring.wake()
+
+    def _stop_stage(self, stage):
+        """記錄停止階段的完成時間，並送出 STOP 訊框（伺服器據此確認馬達已停、GPIO 已釋放）。"""
+        t_ns = time.monotonic_ns()
+        self.stop_stages[stage] = t_ns
+        if self.frame_sink is not None:
+            try:
+                self.frame_sink(self._stop_frames.pack(t_ns, self.stop_requested_ns or 0, stage))
+            except Exception:
+                pass
+
+    def start(self):
+        """在新的執行緒上執行 run()。"""
+        self._stop_event.clear()
+        self.stop_requested_ns = None
+        self._thread = threading.Thread(target=self.run, name="breathing-engine", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=5.0):
+        """要求停止並等待執行緒結束。返回執行緒是否已結束。"""
+        self.request_stop()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """
+        呼吸控制系統的主循環，實現暖機、鏡像和引導階段。
+
+        行為:
+        - 印出啟動訊息。
+        - 初始化 GPIO 和 PWM 控制馬達。
+        - 初始化 BMP280 感測器，讀取初始壓力值。
+        - 初始化濾波器、狀態變數和計時器。
+        - 進入主循環：
+          - 讀取和濾波壓力數據。
+          - 檢測用戶呼吸動作（吸氣/吐氣）。
+          - 根據機器狀態處理：
+            - WARMUP: 等待暖機時間，記錄用戶動作。
+            - MIRROR: 記錄用戶呼吸時間，計算平均目標。
+            - GUIDE: 控制馬達引導呼吸，評估穩定性，發送 SYNC_PROGRESS。
+          - 控制循環時間以維持採樣率。
+        - 處理中斷和異常；不論如何結束都會停止馬達並清理 GPIO。
+        """
+        emit = self.emit
+        frame_sink = self.frame_sink
+        actuator = self.actuator
+        frames = ProgressFrameWriter()
+        cycle_frames = CycleFrameWriter()
+        cycle_reason = 0
+        last_cycle_ns = 0
+        self.error = None
+        self.started_ns = time.monotonic_ns()
+        self.first_sample_ns = None
+        self.stop_stages = {}
+        emit(">>> 呼吸控制系統啟動 (0.3~0.7 範圍控制模式)...")
     
-    # Sensor 初始化
-    try:
-        bus = SMBus(1)
-        bmp280 = BMP280(i2c_dev=bus)
-        bmp280.setup(mode="forced")
-        first_read = bmp280.get_pressure()
-        print(">>> 感測器連接成功", flush=True)
-    except Exception as e:
-        print(f"!!! Sensor Error: {e}", flush=True)
-        move_linear_actuator(0)
-        p.stop()
-        GPIO.cleanup()
-        return
-
-    # 變數初始化
-    rt_filter = RealTimeFilter(lowpass_order, lowpass_cutoff, lowpass_fs, initial_value=first_read)
-    machine_state = MachineState.WARMUP
-    user_state = UserState.EXHALE
+        # GPIO 初始化（方向腳位設為停止，en PWM 以 100% 啟動）
+        actuator.setup(duty=100)
     
-    program_start_time = time.time()
-    mirror_start_time = 0
+        # Sensor 初始化
+        try:
+            bmp280 = self.open_sensor()
+            bmp280.start()
+            first_read = bmp280.get_pressure()
+            emit(f">>> 感測器連接成功 ({bmp280.describe()})")
+        except Exception as e:
+            emit(f"!!! Sensor Error: {e}")
+            self.error = e
+            actuator.close()
+            self._stop_stage(STOP_PARKED)
+            self._stop_stage(STOP_RELEASED)
+            try:
+                self.close_sensor()
+            except Exception:
+                pass
+            return
+
+        # 變數初始化
+        detector = make_detector(breath_detector_mode, lowpass_fs, first_read)
+        emit(f">>> 呼吸偵測模式: {breath_detector_mode} (估計延遲 {detector.latency_ms:.0f} ms)")
+        machine_state = MachineState.WARMUP
+        user_state = UserState.EXHALE
     
-    mirror_breath_times = []    
-    detected_breath_times = []  
-    current_breath_duration = 0
-    skip_first_breath = True
-
-    la_position = 0
-    target_breath_time = 3.0 
-    machine_breath_timer = 0
+        program_start_ns = time.monotonic_ns()
+        mirror_start_ns = 0
+        prev_sample_ns = None
     
-    prev_filtered = rt_filter.process(first_read)
-    running = True
+        mirror_breath_times = []    
+        detected_breath_times = []  
+        breath_start_ns = program_start_ns
+        skip_first_breath = True
 
-    print(f">>> 系統暖機中 ({warmup_duration}秒)...", flush=True)
-
-    try:
-        while running and not shutdown_requested:
-            loop_start = time.time()
-            
-            # 讀取與濾波
-            raw = bmp280.get_pressure()
-            curr_filtered = rt_filter.process(raw)
+        guide = None
+        target_breath_time = 3.0 
+    
+        running = True
+        acquisition = AcquisitionThread(bmp280.get_pressure, sampling_rate, spin_us=acquisition_spin_us)
+        self._acquisition = acquisition
+        stop_event = self._stop_event
+
+        emit(f">>> 系統暖機中 ({warmup_duration}秒)...")
+
+        try:
+            acquisition.start()
+            while running and not stop_event.is_set():
+                # 執行已到期的引導指令；等待新樣本時最多等到下一個指令的時間
+                actuator.poll()
+                wait_s = 0.5
+                due_ns = actuator.next_due_ns()
+                if due_ns is not None:
+                    wait_s = min(wait_s, max(0.0, (due_ns - time.monotonic_ns()) / 1e9))
+                # 等待擷取執行緒送來新樣本
+                if not acquisition.ring.wait(timeout=wait_s):
+                    acquisition.check()
+                    continue
+                acquisition.check()
+                timestamps, raws, lost = acquisition.ring.read_available()
+                if lost:
+                    emit(f"!!! [擷取] 控制邏輯落後，遺失 {lost} 個樣本")
+                if self.first_sample_ns is None:
+                    self.first_sample_ns = time.monotonic_ns()
+
+                # 整批判斷吸吐：lag 模式的大批次（停頓後累積的樣本）以 sosfilt 一次濾波、相鄰差一次取正負號；
+                # 狀態機只會在使用者狀態真正切換的樣本上動作，切換點也一次找出
+                if breath_detector_mode == "lag" and len(raws) >= block_detection_min:
+                    prev_filtered = detector.filtered
+                    actions = detect_user_actions(prev_filtered, detector.filter_block(raws))
+                else:
+                    actions = np.array([detector.update(raw) for raw in raws.tolist()], dtype=np.int8)
+                switch_idx, switch_states = find_user_transitions(user_state, actions)
+                switches = np.zeros(len(actions), dtype=np.int8)
+                switches[switch_idx] = switch_states
+
+                progress = None
+                # 呼吸時間與引導計時都用樣本的 monotonic 時間戳，不假設每個樣本剛好 1/60 秒
+                for t_ns, switch in zip(timestamps.tolist(), switches.tolist()):
+                    if stop_event.is_set():
+                        break
+                    dt = (t_ns - prev_sample_ns) / 1e9 if prev_sample_ns is not None else sampling_rate
+                    prev_sample_ns = t_ns
+                    current_breath_duration = (t_ns - breath_start_ns) / 1e9
             
-            # 判斷使用者吸吐動作
-            user_action = None
-            if curr_filtered > prev_filtered:
-                user_action = UserState.INHALE
-            elif curr_filtered < prev_filtered:
-                user_action = UserState.EXHALE
-
-            # --- 狀態機邏輯 ---
-            if machine_state == MachineState.WARMUP:
-                move_linear_actuator(0)
-                if user_action is not None:
-                    user_state = user_action
+                    # 判斷使用者吸吐動作（只有狀態切換的樣本才有動作；其他動作與目前狀態相同，狀態機不會處理）
+                    user_action = None
+                    if switch == INHALE:
+                        user_action = UserState.INHALE
+                    elif switch == EXHALE:
+                        user_action = UserState.EXHALE
+
+                    # --- 狀態機邏輯 ---
+                    if machine_state == MachineState.WARMUP:
+                        move_linear_actuator(0, driver=actuator)
+                        if user_action is not None:
+                            user_state = user_action
                 
-                if time.time() - program_start_time >= warmup_duration:
-                    print(">>> [系統] 暖機完成 -> 進入 MIRROR 模式", flush=True)
-                    machine_state = MachineState.MIRROR
-                    mirror_start_time = time.time()
-                    current_breath_duration = 0
-
-            elif machine_state == MachineState.MIRROR:
-                move_linear_actuator(0) 
+                        if (t_ns - program_start_ns) / 1e9 >= warmup_duration:
+                            emit(">>> [系統] 暖機完成 -> 進入 MIRROR 模式")
+                            machine_state = MachineState.MIRROR
+                            mirror_start_ns = t_ns
+                            breath_start_ns = t_ns
+
+                    elif machine_state == MachineState.MIRROR:
+                        move_linear_actuator(0, driver=actuator)
                 
-                if user_state == UserState.EXHALE and user_action == UserState.INHALE:
-                    if current_breath_duration > 0.8: 
-                        mirror_breath_times.append(current_breath_duration)
-                    current_breath_duration = 0
-                    user_state = UserState.INHALE
-                elif user_state == UserState.INHALE and user_action == UserState.EXHALE:
-                    user_state = UserState.EXHALE
+                        if user_state == UserState.EXHALE and user_action == UserState.INHALE:
+                            if current_breath_duration > 0.8: 
+                                mirror_breath_times.append(current_breath_duration)
+                            breath_start_ns = t_ns
+                            user_state = UserState.INHALE
+                        elif user_state == UserState.INHALE and user_action == UserState.EXHALE:
+                            user_state = UserState.EXHALE
                 
-                current_breath_duration += sampling_rate
-
-                if time.time() - mirror_start_time >= mirror_duration:
-                    if len(mirror_breath_times) > 0:
-                        target_breath_time = np.mean(mirror_breath_times)
-                        print(f">>> [結果] Mirror 結束. 平均頻率: {target_breath_time:.2f} 秒", flush=True)
-                    else:
-                        target_breath_time = 4.0
-                        print(f">>> [結果] 使用預設值: 4.00 秒", flush=True)
+                        if (t_ns - mirror_start_ns) / 1e9 >= mirror_duration:
+                            if len(mirror_breath_times) > 0:
+                                target_breath_time = np.mean(mirror_breath_times)
+                                emit(f">>> [結果] Mirror 結束. 平均頻率: {target_breath_time:.2f} 秒")
+                            else:
+                                target_breath_time = 4.0
+                                emit(f">>> [結果] 使用預設值: 4.00 秒")
                     
-                    machine_state = MachineState.GUIDE
-                    print(f">>> [系統] 進入 GUIDE 模式", flush=True)
-                    current_breath_duration = 0
-                    skip_first_breath = True
-
-            elif machine_state == MachineState.GUIDE:
-                # 馬達開始引導 (更新馬達位置 pos)
-                machine_breath_timer, la_position, current_direct = guide_breathing_logic(
-                    machine_breath_timer, target_breath_time, la_position
-                )
+                            machine_state = MachineState.GUIDE
+                            guide = GuidePlayer(target_breath_time, sampling_rate, actuator_stroke_mm,
+                                                actuator_speed_mm_s, min_duty=actuator_min_duty)
+                            emit(f">>> [系統] 進入 GUIDE 模式")
+                            cycle_reason = CYCLE_START
+                            breath_start_ns = t_ns
+                            skip_first_breath = True
+
+                    elif machine_state == MachineState.GUIDE:
+                        # 馬達開始引導（查表：方向、duty、進度）
+                        # 進度已在編表時由馬達估計位置映射到 0.3 (全縮) ~ 0.7 (全伸)
+                        timer_before = guide.timer
+                        current_direct, duty, progress = guide_breathing_logic(guide, dt)
+                        if guide.timer < timer_before and not cycle_reason:
+                            cycle_reason = CYCLE_WRAP
                 
-                # --- [修正重點] 根據馬達實際位置映射到 0.3 ~ 0.7 ---
-                
-                # 1. 取得馬達伸出比例 (0.0 ~ 1.0)
-                max_dist = linear_actuator_max_distance
-                if max_dist == 0: max_dist = 50
-                
-                # ratio: 0 (全縮) ~ 1 (全伸)
-                ratio = la_position / max_dist
-                ratio = max(0.0, min(1.0, ratio)) 
-
-                # 2. 映射到動畫時間軸 0.3 ~ 0.7
-                # 當 ratio = 0.0 (縮回到底) -> progress = 0.3
-                # 當 ratio = 1.0 (伸出到底) -> progress = 0.3 + 0.4 = 0.7
-                progress = 0.3 + (ratio * 0.4)
-
-                # 3. 發送進度給 Unity
+                        if user_state == UserState.EXHALE and user_action == UserState.INHALE:
+                            if current_breath_duration > 0.5:
+                                if skip_first_breath:
+                                    skip_first_breath = False
+                                else:
+                                    detected_breath_times.append(current_breath_duration)
+                            breath_start_ns = t_ns
+                            user_state = UserState.INHALE
+                        elif user_state == UserState.INHALE and user_action == UserState.EXHALE:
+                            user_state = UserState.EXHALE
+
+                        if len(detected_breath_times) >= sampling_window:
+                            eval_st, new_target = validate_stable(detected_breath_times, target_breath_time)
+                            if eval_st == EvalState.SUCCESS:
+                                emit(f">>> [調整] 更慢: {new_target:.2f}s")
+                                target_breath_time = new_target
+                                guide.set_period(target_breath_time)
+                                cycle_reason = CYCLE_PERIOD
+                                detected_breath_times = []
+                            elif eval_st == EvalState.FAIL:
+                                emit(f">>> [調整] 放慢: {new_target:.2f}s")
+                                target_breath_time = new_target
+                                guide.set_period(target_breath_time)
+                                cycle_reason = CYCLE_PERIOD
+                                detected_breath_times = []
+                            else:
+                                detected_breath_times.pop(0)
+
+                if machine_state == MachineState.GUIDE and not stop_event.is_set():
+                    schedule_guide_moves(guide, actuator, t_ns)
+
+                # 3. 發送進度給 Unity（同一批樣本只送最後一個）
                 # 這樣無論是往前推還是往後縮，都會精準對應馬達位置
-                print(f"SYNC_PROGRESS:{progress:.3f}", flush=True)
-                
-                # ---------------------------------------------
-                
-                if user_state == UserState.EXHALE and user_action == UserState.INHALE:
-                    if current_breath_duration > 0.5:
-                        if skip_first_breath:
-                            skip_first_breath = False
-                        else:
-                            detected_breath_times.append(current_breath_duration)
-                    current_breath_duration = 0
-                    user_state = UserState.INHALE
-                elif user_state == UserState.INHALE and user_action == UserState.EXHALE:
-                    user_state = UserState.EXHALE
-                
-                current_breath_duration += sampling_rate
-
-                if len(detected_breath_times) >= sampling_window:
-                    eval_st, new_target = validate_stable(detected_breath_times, target_breath_time)
-                    if eval_st == EvalState.SUCCESS:
-                        print(f">>> [調整] 更慢: {new_target:.2f}s", flush=True)
-                        target_breath_time = new_target
-                        detected_breath_times = []
-                    elif eval_st == EvalState.FAIL:
-                        print(f">>> [調整] 放慢: {new_target:.2f}s", flush=True)
-                        target_breath_time = new_target
-                        detected_breath_times = []
+                if progress is not None:
+                    if frame_sink is not None:
+                        frame_sink(frames.pack(t_ns, progress, target_breath_time,
+                                               machine_state.value, user_state.value))
+                        # 週期參數（週期開始、目標改變時，另外定期校正），給在本地外插進度的客戶端
+                        if not cycle_reason and t_ns - last_cycle_ns >= cycle_correction_interval * 1e9:
+                            cycle_reason = CYCLE_CORRECTION
+                        if cycle_reason:
+                            frame_sink(cycle_frames.pack(
+                                t_ns, t_ns - int(guide.timer * 1e9), guide.table.period, progress,
+                                PROGRESS_MIN, PROGRESS_RANGE, machine_state.value, user_state.value,
+                                current_direct, cycle_reason))
+                            cycle_reason = 0
+                            last_cycle_ns = t_ns
                     else:
-                        detected_breath_times.pop(0)
-
-            prev_filtered = curr_filtered
-
-            elapsed = time.time() - loop_start
-            sleep_time = sampling_rate - elapsed
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-
-    except KeyboardInterrupt:
-        print("\n>>> 使用者中斷 (Ctrl+C)", flush=True)
-    except Exception as e:
-        print(f"\n!!! Runtime Error: {e}", flush=True)
-    finally:
-        print(">>> 清理 GPIO...", flush=True)
-        move_linear_actuator(0)
-        p.stop()
-        GPIO.cleanup()
-        print(">>> 程式結束", flush=True)
+                        emit(f"SYNC_PROGRESS:{progress:.3f}")
+
+            if stop_event.is_set():
+                self._stop_stage(STOP_ACK)
+
+        except KeyboardInterrupt:
+            emit("\n>>> 使用者中斷 (Ctrl+C)")
+        except Exception as e:
+            self.error = e
+            emit(f"\n!!! Runtime Error: {e}")
+        finally:
+            # 先停馬達、釋放 GPIO（各送出一個 STOP 訊框），之後才輸出統計
+            actuator.clear_commands()
+            move_linear_actuator(0, driver=actuator)
+            self._stop_stage(STOP_PARKED)
+            self._acquisition = None
+            acquisition.stop()
+            try:
+                emit(">>> 清理 GPIO...")
+                actuator.close()
+                self._stop_stage(STOP_RELEASED)
+                if self.stop_requested_ns is not None:
+                    emit(f">>> [停止] 收到停止要求後 "
+                         f"{(self.stop_stages[STOP_PARKED] - self.stop_requested_ns) / 1e6:.2f} ms 停止馬達、"
+                         f"{(self.stop_stages[STOP_RELEASED] - self.stop_requested_ns) / 1e6:.2f} ms 釋放 GPIO")
+                emit(bmp280.report())
+                emit(acquisition.report())
+                emit(acquisition.scheduler.report())
+                emit(actuator.report())
+            finally:
+                try:
+                    self.close_sensor()
+                except Exception:
+                    pass
+            emit(">>> 程式結束")
+
+
+def preload():
+    """
+    預先載入引擎執行時需要的資料（濾波器係數表、預設的引導波形表）。
+
+    在伺服器程序內執行引擎時先呼叫一次，ACTIVATE 就不必再做這些事。
+    """
+    make_detector(breath_detector_mode, lowpass_fs, 1013.25)
+    GuidePlayer(4.0, sampling_rate, actuator_stroke_mm, actuator_speed_mm_s, min_duty=actuator_min_duty)
+
+def main():
+    frame_sink = None
+    engine_kwargs = {}
+    if "--pins" in sys.argv[1:]:
+        # 非預設的 rig（rpi_server 的 RIGS）：致動器腳位 in1,in2,en 與感測器位址
+        engine_kwargs["pins"] = tuple(int(p) for p in sys.argv[sys.argv.index("--pins") + 1].split(","))
+    if "--i2c-bus" in sys.argv[1:]:
+        engine_kwargs["i2c_bus"] = int(sys.argv[sys.argv.index("--i2c-bus") + 1])
+    if "--i2c-addr" in sys.argv[1:]:
+        engine_kwargs["i2c_addr"] = int(sys.argv[sys.argv.index("--i2c-addr") + 1], 0)
+    if "--sync-fd" in sys.argv[1:]:
+        # rpi_server 傳入的 pipe：同步訊框走這裡，stdout 只剩 log
+        sync_fd = int(sys.argv[sys.argv.index("--sync-fd") + 1])
+        frame_sink = lambda frame: os.write(sync_fd, frame)
+    engine = BreathingEngine(frame_sink=frame_sink, **engine_kwargs)
+
+    if "--standby" in sys.argv[1:]:
+        # 由 rpi_server 預先啟動的 standby worker：先載入依賴、開啟感測器，
+        # 印出 STANDBY_READY 後等 stdin 收到 START 才開始控制（stdin 關閉則直接結束）
+        preload()
+        try:
+            engine.open_sensor()
+        except Exception as e:
+            print(f"!!! Sensor Error: {e}", flush=True)
+        print(STANDBY_READY, flush=True)
+        if sys.stdin.readline().strip() != "START":
+            return
+
+    def request_shutdown(signum, frame):
+        print(f"\n>>> 收到停止訊號 ({signum})，準備安全關閉...", flush=True)
+        engine.request_stop()
+
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+    engine.run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+預先編譯的引導波形表。
+
+目標呼吸週期只有在 validate_stable 判定 SUCCESS/FAIL 時才會改變，
+所以每次改變時把整個引導週期（方向、duty、給 Unity 的進度值）
+用 ActuatorModel 模擬一次編成陣列，並以週期為鍵做 LRU 快取。
+控制迴圈每個樣本只需要由計時器算出索引、查一次表。
+切換到新週期的表時，從新表中找相同相位（吸/吐）、進度最接近的位置
+接著播放，馬達與動畫不會跳動。
+"""
+
+import math
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from actuator_model import ActuatorModel
+
+PROGRESS_MIN = 0.3
+PROGRESS_RANGE = 0.4
+
+GuideTable = namedtuple("GuideTable", ["period", "step", "direction", "duty", "progress"])
+GuideTable.__doc__ = """
+一個完整引導週期的波形表。
+
+- period: 目標呼吸週期（秒）。
+- step: 每一格代表的時間（秒）。
+- direction: int8 陣列，1 伸出、-1 縮回、0 停止。
+- duty: float32 陣列，en 腳位的 PWM duty（%）。
+- progress: float32 陣列，送給 Unity 的 SYNC_PROGRESS（0.3 ~ 0.7）。
+"""
+
+
+@lru_cache(maxsize=16)
+def compile_guide_table(period, step, stroke_mm, speed_mm_s, min_duty):
+    """
+    把一個引導週期編譯成 GuideTable（結果依參數做 LRU 快取）。
+
+    參數:
+    - period: 目標呼吸週期（秒），呼叫端應先四捨五入避免浮點誤差造成快取失效。
+    - step: 表格解析度（秒），通常等於取樣週期。
+    - stroke_mm, speed_mm_s, min_duty: ActuatorModel 的參數。
+
+    行為:
+    - 從全縮位置開始，以 step 為間隔模擬 ActuatorModel 一個週期。
+    - 每一格記錄該時刻的估計位置（換算成進度）以及接下來的方向與 duty。
+    """
+    n = max(2, int(math.ceil(period / step)))
+    model = ActuatorModel(stroke_mm, speed_mm_s, min_duty=min_duty)
+    direction = np.zeros(n, dtype=np.int8)
+    duty = np.zeros(n, dtype=np.float32)
+    progress = np.zeros(n, dtype=np.float32)
+    for i in range(n):
+        if i:
+            model.advance(step)
+        progress[i] = PROGRESS_MIN + PROGRESS_RANGE * model.ratio()
+        direction[i], duty[i] = model.command(i * step, period)
+    for array in (direction, duty, progress):
+        array.setflags(write=False)
+    return GuideTable(period, step, direction, duty, progress)
+
+
+class GuidePlayer:
+    """
+    以實際經過時間播放引導波形表。
+
+    屬性:
+    - table: 目前播放的 GuideTable。
+    - timer: 目前在週期中的時間（秒）。
+    """
+    def __init__(self, period, step, stroke_mm, speed_mm_s, min_duty=20.0):
+        self.step_s = step
+        self.stroke_mm = stroke_mm
+        self.speed_mm_s = speed_mm_s
+        self.min_duty = min_duty
+        self.table = self._table(period)
+        self.timer = 0.0
+        self._index = 0
+
+    def _table(self, period):
+        return compile_guide_table(round(float(period), 3), self.step_s, self.stroke_mm,
+                                   self.speed_mm_s, self.min_duty)
+
+    def reset(self):
+        """回到週期起點（全縮、開始吸氣）。"""
+        self.timer = 0.0
+        self._index = 0
+
+    def step(self, dt):
+        """
+        往前推 dt 秒並查表。
+
+        返回: (direction, duty, progress)
+        """
+        table = self.table
+        self.timer = (self.timer + dt) % table.period
+        i = int(self.timer / table.step)
+        if i >= len(table.direction):
+            i = len(table.direction) - 1
+        self._index = i
+        return int(table.direction[i]), float(table.duty[i]), float(table.progress[i])
+
+    def progress(self):
+        return float(self.table.progress[self._index])
+
+    def commands(self, ahead, horizon):
+        """
+        查出從計時器往後 ahead 秒起、horizon 秒內的馬達指令，不推進計時器。
+
+        返回: [(offset, direction, duty), ...]，offset 是相對於目前計時器的秒數。
+        第一筆是 ahead 秒時的指令，之後只列出方向或 duty 改變的格子（跨週期會接回表頭）。
+        """
+        table = self.table
+        period, step = table.period, table.step
+        last = len(table.direction) - 1
+        phase = (self.timer + ahead) % period
+        i = min(int(phase / step), last)
+        offset = ahead
+        commands = []
+        while offset <= ahead + horizon:
+            direction = int(table.direction[i])
+            duty = float(table.duty[i]) if direction != 0 else None
+            if not commands or commands[-1][1:] != (direction, duty):
+                commands.append((offset, direction, duty))
+            # 下一格的開頭（最後一格可能比 step 短，到週期結尾就接回表頭）
+            boundary = min((i + 1) * step, period)
+            offset += max(0.0, boundary - phase)
+            phase = boundary
+            i += 1
+            if i > last:
+                i, phase = 0, 0.0
+        return commands
+
+    def set_period(self, period):
+        """
+        切換到新週期的表，並保持相位連續。
+
+        行為:
+        - 在新表中與目前同一半週期（吸氣 = 前半、吐氣 = 後半）的範圍內，
+          找進度最接近目前進度的格子，從那裡繼續播放。
+        """
+        old = self.table
+        new = self._table(period)
+        if new is old:
+            return
+        n = len(new.progress)
+        half = n // 2
+        current = old.progress[self._index]
+        if self._index < len(old.progress) // 2:
+            lo, hi = 0, half
+        else:
+            lo, hi = half, n
+        i = lo + int(np.argmin(np.abs(new.progress[lo:hi] - current)))
+        self.table = new
+        self._index = i
+        self.timer = i * new.step
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+呼吸吸吐方向偵測器。
+
+- LagDetector: 原本的做法，比較 4 階 2 Hz Butterworth 相鄰兩個輸出。
+  轉折點要等濾波器整個群延遲（60 Hz 下約 200 ms）之後才看得到。
+- PredictiveDetector: 低延遲前級濾波 + 局部二次擬合估計斜率與曲率，
+  在預測轉折點落在前級群延遲以內時就提早切換，並以最短相位時間
+  做遲滯，避免雜訊造成的假切換。
+  最短相位時間（預設 0.8 s）同時會壓掉週期短於兩倍該時間的快速呼吸，
+  所以 fix_version 預設仍用 LagDetector，predictive 需要設定
+  breath_detector_mode 開啟。
+
+用法（離線比較兩種模式的延遲）:
+    python3 onset_detector.py [raw_data.csv]
+"""
+
+import sys
+
+import numpy as np
+
+from filter_design import get_filter, dc_group_delay
+from sos_filter import SosFilter
+
+INHALE = 1
+EXHALE = -1
+
+DETECTOR_MODES = ("lag", "predictive")
+
+
+class LagDetector:
+    """
+    原本的方向判斷：濾波值上升為吸氣、下降為吐氣。
+
+    屬性:
+    - filtered: 最新的濾波值。
+    - latency_ms: 理論延遲（前級濾波器的 DC 群延遲，毫秒）。
+    """
+    def __init__(self, fs, initial_value, order=4, cutoff=2.0):
+        design = get_filter(order, cutoff, fs, "low")
+        self._filter = SosFilter(design.sos, zi=design.sos_zi, initial_value=initial_value)
+        self.filtered = self._filter.process(initial_value)
+        self.latency_ms = dc_group_delay(design.sos) / fs * 1000.0
+
+    def update(self, value):
+        """
+        加入一個原始樣本。
+
+        返回: 1 = 吸氣（上升）、-1 = 吐氣（下降）、0 = 無變化。
+        """
+        prev = self.filtered
+        curr = self._filter.process(value)
+        self.filtered = curr
+        if curr > prev:
+            return INHALE
+        elif curr < prev:
+            return EXHALE
+        return 0
+
+    def filter_block(self, values):
+        """
+        一次濾波一批原始樣本（SosFilter.process_block，狀態與逐一呼叫 update() 銜接）。
+
+        返回: 濾波後的 numpy 陣列；方向由呼叫端以相鄰差的正負號一次算出
+        （fix_version.detect_user_actions，前一個值為呼叫前的 filtered）。
+        """
+        filtered = self._filter.process_block(values)
+        if filtered.size:
+            self.filtered = float(filtered[-1])
+        return filtered
+
+
+class PredictiveDetector:
+    """
+    以斜率/曲率預測轉折點的低延遲偵測器。
+
+    屬性:
+    - filtered: 最新的前級濾波值。
+    - state: 目前判定的相位（INHALE 或 EXHALE）。
+    - latency_ms: 理論延遲（前級群延遲扣掉預測提前量，毫秒）。
+    """
+    def __init__(self, fs, initial_value, order=2, cutoff=3.0, window=0.4, min_phase=0.8, lead_fraction=0.5):
+        """
+        初始化偵測器。
+
+        參數:
+        - fs: 採樣頻率（Hz）。
+        - initial_value: 第一個原始樣本。
+        - order, cutoff: 前級 Butterworth 的階數與截止頻率（比 4 階 2 Hz 延遲小得多）。
+        - window: 局部二次擬合的視窗長度（秒）。
+        - min_phase: 一個吸或吐相位的最短時間（秒），短於此不允許再切換。
+        - lead_fraction: 預測提前量佔前級群延遲的比例；1.0 在雜訊下會提早過頭。
+
+        行為:
+        - 預先算好「最新樣本處」斜率與曲率的最小平方權重，每個樣本只做兩次內積。
+        - 預測提前量 = lead_fraction × 前級濾波器的 DC 群延遲。
+        """
+        design = get_filter(order, cutoff, fs, "low")
+        self._filter = SosFilter(design.sos, zi=design.sos_zi, initial_value=initial_value)
+        self.filtered = self._filter.process(initial_value)
+
+        n = max(5, int(round(window * fs)))
+        t = np.arange(-(n - 1), 1, dtype=float)
+        weights = np.linalg.pinv(np.vander(t, 3, increasing=True))
+        self._w_slope = weights[1].tolist()
+        self._w_curv = (2.0 * weights[2]).tolist()
+        self._buf = [self.filtered] * n
+        self._head = 0
+
+        delay = dc_group_delay(design.sos)
+        self.lead = lead_fraction * delay
+        self.min_phase = max(1, int(round(min_phase * fs)))
+        self.latency_ms = (delay - self.lead) / fs * 1000.0
+        self.state = EXHALE
+        self._phase_len = 0
+
+    def _derivatives(self):
+        buf = self._buf
+        n = len(buf)
+        h = self._head
+        slope = 0.0
+        curv = 0.0
+        # 權重由舊到新排列，環狀緩衝區最舊的元素在 head
+        for i in range(n):
+            y = buf[(h + i) % n]
+            slope += self._w_slope[i] * y
+            curv += self._w_curv[i] * y
+        return slope, curv
+
+    def update(self, value):
+        """
+        加入一個原始樣本。
+
+        返回: 目前判定的相位，1 = 吸氣、-1 = 吐氣（與 LagDetector 相同的介面）。
+
+        行為:
+        - 斜率已反向，或斜率與曲率異號且預測轉折點在 lead 個樣本內時，切換相位。
+        - 相位未滿 min_phase 個樣本時不切換。
+        """
+        y = self._filter.process(value)
+        self.filtered = y
+        self._buf[self._head] = y
+        self._head = (self._head + 1) % len(self._buf)
+        self._phase_len += 1
+
+        if self._phase_len < self.min_phase:
+            return self.state
+
+        slope, curv = self._derivatives()
+        if self.state == INHALE:
+            turning = slope <= 0.0 or (curv < 0.0 and slope < -curv * self.lead)
+        else:
+            turning = slope >= 0.0 or (curv > 0.0 and -slope < curv * self.lead)
+
+        if turning:
+            self.state = -self.state
+            self._phase_len = 0
+        return self.state
+
+
+def make_detector(mode, fs, initial_value):
+    """依模式名稱建立偵測器（'lag' 或 'predictive'）。"""
+    if mode == "lag":
+        return LagDetector(fs, initial_value)
+    elif mode == "predictive":
+        return PredictiveDetector(fs, initial_value)
+    raise ValueError(f"Unknown detector mode: {mode}")
+
+
+def _phase_changes(directions, initial_state=EXHALE):
+    """把每個樣本的方向轉成 (索引, 新相位) 的切換列表，與控制迴圈的 user_state 邏輯相同。"""
+    from breath_cycles import find_transitions
+    return find_transitions(directions, initial_state)
+
+
+def measure_latency(raw, fs, mode, reference_cutoff=1.0, tolerance=1.0):
+    """
+    離線量測偵測器相對於零相位參考轉折點的延遲。
+
+    參數:
+    - raw: 原始壓力陣列。
+    - fs: 採樣頻率（Hz）。
+    - mode: 'lag' 或 'predictive'。
+    - reference_cutoff: 參考訊號零相位低通的截止頻率（Hz）。
+    - tolerance: 與參考轉折點配對的最大時間差（秒）。
+
+    返回: dict，包含 median_ms、mean_ms、matched、reference、false_transitions。
+    """
+    from scipy.signal import sosfiltfilt
+
+    raw = np.asarray(raw, dtype=float)
+    reference = sosfiltfilt(get_filter(4, reference_cutoff, fs, "low").sos, raw)
+    ref_idx, ref_state = _phase_changes(np.sign(np.diff(reference, prepend=reference[0])))
+
+    detector = make_detector(mode, fs, raw[0])
+    directions = np.array([detector.update(x) for x in raw], dtype=np.int8)
+    det_idx, det_state = _phase_changes(directions)
+
+    window = int(tolerance * fs)
+    lags = []
+    used = np.zeros(len(det_idx), dtype=bool)
+    for idx, state in zip(ref_idx, ref_state):
+        candidates = np.flatnonzero((det_state == state) & ~used & (np.abs(det_idx - idx) <= window))
+        if candidates.size:
+            best = candidates[np.argmin(np.abs(det_idx[candidates] - idx))]
+            used[best] = True
+            lags.append((det_idx[best] - idx) / fs * 1000.0)
+
+    lags = np.array(lags)
+    return {
+        "median_ms": float(np.median(lags)) if lags.size else float("nan"),
+        "mean_ms": float(np.mean(lags)) if lags.size else float("nan"),
+        "matched": int(lags.size),
+        "reference": int(len(ref_idx)),
+        "false_transitions": int(np.count_nonzero(~used)),
+    }
+
+
+def synthetic_breathing(seconds=300, fs=60.0, seed=0, noise=0.002):
+    """產生週期 3~6 秒變動、含感測器雜訊的呼吸壓力訊號（hPa）。"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * fs)
+    period = np.interp(np.arange(n), np.linspace(0, n, 12), rng.uniform(3.0, 6.0, 12))
+    phase = 2 * np.pi * np.cumsum(1.0 / (period * fs))
+    return 1013.25 + 0.05 * np.sin(phase) + noise * rng.standard_normal(n)
+
+
+def main(argv):
+    fs = 60.0
+    if len(argv) > 1:
+        from breath_cycles import load_session
+        _, raw = load_session(argv[1])
+        source = argv[1]
+    else:
+        raw = synthetic_breathing(fs=fs)
+        source = "synthetic"
+
+    print(f"source: {source} ({len(raw)} samples @ {fs:.0f} Hz)")
+    for mode in DETECTOR_MODES:
+        r = measure_latency(raw, fs, mode)
+        print(f"{mode:>10}: median {r['median_ms']:7.1f} ms, mean {r['mean_ms']:7.1f} ms, "
+              f"matched {r['matched']}/{r['reference']}, false transitions {r['false_transitions']}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有界的壓力資料視窗，取代「每次對整個 pressures list 重跑 filtfilt」的做法。
+
+- 每個新樣本只更新一次因果 (causal) 濾波狀態，O(1)。
+- 需要零相位平滑時，只對最後 capacity 個樣本做 sosfiltfilt，
+  因此每次呼吸評估的成本與整段 session 的長度無關。
+"""
+
+import numpy as np
+
+from filter_design import get_filter
+from sos_filter import SosFilter
+
+
+class PressureWindow:
+    """
+    固定容量的壓力樣本視窗，外觀上可以當作原本的 pressures list 使用
+    （len()、pressures[-2]、clear()）。
+
+    屬性:
+    - capacity: 視窗最多保留的樣本數。
+    - latest: 最新一個樣本的因果濾波值。
+    - evicted: 上次 discard()/clear() 之後因為容量滿了被自動丟掉的樣本數；
+      大於 0 表示視窗開頭已經不是呼叫端切齊的位置（例如呼吸起點），依索引計數的呼叫端要重新對齊。
+    """
+    def __init__(self, order, cutoff, fs, capacity):
+        """
+        初始化視窗與濾波器。
+
+        參數:
+        - order: 濾波器階數（整數）。
+        - cutoff: 截止頻率（Hz）。
+        - fs: 採樣頻率（Hz）。
+        - capacity: 視窗容量（樣本數），超過時丟棄最舊的樣本（記在 evicted）。
+
+        行為:
+        - 從 filter_design 登錄表取得 Butterworth SOS 係數，之後所有呼叫共用。
+        - 預先配置兩倍容量的緩衝區，讓視窗永遠是一段連續的記憶體。
+        """
+        design = get_filter(order, cutoff, fs, "low")
+        self.sos = design.sos
+        self._zi = design.sos_zi
+        self._causal = None
+        self.latest = None
+
+        self.capacity = int(capacity)
+        self._buf = np.empty(2 * self.capacity)
+        self._start = 0
+        self._len = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, key):
+        return self.raw()[key]
+
+    def append(self, value):
+        """
+        加入一個原始樣本。
+
+        參數:
+        - value: 原始壓力值（浮點數）。
+
+        返回: 這個樣本的因果濾波值。
+        """
+        value = float(value)
+        if self._len == self.capacity:
+            self._start += 1
+            self._len -= 1
+            self.evicted += 1
+        if self._start + self._len == len(self._buf):
+            # 到達緩衝區尾端才整段搬回開頭，攤提後每個樣本仍是 O(1)
+            self._buf[:self._len] = self._buf[self._start:self._start + self._len]
+            self._start = 0
+        self._buf[self._start + self._len] = value
+        self._len += 1
+
+        if self._causal is None:
+            self._causal = SosFilter(self.sos, zi=self._zi, initial_value=value)
+        self.latest = self._causal.process(value)
+        return self.latest
+
+    def discard(self, count):
+        """
+        丟棄視窗最前面的 count 個樣本（等同 pressures = pressures[count:]）。
+
+        參數:
+        - count: 要丟棄的樣本數，以目前視窗的索引計算。
+
+        行為:
+        - 呼叫端重新決定了視窗開頭，evicted 歸零。
+        """
+        count = max(0, min(int(count), self._len))
+        self._start += count
+        self._len -= count
+        self.evicted = 0
+        if self._len == 0:
+            self._start = 0
+
+    def clear(self):
+        """清空視窗（等同 pressures = []），下一個樣本會重新初始化因果濾波器。"""
+        self._start = 0
+        self._len = 0
+        self.evicted = 0
+        self._causal = None
+        self.latest = None
+
+    def raw(self):
+        """返回視窗內的原始樣本（唯讀 numpy view，由舊到新）。"""
+        view = self._buf[self._start:self._start + self._len]
+        view.flags.writeable = False
+        return view
+
+    def smoothed(self):
+        """
+        對視窗內的樣本做零相位低通濾波。
+
+        返回: 與 raw() 等長的 numpy 陣列；樣本太少無法 padding 時返回原始資料副本。
+        """
+        from scipy.signal import sosfiltfilt
+
+        data = self.raw()
+        try:
+            return sosfiltfilt(self.sos, data)
+        except ValueError:
+            return np.array(data)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+單一生產者 / 單一消費者的樣本環狀緩衝區。
+
+時間戳（int64 ns）與數值（float64）存在預先配置的 numpy 陣列裡，
+擷取執行緒只寫入陣列並遞增寫入計數，控制迴圈只遞增讀取計數，
+兩邊不共用鎖。消費者太慢導致資料被覆寫時，會算出遺失的樣本數。
+"""
+
+import threading
+
+import numpy as np
+
+
+class SampleRing:
+    """
+    預先配置的樣本環狀緩衝區。
+
+    屬性:
+    - capacity: 可容納的樣本數。
+    - written: 生產者寫入的總樣本數（只由生產者修改）。
+    - consumed: 消費者取走的總樣本數（只由消費者修改）。
+    - overrun_samples: 因消費者落後而被覆寫、沒讀到的樣本數。
+    - overrun_events: 發生覆寫的次數。
+    """
+    def __init__(self, capacity=256):
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+        self.capacity = int(capacity)
+        self._timestamps = np.zeros(self.capacity, dtype=np.int64)
+        self._values = np.zeros(self.capacity, dtype=np.float64)
+        self.written = 0
+        self.consumed = 0
+        self.overrun_samples = 0
+        self.overrun_events = 0
+        self._ready = threading.Event()
+
+    # --- 生產者端 ---
+    def push(self, timestamp_ns, value):
+        """
+        寫入一個樣本（只能由單一生產者呼叫）。
+
+        行為:
+        - 先寫陣列再遞增 written，消費者看到新的 written 時資料已經就位。
+        - 緩衝區滿時直接覆寫最舊的樣本，不會阻塞生產者。
+        """
+        i = self.written % self.capacity
+        self._timestamps[i] = timestamp_ns
+        self._values[i] = value
+        self.written += 1
+        self._ready.set()
+
+    def wake(self):
+        """不寫入資料，只喚醒等待中的消費者（例如擷取執行緒出錯停止時）。"""
+        self._ready.set()
+
+    # --- 消費者端 ---
+    def __len__(self):
+        return min(self.written - self.consumed, self.capacity)
+
+    def wait(self, timeout=None):
+        """等待有新樣本（或逾時）。返回是否有未讀樣本。"""
+        if self.written > self.consumed:
+            return True
+        self._ready.wait(timeout)
+        return self.written > self.consumed
+
+    def read_available(self):
+        """
+        取出所有未讀樣本（只能由單一消費者呼叫）。
+
+        返回: (timestamps, values, lost)
+        - timestamps: int64 ns 陣列（複本）。
+        - values: float64 陣列（複本）。
+        - lost: 這次發現被覆寫而遺失的樣本數。
+
+        行為:
+        - 未讀樣本超過 capacity 時，只能拿到最新的 capacity 個。
+        - 複製期間若生產者又追上並覆寫了開頭的樣本，會把那幾個也算成遺失。
+        """
+        self._ready.clear()
+        end = self.written
+        start = self.consumed
+        lost = 0
+        if end - start > self.capacity:
+            lost = end - start - self.capacity
+            start = end - self.capacity
+
+        timestamps = self._copy(self._timestamps, start, end)
+        values = self._copy(self._values, start, end)
+
+        # 複製時生產者可能又寫了幾筆，覆蓋到剛複製的開頭
+        clobbered = self.written - self.capacity - start
+        if clobbered > 0:
+            clobbered = min(clobbered, end - start)
+            timestamps = timestamps[clobbered:]
+            values = values[clobbered:]
+            lost += clobbered
+
+        if lost:
+            self.overrun_samples += lost
+            self.overrun_events += 1
+        self.consumed = end
+        return timestamps, values, lost
+
+    def _copy(self, array, start, end):
+        n = end - start
+        i = start % self.capacity
+        if i + n <= self.capacity:
+            return array[i:i + n].copy()
+        return np.concatenate((array[i:], array[:i + n - self.capacity]))
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "written": self.written,
+            "consumed": self.consumed,
+            "pending": len(self),
+            "overrun_samples": self.overrun_samples,
+            "overrun_events": self.overrun_events,
+        }
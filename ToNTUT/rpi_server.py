@@ -1,217 +1,1014 @@
-import socket
-import threading
-import subprocess
+import asyncio
 import os
 import sys
+import threading
 import time
-from self_check import run_self_check
+from self_check import format_self_check, full_self_check, quick_self_check
+from sync_hub import SEND_TIMEOUT, Subscriber, SyncHub
+from sync_protocol import (VERSION as SYNC_PROTOCOL_VERSION, TYPE_CYCLE, TYPE_PROGRESS, TYPE_STOP, STOP_ACK,
+                           STOP_PARKED, STOP_RELEASED, CYCLE_STOP, CycleFrameWriter, FrameError, FrameSequencer,
+                           FrameStream, decode_stop, frame_type, progress_text)
 
 HOST = "0.0.0.0"
 PORT = 5005
 PROCESS_STOP_TIMEOUT = 5.0
-
-breathm_process = None
-active_conn = None
-active_addr = None
-process_lock = threading.Lock()
-active_conn_lock = threading.Lock()
+WRITE_HIGH_WATER = 64 * 1024
+OBSERVER_QUEUE_SIZE = 32    # 每個唯讀觀察者最多排隊的訊框數，滿了丟最舊的
+CONTROLLER_QUEUE_SIZE = 16  # 控制端最多排隊的訊框數（PROGRESS 只保留最新一筆，實際排隊的多是 CYCLE）
+# "thread": 呼吸引擎在伺服器程序內的執行緒上執行（ACTIVATE 約數十毫秒就開始取樣）
+# "process": 每次 ACTIVATE 啟動新的 Python 子程序執行 fix_version.py（原本的作法，需要數秒）
+ENGINE_MODE = "thread"
+# process 模式下預先啟動一個已載入依賴、開啟感測器的 standby worker，ACTIVATE 只需寫一行 START
+STANDBY_WORKER = True
+STANDBY_READY_TIMEOUT = 30.0
+# 啟動只跑快速自檢（感測器 ID、GPIO 切換）；完整的致動器行程測試（約 7 秒）在背景執行，
+# 也可以用 SELF_CHECK FULL 指令重跑。執行中的 ACTIVATE 會等它完成，失敗時拒絕 ACTIVATE。
+FULL_SELF_CHECK_AT_STARTUP = True
+# 每個 rig 是一組獨立的 BMP280 + 致動器（一位受試者），有自己的引擎、控制端與觀察者。
+# 客戶端以 RIG <name> 選擇 rig（預設 DEFAULT_RIG），所有 rig 的引擎共用同一個伺服器程序與 event loop。
+# pins: L298N 的 (in1, in2, en)；i2c_bus / i2c_addr: BMP280 所在的 bus 與位址（0x76 或 0x77）
+RIGS = {
+    "A": {"pins": (23, 24, 25), "i2c_bus": 1, "i2c_addr": 0x76},
+    # "B": {"pins": (5, 6, 13), "i2c_bus": 1, "i2c_addr": 0x77},
+}
+DEFAULT_RIG = "A"
+
+rigs = {}               # name -> Rig（serve() 依 RIGS 建立）
+client_rigs = {}        # writer -> Rig：送過 RIG 指令的連線
+background_tasks = set()
+stop_cycle_frames = CycleFrameWriter()   # publish_cycle_stop 用；seq 由 FrameSequencer 依連線重新編號
+binary_clients = set()  # 送過 PROTOCOL BINARY 的連線：同步資料直接轉送二進位訊框
+client_sequencers = {}  # writer -> FrameSequencer：依連線重新編 seq，引擎重啟或換 rig 也不會倒退
+cycle_clients = set()   # 送過 SYNC_MODE CYCLE 的連線：只收 CYCLE 訊框，自行外插進度
+udp_clients = {}        # writer -> (ip, port)：同步訊框改走 UDP（只保留最新值，不受 TCP 排隊影響）
+udp_transport = None
+udp_sent = 0
+udp_errors = 0
+standby_task = None     # 預熱中的 standby worker（asyncio.Task，結果為已就緒的子程序或 None；只給 DEFAULT_RIG）
 
 # 1. 取得絕對路徑，確保不管在哪執行都能找到 fix_version.py
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 SCRIPT_PATH = os.path.join(CURRENT_DIR, "fix_version.py")
+STANDBY_READY = "STANDBY_READY"     # 與 fix_version.STANDBY_READY 相同（process 模式不 import fix_version）
+fix_version = None
 
-def set_active_client(conn, addr):
-    global active_conn, active_addr
-    with active_conn_lock:
-        active_conn = conn
-        active_addr = addr
-        print(f"[SERVER] Active Unity client set to {addr}")
 
-
-def clear_active_client(conn=None):
-    global active_conn, active_addr
-    with active_conn_lock:
-        if conn is not None and active_conn is not conn:
+class Rig:
+    """
+    一組感測器 + 致動器的執行狀態。
+
+    屬性:
+    - name / pins / i2c_bus / i2c_addr: 設定（見 RIGS）。
+    - process: 執行中的引擎（InProcessEngine 或子程序）；沒有時為 None。
+    - abandoned: 被 kill() 放棄、執行緒還沒真正結束的 InProcessEngine；結束前不再啟動引擎。
+    - monitor_task / frames_task: 讀取引擎 log 與同步訊框的 task。
+    - active_writer / active_addr: 控制端（ACTIVATE 的連線）。
+    - active_sender: 控制端的 Subscriber；monitor 只放進佇列，由它自己的 task 寫入 socket。
+    - hub: 這個 rig 的唯讀觀察者（SUBSCRIBE）；控制端不在其中。
+    - lock: 啟動/停止引擎時持有。
+    - stopping: 停止中（或已排定停止）時為 True。
+    - stop_stages: 引擎 STOP 訊框回報的階段 -> 完成時間（monotonic 奈秒，與伺服器同一個時鐘）。
+    - released: 引擎確認 GPIO 已釋放（STOP_RELEASED）時 set。
+    - last_stop: 上一次停止各階段的延遲（毫秒）；stop_count / worst_park_ms: 累計統計。
+    - self_checks: "quick" / "full" -> 最近一次自檢結果（self_check 的 dict，含時間戳）。
+    - self_check_task: 執行中的完整自檢（asyncio.Task）。
+    - queued_activation: 自檢期間收到 ACTIVATE 時排入的背景 task；queued_writer / queued_addr 為等待中的連線
+      （取消後為 None）。
+    """
+    def __init__(self, name, pins, i2c_bus=1, i2c_addr=0x76):
+        self.name = name
+        self.pins = tuple(pins)
+        self.i2c_bus = i2c_bus
+        self.i2c_addr = i2c_addr
+        self.process = None
+        self.abandoned = None
+        self.monitor_task = None
+        self.frames_task = None
+        self.active_writer = None
+        self.active_addr = None
+        self.active_sender = None
+        self.hub = SyncHub(OBSERVER_QUEUE_SIZE)
+        self.lock = asyncio.Lock()
+        self.stopping = False
+        self.stop_stages = {}
+        self.released = asyncio.Event()
+        self.last_stop = None
+        self.stop_count = 0
+        self.worst_park_ms = 0.0
+        self.self_checks = {}
+        self.self_check_task = None
+        self.queued_activation = None
+        self.queued_writer = None
+        self.queued_addr = None
+
+    def engine_kwargs(self):
+        """執行緒模式傳給 BreathingEngine 的參數。"""
+        return {"pins": self.pins, "i2c_bus": self.i2c_bus, "i2c_addr": self.i2c_addr}
+
+    def engine_args(self):
+        """process 模式傳給 fix_version.py 的參數。"""
+        return ("--pins", ",".join(str(pin) for pin in self.pins),
+                "--i2c-bus", str(self.i2c_bus), "--i2c-addr", f"0x{self.i2c_addr:02X}")
+
+    def log_prefix(self):
+        return "[SCRIPT Log]" if len(rigs) <= 1 else f"[SCRIPT Log {self.name}]"
+
+    def abandoned_running(self):
+        """被放棄的引擎執行緒是否還在執行（已結束時順便清掉記錄）。"""
+        if self.abandoned is None:
             return False
-        old_addr = active_addr
-        active_conn = None
-        active_addr = None
-        if old_addr is not None:
-            print(f"[SERVER] Active Unity client cleared: {old_addr}")
-        return True
+        if self.abandoned.thread.is_alive():
+            return True
+        print(f"[SERVER] Abandoned engine thread on rig {self.name} has exited")
+        self.abandoned = None
+        return False
+
+    def self_check_running(self):
+        return self.self_check_task is not None and not self.self_check_task.done()
+
+    def self_check_report(self):
+        parts = [format_self_check(self.self_checks[level]) for level in ("quick", "full") if level in self.self_checks]
+        if self.self_check_running():
+            parts.append("full check running")
+        return f"Rig {self.name}: " + (" | ".join(parts) if parts else "not checked")
+
+    def stop_report(self):
+        if self.last_stop is None:
+            return "no stops yet"
+        return (f"last stop {format_stop_latency(self.last_stop)}; "
+                f"stops {self.stop_count}, worst park {self.worst_park_ms:.1f} ms")
+
+    def report(self):
+        if process_running(self.process):
+            state = "running"
+        elif self.abandoned_running():
+            state = "stuck (killed engine thread still running, actuator halted)"
+        else:
+            state = "idle"
+        controller = self.active_sender.report() if self.active_sender is not None else "Controller: none"
+        observers = "; ".join(sub.report() for sub in self.hub.subscribers.values())
+        return (f"Rig {self.name} {state} ({self.stop_report()}), {controller}"
+                + (f"; {observers}" if observers else ""))
+
+
+def create_rigs(config=None):
+    """
+    依 RIGS 建立每個 rig。
+
+    返回: dict name -> Rig。
+    行為:
+    - 兩個 rig 使用同一支 GPIO 腳位、或同一條 bus 上同一個感測器位址時拋出 ValueError。
+    """
+    config = RIGS if config is None else config
+    created = {}
+    pin_owner = {}
+    sensor_owner = {}
+    for name, settings in config.items():
+        rig = Rig(name, **settings)
+        for pin in rig.pins:
+            if pin in pin_owner:
+                raise ValueError(f"Rig {name}: GPIO {pin} is already used by rig {pin_owner[pin]}")
+            pin_owner[pin] = name
+        sensor = (rig.i2c_bus, rig.i2c_addr)
+        if sensor in sensor_owner:
+            raise ValueError(f"Rig {name}: BMP280 0x{rig.i2c_addr:02X} on bus {rig.i2c_bus} "
+                             f"is already used by rig {sensor_owner[sensor]}")
+        sensor_owner[sensor] = name
+        created[name] = rig
+    if DEFAULT_RIG not in created:
+        raise ValueError(f"DEFAULT_RIG {DEFAULT_RIG!r} is not in RIGS")
+    return created
+
+
+def format_stop_latency(latency):
+    names = (("ack", "ack"), ("parked", "actuator parked"), ("released", "GPIO released"), ("exited", "engine exited"))
+    parts = [f"{label} {latency[key]:.1f} ms" for key, label in names if latency.get(key) is not None]
+    if latency.get("killed"):
+        parts.append("killed")
+    return ", ".join(parts) if parts else "no confirmation"
+
+
+def rig_for(writer):
+    """返回這個連線選擇的 rig（沒送過 RIG 指令時為 DEFAULT_RIG）。"""
+    return client_rigs.get(writer) or rigs[DEFAULT_RIG]
+
+
+class InProcessEngine:
+    """
+    在伺服器程序內以執行緒執行 fix_version.BreathingEngine。
+
+    提供與 asyncio.subprocess.Process 相同的介面（returncode、stdout.readline()、
+    terminate()、kill()、wait()），伺服器其他部分不需要區分兩種模式。
+
+    行為:
+    - 引擎的每一行輸出經由 call_soon_threadsafe 放進 asyncio.Queue，由 monitor 讀取。
+    - 引擎的 run() 不論正常結束或例外都會在 finally 停止馬達並清理 GPIO；
+      執行緒結束後 returncode 為 0（正常）或 1（引擎回報錯誤）。
+    - 執行緒無法被強制終止；kill() 從伺服器這邊強制停止致動器並封鎖該執行緒之後的 GPIO 寫入
+      （ActuatorDriver.halt），再放棄該執行緒。執行緒真正結束前伺服器不會在同一個 rig 啟動引擎。
+    """
+    def __init__(self, loop, rig):
+        self.loop = loop
+        self.returncode = None
+        self.stdout = self
+        self.frames = self
+        self._lines = asyncio.Queue()
+        self._frames = asyncio.Queue()
+        self._done = asyncio.Event()
+        self.engine = fix_version.BreathingEngine(emit=self._emit, frame_sink=self._frame, **rig.engine_kwargs())
+        self.thread = threading.Thread(target=self._run, name=f"breathing-engine-{rig.name}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _emit(self, line):
+        self.loop.call_soon_threadsafe(self._lines.put_nowait, (line + "\n").encode("utf-8"))
+
+    def _frame(self, frame):
+        # frame 是引擎重複使用的 buffer，要先複製
+        self.loop.call_soon_threadsafe(self._frames.put_nowait, bytes(frame))
+
+    def _run(self):
+        code = 1
+        try:
+            self.engine.run()
+            code = 0 if self.engine.error is None else 1
+        except BaseException as e:
+            self._emit(f"!!! Engine thread crashed: {e!r}")
+        finally:
+            try:
+                self.loop.call_soon_threadsafe(self._finish, code)
+            except RuntimeError:
+                # event loop 已關閉（伺服器結束中）
+                pass
+
+    def _finish(self, code):
+        if self.returncode is None:
+            self.returncode = code
+            self._lines.put_nowait(b"")
+            self._frames.put_nowait(b"")
+            self._done.set()
+
+    async def readline(self):
+        if self._done.is_set() and self._lines.empty():
+            return b""
+        return await self._lines.get()
+
+    async def read_frame(self):
+        if self._done.is_set() and self._frames.empty():
+            return b""
+        return await self._frames.get()
+
+    def terminate(self):
+        self.engine.request_stop()
+
+    def kill(self):
+        self.engine.request_stop()
+        try:
+            if not self.engine.actuator.halt():
+                print("[SERVER] Engine thread is stuck in a GPIO call; actuator writes blocked but not confirmed")
+        except Exception as e:
+            print(f"[SERVER] Failed to halt actuator: {e!r}")
+        finally:
+            self._finish(-9)
 
+    async def wait(self):
+        await self._done.wait()
+        return self.returncode
 
-def send_sync_to_active_client(msg):
-    with active_conn_lock:
-        conn = active_conn
-        addr = active_addr
 
-    if conn is None:
-        print("[SERVER] No active Unity client for sync data; stopping script for safety")
-        stop_breathing_process("No active Unity client")
+def load_engine():
+    """
+    ENGINE_MODE 為 "thread" 時，在伺服器啟動時載入 fix_version 並預先計算濾波器與引導表，
+    讓 ACTIVATE 不必再負擔 import numpy/scipy 與濾波器設計的時間。
+    """
+    global fix_version
+    if ENGINE_MODE != "thread" or fix_version is not None:
+        return
+    start = time.perf_counter()
+    import fix_version as engine_module
+    engine_module.preload()
+    fix_version = engine_module
+    print(f"[SERVER] Breathing engine loaded in-process ({(time.perf_counter() - start) * 1000:.0f} ms)")
+
+def set_active_client(rig, writer, addr):
+    if rig.active_writer is writer and rig.active_sender is not None and not rig.active_sender.closed:
+        return
+    if rig.active_sender is not None:
+        rig.active_sender.close()
+    rig.active_writer = writer
+    rig.active_addr = addr
+    rig.active_sender = Subscriber(writer, addr, lambda frame: sync_data_for(writer, frame), CONTROLLER_QUEUE_SIZE,
+                                   udp_route(writer), on_error=lambda sender: controller_send_failed(rig, sender),
+                                   role="Controller")
+    print(f"[SERVER] Active Unity client for rig {rig.name} set to {addr}")
+
+
+def clear_active_client(rig, writer=None):
+    if writer is not None and rig.active_writer is not writer:
         return False
+    old_addr = rig.active_addr
+    if rig.active_sender is not None:
+        rig.active_sender.close()
+        print(f"[SERVER] {rig.active_sender.report()}")
+    rig.active_writer = None
+    rig.active_addr = None
+    rig.active_sender = None
+    if old_addr is not None:
+        print(f"[SERVER] Active Unity client for rig {rig.name} cleared: {old_addr}")
+    return True
+
+
+def controller_send_failed(rig, sender):
+    """控制端的送出 task 逾時或斷線：與原本直接送出失敗時相同，放掉控制端並停止腳本。"""
+    if sender is not rig.active_sender:
+        return
+    clear_active_client(rig, sender.writer)
+    task = asyncio.create_task(stop_breathing_process(rig, "Lost Unity client while sending sync data"))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+def process_running(proc):
+    return proc is not None and proc.returncode is None
+
+
+async def send_bytes(writer, data):
+    """
+    寫入資料並等待 buffer 排空（backpressure）。
+
+    行為:
+    - writer 的 buffer 低於 high water mark 時 drain 立即返回，不會拖慢呼叫端。
+    - 對方收太慢、超過 SEND_TIMEOUT 仍排不出去時拋出 asyncio.TimeoutError。
+    """
+    writer.write(data)
+    await asyncio.wait_for(writer.drain(), SEND_TIMEOUT)
 
+
+async def send_line(writer, msg):
+    await send_bytes(writer, msg.encode("utf-8"))
+
+
+def send_sync_datagram(data, udp_addr):
+    """
+    以 UDP 送出一個同步訊框（一個 datagram 一個訊框）。
+
+    行為:
+    - 不等待、不重送：延遲或遺失的訊框由下一個取代，客戶端以 seq 只保留最新的。
+    - 送出失敗只計數，不影響 TCP 連線（TCP 斷線才會停止腳本）。
+    """
+    global udp_sent, udp_errors
     try:
-        conn.sendall(msg.encode("utf-8"))
+        udp_transport.sendto(data, udp_addr)
+        udp_sent += 1
+    except Exception:
+        udp_errors += 1
+
+
+def sync_data_for(writer, frame):
+    """
+    依連線設定決定這個訊框要送出的資料。
+
+    返回: bytes；這個連線不需要這種訊框時返回 None。
+    - 週期模式（SYNC_MODE CYCLE）只送 CYCLE 訊框。
+    - 其他二進位客戶端送 PROGRESS 訊框；文字客戶端送 SYNC_PROGRESS 文字行。
+    - 二進位訊框的 seq 依這條連線重新編號（FrameSequencer）。
+    """
+    if writer in cycle_clients:
+        if frame_type(frame) != TYPE_CYCLE:
+            return None
+    elif frame_type(frame) != TYPE_PROGRESS:
+        return None
+    elif writer not in binary_clients:
+        return progress_text(frame)
+    sequencer = client_sequencers.get(writer)
+    if sequencer is None:
+        sequencer = client_sequencers[writer] = FrameSequencer()
+    return sequencer.stamp(frame)
+
+
+def udp_route(writer):
+    """返回 send_datagram(data) 函數：這個連線有設定 UDP 時送出並返回 True。"""
+    def send_datagram(data):
+        udp_addr = udp_clients.get(writer)
+        if udp_addr is None or udp_transport is None:
+            return False
+        send_sync_datagram(data, udp_addr)
         return True
+    return send_datagram
+
+
+def check_active_sender(rig):
+    """
+    返回控制端的 Subscriber。
+
+    行為:
+    - 沒有控制端時為了安全在背景停止腳本（只排定一次）並返回 None；
+      呼叫端（monitor）繼續讀取，才收得到引擎的 STOP 訊框。
+    """
+    if rig.active_sender is None and not rig.stopping:
+        print(f"[SERVER] No active Unity client for rig {rig.name} sync data; stopping script for safety")
+        rig.stopping = True
+        task = asyncio.create_task(stop_breathing_process(rig, "No active Unity client"))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    return rig.active_sender
+
+
+def sync_stats():
+    """STATS 指令的回覆：每個 rig 的狀態，控制端與觀察者的佇列深度、送出、合併與丟棄數。"""
+    parts = [rig.report() for rig in rigs.values()]
+    parts.append(f"UDP sent {udp_sent}, errors {udp_errors}")
+    return " | ".join(parts)
+
+
+async def run_full_self_check(rig):
+    """
+    在背景執行緒執行 rig 的完整自檢（致動器實際伸縮），結果存入 rig.self_checks["full"]。
+
+    行為:
+    - 持有 rig.lock，自檢期間不會啟動引擎；引擎正在執行時不做自檢。
+    """
+    async with rig.lock:
+        if process_running(rig.process) or rig.abandoned_running():
+            print(f"[SERVER] Rig {rig.name} is running; full self-check skipped")
+            return None
+        print(f"[SERVER] Rig {rig.name} full self-check started")
+        result = await asyncio.to_thread(full_self_check, **rig.engine_kwargs())
+    rig.self_checks["full"] = result
+    return result
+
+
+def queue_activation(rig, writer, addr):
+    """
+    完整自檢進行中收到的 ACTIVATE：立即回覆，自檢結束後在背景啟動引擎，再把結果回覆給該連線。
+
+    返回: 立即回覆的訊息。
+    行為:
+    - 指令處理不會被自檢（約 7.5 s）卡住，同一條連線的 STATS / SELF_CHECK 照常回覆。
+    - 每個 rig 只排一個；別的連線再送 ACTIVATE 時改由它接手（與引擎執行中再 ACTIVATE 相同）。
+    - 等待中的連線送 DEACTIVATE 或斷線時取消（cancel_queued_activation）。
+    """
+    rig.queued_writer = writer
+    rig.queued_addr = addr
+    if rig.queued_activation is None or rig.queued_activation.done():
+        rig.queued_activation = asyncio.create_task(run_queued_activation(rig))
+    print(f"[SERVER] ACTIVATE from {addr} queued until rig {rig.name} full self-check finishes")
+    return "INFO: SELF_CHECK in progress; ACTIVATE queued\n"
+
+
+async def run_queued_activation(rig):
+    await asyncio.wait((rig.self_check_task,))
+    writer, addr = rig.queued_writer, rig.queued_addr
+    rig.queued_writer = None
+    rig.queued_addr = None
+    if writer is None or writer.is_closing():
+        return
+    response = await start_breathing_process(rig, writer, addr)
+    try:
+        await send_line(writer, response)
     except Exception as e:
-        print(f"[SERVER] Failed to send sync data to {addr}: {e}")
-        clear_active_client(conn)
-        stop_breathing_process("Lost Unity client while sending sync data")
+        print(f"[SERVER] Failed to reply to queued ACTIVATE from {addr}: {e!r}")
+
+
+def cancel_queued_activation(rig, writer):
+    """取消這個連線排入的 ACTIVATE。返回 True 表示確實有排入。"""
+    if rig.queued_writer is not writer:
+        return False
+    rig.queued_writer = None
+    rig.queued_addr = None
+    print(f"[SERVER] Queued ACTIVATE on rig {rig.name} cancelled")
+    return True
+
+
+def start_full_self_check(rig):
+    """排定 rig 的完整自檢。已經在執行時返回 False。"""
+    if rig.self_check_running():
         return False
+    rig.self_check_task = asyncio.create_task(run_full_self_check(rig))
+    return True
 
 
-def stop_breathing_process(reason="Stop requested"):
-    global breathm_process
+async def spawn_engine_process(*args, **kwargs):
+    """
+    啟動 fix_version.py 子程序，並多開一條 pipe（--sync-fd）接收二進位同步訊框。
 
-    with process_lock:
-        proc = breathm_process
-        if proc is None or proc.poll() is not None:
-            breathm_process = None
-            return False
+    返回: asyncio.subprocess.Process，另外加上 frames（FrameStream）屬性。
+    """
+    read_fd, write_fd = os.pipe()
+    try:
+        # sys.executable: 確保使用目前的 Python 環境 (venv)
+        # "-u": 強制不緩衝，讓 print 馬上顯示
+        # stderr=STDOUT: 讓錯誤訊息也顯示在 Log 裡
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", SCRIPT_PATH, *args, "--sync-fd", str(write_fd),
+            pass_fds=(write_fd,),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            **kwargs,
+        )
+    except BaseException:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)
+    reader = asyncio.StreamReader()
+    await asyncio.get_running_loop().connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, "rb", 0))
+    proc.frames = FrameStream(reader)
+    return proc
 
-        print(f"[SERVER] Stopping breathing script: {reason}")
-        proc.terminate()
-        deadline = time.time() + PROCESS_STOP_TIMEOUT
 
-        while proc.poll() is None and time.time() < deadline:
-            time.sleep(0.1)
+async def spawn_standby_worker(rig):
+    """
+    啟動 rig 的 fix_version.py --standby，等到它印出 STANDBY_READY。
 
-        if proc.poll() is None:
-            print("[SERVER] Script did not exit after SIGTERM; killing it")
+    返回: 已就緒的子程序；就緒前就結束或超過 STANDBY_READY_TIMEOUT 時返回 None。
+    """
+    start = time.perf_counter()
+    deadline = time.monotonic() + STANDBY_READY_TIMEOUT
+    proc = await spawn_engine_process(*rig.engine_args(), "--standby", stdin=asyncio.subprocess.PIPE)
+    try:
+        while True:
+            try:
+                raw = await asyncio.wait_for(proc.stdout.readline(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                print(f"[SERVER] Standby worker {proc.pid} not ready after {STANDBY_READY_TIMEOUT:.0f} s; killing it")
+                proc.kill()
+                await proc.wait()
+                return None
+            if not raw:
+                print(f"[SERVER] Standby worker {proc.pid} exited before it was ready")
+                await proc.wait()
+                return None
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line == STANDBY_READY:
+                break
+            print(f"[STANDBY Log] {line}")
+    except BaseException:
+        if proc.returncode is None:
             proc.kill()
-            proc.wait()
+            await proc.wait()
+        raise
+    print(f"[SERVER] Standby worker {proc.pid} ready in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return proc
+
+
+def warm_standby_worker():
+    """在背景預熱 DEFAULT_RIG 的下一個 standby worker（process 模式且尚未有 worker 時）。"""
+    global standby_task
+    if ENGINE_MODE == "process" and STANDBY_WORKER and standby_task is None:
+        standby_task = asyncio.create_task(spawn_standby_worker(rigs[DEFAULT_RIG]))
+
+
+async def take_standby_worker():
+    """
+    取出已就緒的 standby worker（還在預熱就等它完成），並在背景預熱下一個。
 
-        breathm_process = None
-        print("[SERVER] Breathing script stopped")
+    返回: 可以送 START 的子程序；沒有可用的 worker 時返回 None。
+    """
+    global standby_task
+    task = standby_task
+    standby_task = None
+    if task is None:
+        return None
+    try:
+        proc = await task
+    except Exception as e:
+        print(f"[SERVER] Standby worker failed: {e!r}")
+        proc = None
+    warm_standby_worker()
+    if not process_running(proc):
+        return None
+    return proc
+
+
+async def discard_standby_worker():
+    global standby_task
+    task = standby_task
+    standby_task = None
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+        return
+    proc = task.result() if not task.cancelled() and task.exception() is None else None
+    if process_running(proc):
+        # 關閉 stdin 時 worker 會自行結束，保險起見仍 kill
+        proc.kill()
+        await proc.wait()
+
+
+async def stop_breathing_process(rig, reason="Stop requested"):
+    """
+    停止 rig 的呼吸腳本（其他 rig 不受影響）。
+
+    行為:
+    - 送 SIGTERM（執行緒模式為停止要求）後等待引擎的 STOP_RELEASED 訊框（馬達已停、GPIO 已釋放）
+      或引擎結束，兩者都是事件，不輪詢；之後在剩下的時間內等引擎結束（只剩統計輸出）。
+    - 逾時則 SIGKILL（執行緒模式為強制停止致動器並放棄該執行緒；執行緒還沒結束時記在 rig.abandoned，
+      結束前 ACTIVATE 返回 ENGINE_STILL_STOPPING）。
+    - 記錄並印出各階段（ack / 馬達停止 / GPIO 釋放 / 結束）的延遲。
+    """
+    async with rig.lock:
+        proc = rig.process
+        if not process_running(proc):
+            rig.process = None
+            rig.stopping = False
+            return False
+
+        print(f"[SERVER] Stopping breathing script on rig {rig.name}: {reason}")
+        rig.stopping = True
+        rig.stop_stages.clear()
+        rig.released.clear()
+        start_ns = time.monotonic_ns()
+        deadline = time.monotonic() + PROCESS_STOP_TIMEOUT
+        proc.terminate()
+
+        exit_task = asyncio.ensure_future(proc.wait())
+        released_task = asyncio.ensure_future(rig.released.wait())
+        await asyncio.wait((exit_task, released_task), timeout=PROCESS_STOP_TIMEOUT,
+                           return_when=asyncio.FIRST_COMPLETED)
+        released_task.cancel()
+        killed = False
+        try:
+            await asyncio.wait_for(exit_task, max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            if STOP_RELEASED in rig.stop_stages:
+                print("[SERVER] Script released GPIO but did not exit; killing it")
+            else:
+                print("[SERVER] Script did not exit after SIGTERM; killing it")
+            proc.kill()
+            await proc.wait()
+            killed = True
+            if isinstance(proc, InProcessEngine) and proc.thread.is_alive():
+                rig.abandoned = proc
+        exited_ns = time.monotonic_ns()
+        if rig.frames_task is not None and not killed:
+            # 引擎先結束時，pipe / 佇列裡可能還有沒讀到的 STOP 訊框
+            await asyncio.wait((rig.frames_task,), timeout=max(deadline - time.monotonic(), 0.1))
+
+        latency = {key: (rig.stop_stages[stage] - start_ns) / 1e6 if stage in rig.stop_stages else None
+                   for key, stage in (("ack", STOP_ACK), ("parked", STOP_PARKED), ("released", STOP_RELEASED))}
+        latency["exited"] = (exited_ns - start_ns) / 1e6
+        latency["killed"] = killed
+        rig.last_stop = latency
+        rig.stop_count += 1
+        if latency["parked"] is not None:
+            rig.worst_park_ms = max(rig.worst_park_ms, latency["parked"])
+        rig.process = None
+        rig.stopping = False
+        print(f"[SERVER] Breathing script on rig {rig.name} stopped: {format_stop_latency(latency)}")
+        if rig.abandoned is not None:
+            print(f"[SERVER] Engine thread on rig {rig.name} is still running; actuator halted, ACTIVATE refused until it exits")
         return True
 
 
-def monitor_process_output(proc):
+async def monitor_process_output(rig, proc):
     """
     持續監視子程序的輸出（包括 stdout 和 stderr），並將包含 'SYNC_' 關鍵字的行通過 socket 發送給 Unity 客戶端。
-    
+
     參數:
-    - proc: 子程序對象（subprocess.Popen 實例），用於讀取其輸出。
+    - rig: 這個引擎所屬的 Rig。
+    - proc: 子程序對象（asyncio.subprocess.Process 實例），用於讀取其輸出。
     行為:
-    - 使用迭代器逐行讀取 proc.stdout。
+    - 以 StreamReader 逐行讀取 proc.stdout，不佔用執行緒。
     - 每行輸出都會被印出到伺服器控制台（用於調試）。
-    - 如果行包含 'SYNC_'，則將該行（加上換行符）發送給目前 active 的 Unity client。
-    - 如果發送失敗，記錄錯誤並中斷監視。
+    - 如果行包含 'SYNC_'，則將該行（加上換行符）放進目前 active 的 Unity client 的送出佇列（不等待）。
+    - 沒有 active client 時在背景停止腳本，繼續讀到腳本結束。
     - 當子程序結束時，退出循環並記錄結束訊息。
     """
     try:
         # 逐行讀取輸出
-        for line in iter(proc.stdout.readline, ''):
-            if not line:
+        while True:
+            raw = await proc.stdout.readline()
+            if not raw:
                 break
-            line = line.strip()
-            
+            line = raw.decode("utf-8", errors="replace").strip()
+
             # [關鍵] 印出所有 Log，這樣你才看得到它有沒有在跑，或有沒有報錯
-            print(f"[SCRIPT Log] {line}") 
+            print(f"{rig.log_prefix()} {line}")
 
+            # 相容舊版腳本：以文字印出的 SYNC_ 行照原樣轉送
             if "SYNC_" in line:
-                msg = line + "\n"
-                if not send_sync_to_active_client(msg):
-                    break
+                sender = check_active_sender(rig)
+                if sender is None:
+                    continue
+                sender.offer_data((line + "\n").encode("utf-8"), "SYNC_PROGRESS" if "SYNC_PROGRESS" in line else None)
     except Exception as e:
-        print(f"[SERVER] Monitor thread error: {e}")
+        print(f"[SERVER] Monitor task error: {e}")
     finally:
-        global breathm_process
-        with process_lock:
-            if breathm_process is proc and proc.poll() is not None:
-                breathm_process = None
-        print("[SERVER] Process monitor ended")
-
-def start_breathing_process(conn, addr):
-    global breathm_process
-
-    with process_lock:
-        if breathm_process is not None and breathm_process.poll() is None:
-            set_active_client(conn, addr)
+        async with rig.lock:
+            if rig.process is proc and not process_running(proc):
+                rig.process = None
+        print(f"[SERVER] Process monitor for rig {rig.name} ended")
+
+async def monitor_sync_frames(rig, proc):
+    """
+    讀取引擎送出的二進位同步訊框，分送給觀察者與 active client。
+
+    行為:
+    - 每個連線收到的格式由 sync_data_for() 決定。
+    - 送過 UDP <port> 的連線經由 UDP 收到訊框，TCP 只剩指令回覆。
+    - 觀察者與控制端都只是把訊框放進各自的有界佇列（不等待），由各自的
+      送出 task 寫入 socket；任何一端收太慢都不會停止讀取 pipe。
+    - 控制端佇列中還沒送出的 PROGRESS 會被較新的取代，只保留最新值。
+    - STOP 訊框不轉送，只記錄到 rig.stop_stages，STOP_RELEASED 時 set rig.released。
+      STOP_PARKED 時（或沒收到它就結束時）改送 CYCLE_STOP 給週期模式的客戶端（publish_cycle_stop）。
+    - 引擎結束（pipe 關閉）時結束；沒有控制端時在背景停止腳本並繼續讀取（才收得到 STOP 訊框）。
+      控制端送出失敗由 controller_send_failed() 停止腳本。
+    """
+    stop_published = False
+    try:
+        while True:
+            frame = await proc.frames.read_frame()
+            if not frame:
+                break
+            if frame_type(frame) == TYPE_STOP:
+                stop = decode_stop(frame)
+                rig.stop_stages[stop.stage] = stop.t_ns
+                if stop.stage == STOP_PARKED and not stop_published:
+                    publish_cycle_stop(rig, stop.t_ns)
+                    stop_published = True
+                if stop.stage == STOP_RELEASED:
+                    rig.released.set()
+                continue
+            rig.hub.publish(frame)
+            sender = check_active_sender(rig)
+            if sender is None:
+                continue
+            sender.offer(frame)
+    except FrameError as e:
+        print(f"[SERVER] Sync frame stream corrupted: {e}")
+    except Exception as e:
+        print(f"[SERVER] Sync frame monitor error: {e!r}")
+    finally:
+        if not stop_published:
+            # 引擎崩潰或被 kill，沒送出 STOP_PARKED
+            publish_cycle_stop(rig, time.monotonic_ns())
+
+
+def publish_cycle_stop(rig, t_ns):
+    """
+    送出 period 0、reason CYCLE_STOP 的 CYCLE 訊框給觀察者與控制端。
+
+    行為:
+    - 週期模式的客戶端收到後停止外插，停在當下的進度；其他客戶端由 sync_data_for() 濾掉。
+    - t_ns 是馬達停下的時間（與引擎同一個 monotonic 時鐘）。
+    """
+    frame = bytes(stop_cycle_frames.pack(t_ns, 0, 0.0, 0.0, 0.0, 0.0, -1, 0, 0, CYCLE_STOP))
+    rig.hub.publish(frame)
+    if rig.active_sender is not None:
+        rig.active_sender.offer(frame)
+
+
+async def start_breathing_process(rig, writer, addr):
+    if rig.self_check_running():
+        print(f"[SERVER] Waiting for rig {rig.name} full self-check before ACTIVATE")
+        await asyncio.wait((rig.self_check_task,))
+
+    async with rig.lock:
+        if process_running(rig.process):
+            set_active_client(rig, writer, addr)
             return "INFO: Script already running; attached to this client\n"
 
-        print(f"[SERVER] Attempting to start script: {SCRIPT_PATH}")
+        if rig.abandoned_running():
+            # 上一個引擎執行緒被放棄但還沒結束：它結束時會釋放同一組腳位，不能重疊
+            return "ERROR: ENGINE_STILL_STOPPING\n"
+
+        full = rig.self_checks.get("full")
+        if full is not None and not full["ok"]:
+            return "ERROR: SELF_CHECK_FAILED\n"
 
         try:
-            # sys.executable: 確保使用目前的 Python 環境 (venv)
-            # "-u": 強制不緩衝，讓 print 馬上顯示
-            # stderr=subprocess.STDOUT: 讓錯誤訊息也顯示在 Log 裡
-            breathm_process = subprocess.Popen(
-                [sys.executable, "-u", SCRIPT_PATH],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
-            )
-            set_active_client(conn, addr)
-
-            t = threading.Thread(target=monitor_process_output, args=(breathm_process,), daemon=True)
-            t.start()
+            if ENGINE_MODE == "thread":
+                print(f"[SERVER] Starting in-process breathing engine on rig {rig.name}")
+                load_engine()
+                rig.process = InProcessEngine(asyncio.get_running_loop(), rig).start()
+            else:
+                rig.process = await take_standby_worker() if rig.name == DEFAULT_RIG else None
+                if rig.process is not None:
+                    print(f"[SERVER] Activating standby worker {rig.process.pid}")
+                    rig.process.stdin.write(b"START\n")
+                    await rig.process.stdin.drain()
+                else:
+                    print(f"[SERVER] Attempting to start script on rig {rig.name}: {SCRIPT_PATH}")
+                    rig.process = await spawn_engine_process(*rig.engine_args())
+            set_active_client(rig, writer, addr)
+            rig.monitor_task = asyncio.create_task(monitor_process_output(rig, rig.process))
+            rig.frames_task = asyncio.create_task(monitor_sync_frames(rig, rig.process))
 
             return "OK: ACTIVATE\n"
         except Exception as e:
-            breathm_process = None
-            clear_active_client(conn)
+            rig.process = None
+            clear_active_client(rig, writer)
             print(f"[SERVER] Failed to start process: {e}")
             return f"ERROR: Launch failed {e}\n"
 
 
-def handle_command(cmd: str, conn, addr):
+async def handle_command(cmd: str, writer, addr):
     cmd = cmd.strip()
     print(f"[SERVER] Received command: {cmd}")
+    rig = rig_for(writer)
+
+    if cmd in ("ACTIVATE", "DEACTIVATE", "SELF_CHECK FULL") and writer in rig.hub.subscribers:
+        return "ERROR: OBSERVER_READ_ONLY\n"
 
     if cmd == "ACTIVATE":
-        return start_breathing_process(conn, addr)
+        if rig.self_check_running() and not process_running(rig.process):
+            return queue_activation(rig, writer, addr)
+        return await start_breathing_process(rig, writer, addr)
+
+    elif cmd.startswith("RIG "):
+        # RIG <name>: 之後的 ACTIVATE/SUBSCRIBE 作用在這個 rig；已經是控制端或觀察者時不能換
+        name = cmd.split(None, 1)[1].strip()
+        if name not in rigs:
+            return "ERROR: UNKNOWN_RIG\n"
+        if rigs[name] is not rig and (writer is rig.active_writer or writer is rig.queued_writer
+                                      or writer in rig.hub.subscribers):
+            return "ERROR: RIG_IN_USE\n"
+        client_rigs[writer] = rigs[name]
+        return f"OK: RIG {name}\n"
+
+    elif cmd == "SUBSCRIBE":
+        # 唯讀觀察者：收到與控制端相同的同步資料，但不能控制、斷線也不會停止腳本
+        if writer is rig.active_writer:
+            return "ERROR: CONTROLLER_CANNOT_SUBSCRIBE\n"
+        rig.hub.subscribe(writer, addr, lambda frame: sync_data_for(writer, frame), udp_route(writer))
+        print(f"[SERVER] Observer subscribed to rig {rig.name}: {addr} ({len(rig.hub.subscribers)} observers)")
+        return "OK: SUBSCRIBE\n"
+
+    elif cmd == "SELF_CHECK":
+        # 快取的自檢結果（含時間戳），不碰硬體
+        return f"OK: SELF_CHECK {rig.self_check_report()}\n"
+
+    elif cmd == "SELF_CHECK FULL":
+        # 重跑完整自檢（致動器會實際伸縮）；結果之後以 SELF_CHECK 查詢
+        if process_running(rig.process) or rig.abandoned_running():
+            return "ERROR: RIG_BUSY\n"
+        if not start_full_self_check(rig):
+            return "INFO: SELF_CHECK already running\n"
+        return "OK: SELF_CHECK FULL started\n"
+
+    elif cmd == "STATS":
+        return f"OK: STATS {sync_stats()}\n"
+
+    elif cmd == "UNSUBSCRIBE":
+        if rig.hub.unsubscribe(writer):
+            return "OK: UNSUBSCRIBE\n"
+        return "INFO: Not subscribed\n"
+
+    elif cmd.startswith("PROTOCOL "):
+        # PROTOCOL BINARY <version>: 之後的同步資料改用 sync_protocol 的二進位訊框
+        parts = cmd.split()
+        if len(parts) == 3 and parts[1] == "BINARY" and parts[2] == str(SYNC_PROTOCOL_VERSION):
+            binary_clients.add(writer)
+            return f"OK: PROTOCOL BINARY {SYNC_PROTOCOL_VERSION}\n"
+        elif len(parts) == 2 and parts[1] == "TEXT":
+            binary_clients.discard(writer)
+            cycle_clients.discard(writer)
+            udp_clients.pop(writer, None)
+            return "OK: PROTOCOL TEXT\n"
+        return "ERROR: UNSUPPORTED_PROTOCOL\n"
+
+    elif cmd.startswith("SYNC_MODE "):
+        # SYNC_MODE CYCLE: 只收週期參數，客戶端自行外插；SYNC_MODE STREAM: 每批樣本一個進度
+        mode = cmd.split(None, 1)[1].strip()
+        if mode == "CYCLE":
+            if writer not in binary_clients:
+                return "ERROR: SYNC_MODE CYCLE requires PROTOCOL BINARY\n"
+            cycle_clients.add(writer)
+            return "OK: SYNC_MODE CYCLE\n"
+        elif mode == "STREAM":
+            cycle_clients.discard(writer)
+            return "OK: SYNC_MODE STREAM\n"
+        return "ERROR: UNKNOWN_SYNC_MODE\n"
+
+    elif cmd.startswith("UDP "):
+        # UDP <port>: 同步訊框改送到這個客戶端 IP 的 UDP port；UDP OFF: 改回 TCP
+        arg = cmd.split(None, 1)[1].strip()
+        if arg == "OFF":
+            udp_clients.pop(writer, None)
+            return "OK: UDP OFF\n"
+        if writer not in binary_clients:
+            return "ERROR: UDP requires PROTOCOL BINARY\n"
+        if udp_transport is None:
+            return "ERROR: UDP unavailable\n"
+        try:
+            port = int(arg)
+        except ValueError:
+            return "ERROR: BAD_UDP_PORT\n"
+        if not 0 < port < 65536:
+            return "ERROR: BAD_UDP_PORT\n"
+        udp_clients[writer] = (addr[0], port)
+        return f"OK: UDP {port}\n"
 
     elif cmd == "DEACTIVATE":
-        stopped = stop_breathing_process("DEACTIVATE command")
-        clear_active_client(conn)
-        if stopped:
+        cancelled = cancel_queued_activation(rig, writer)
+        if rig.self_check_running() and not process_running(rig.process):
+            # 自檢持有 rig.lock 且期間不會啟動引擎：沒有東西要停，不必等自檢結束
+            stopped = False
+        else:
+            stopped = await stop_breathing_process(rig, "DEACTIVATE command")
+        clear_active_client(rig, writer)
+        if stopped or cancelled:
             return "OK: DEACTIVATE\n"
         else:
             return "INFO: Script is NOT running\n"
     else:
         return "ERROR: UNKNOWN_COMMAND\n"
 
-def client_thread(conn, addr):
+async def handle_client(reader, writer):
+    addr = writer.get_extra_info("peername")
     print(f"[SERVER] New connection from {addr}")
-    with conn:
-        buffer = b""
+    writer.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+    try:
         while True:
             try:
-                data = conn.recv(1024)
+                data = await reader.readline()
                 if not data:
                     print(f"[SERVER] Client {addr} disconnected")
                     break
-                buffer += data
-                while b"\n" in buffer:
-                    line, buffer = buffer.split(b"\n", 1)
-                    response = handle_command(line.decode("utf-8"), conn, addr)
-                    conn.sendall(response.encode("utf-8"))
+                if not data.endswith(b"\n"):
+                    # 對方關閉前留下沒有換行的半行，與原本行為相同：不處理
+                    print(f"[SERVER] Client {addr} disconnected")
+                    break
+                response = await handle_command(data.decode("utf-8"), writer, addr)
+                await send_line(writer, response)
             except ConnectionResetError:
                 print(f"[SERVER] Connection reset by {addr}")
                 break
             except Exception as e:
-                print(f"[SERVER] Error: {e}")
+                print(f"[SERVER] Error: {e!r}")
                 break
-        if clear_active_client(conn):
-            stop_breathing_process(f"Unity client {addr} disconnected")
+    finally:
+        rig = rig_for(writer)
+        client_rigs.pop(writer, None)
+        client_sequencers.pop(writer, None)
+        if rig.hub.unsubscribe(writer):
+            print(f"[SERVER] Observer {addr} left")
+        binary_clients.discard(writer)
+        cycle_clients.discard(writer)
+        udp_clients.pop(writer, None)
+        cancel_queued_activation(rig, writer)
+        if clear_active_client(rig, writer):
+            await stop_breathing_process(rig, f"Unity client {addr} disconnected")
+        writer.close()
+
+async def serve(self_checks=None):
+    """
+    參數:
+    - self_checks: rig 名稱 -> 啟動前的快速自檢結果（快取下來給 SELF_CHECK 指令）。
+    """
+    global rigs, udp_transport
+    rigs = create_rigs()
+    for name, result in (self_checks or {}).items():
+        rigs[name].self_checks["quick"] = result
+    print("[SERVER] Rigs: " + ", ".join(
+        f"{rig.name} (GPIO {rig.pins}, BMP280 0x{rig.i2c_addr:02X} on bus {rig.i2c_bus})" for rig in rigs.values()))
+
+    server = await asyncio.start_server(handle_client, HOST, PORT, reuse_address=True)
+    print(f"[SERVER] Listening on {HOST}:{PORT}")
+    try:
+        udp_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            asyncio.DatagramProtocol, local_addr=(HOST, 0))
+    except OSError as e:
+        print(f"[SERVER] UDP sync channel unavailable: {e}")
+    warm_standby_worker()
+    if FULL_SELF_CHECK_AT_STARTUP:
+        for rig in rigs.values():
+            start_full_self_check(rig)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await discard_standby_worker()
+        await asyncio.gather(*(stop_breathing_process(rig, "Server shutting down") for rig in rigs.values()))
+        for rig in rigs.values():
+            print(f"[Rig {rig.name}] {rig.hub.report()}")
+            rig.hub.close()
+        if udp_transport is not None:
+            udp_transport.close()
+            udp_transport = None
+            print(f"[SERVER] UDP sync datagrams sent {udp_sent}, errors {udp_errors}")
 
 def main():
-    if not run_self_check():
+    # 只有快速自檢擋住啟動；完整的致動器測試在伺服器開始監聽後於背景執行
+    self_checks = {name: quick_self_check(**settings) for name, settings in RIGS.items()}
+    if not all(result["ok"] for result in self_checks.values()):
         print("[SERVER] Self-check fails. System terminates")
         return
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((HOST, PORT))
-        s.listen(1)
-        print(f"[SERVER] Listening on {HOST}:{PORT}")
-        while True:
-            conn, addr = s.accept()
-            t = threading.Thread(target=client_thread, args=(conn, addr), daemon=True)
-            t.start()
+    load_engine()
+    try:
+        asyncio.run(serve(self_checks))
+    except KeyboardInterrupt:
+        print("\n[SERVER] Interrupted")
 
 if __name__ == "__main__":
     main()
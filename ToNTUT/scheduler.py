@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+以絕對期限排程的固定週期迴圈計時器。
+
+原本每圈用 time.time() 量耗時再 sleep(sampling_rate - elapsed)，誤差會累積、
+系統時鐘調整時會跳動，也看不出哪幾圈超時。DeadlineScheduler 改用
+time.monotonic_ns() 的絕對期限：先 sleep 到期限前一小段，最後一段忙等，
+並統計每圈的喚醒抖動（直方圖）與超時次數。
+
+用法（量測負載下能否維持 60 Hz）:
+    python3 scheduler.py [秒數] [負載執行緒數]
+"""
+
+import bisect
+import sys
+import threading
+import time
+
+# 抖動直方圖的上界（微秒）；最後一格是超過 10 ms
+JITTER_BINS_US = (50, 100, 250, 500, 1000, 2000, 5000, 10000)
+
+
+class DeadlineScheduler:
+    """
+    固定週期的絕對期限排程器。
+
+    屬性:
+    - period_ns: 週期（奈秒）。
+    - ticks: 已完成的週期數。
+    - late_ticks: 呼叫 wait() 時已經過了期限的次數（這一圈工作超時）。
+    - missed_periods: 超時超過一整個週期而整個跳過的週期數。
+    """
+    def __init__(self, period_s, spin_us=500, sleep_fn=time.sleep):
+        """
+        參數:
+        - period_s: 週期（秒）。
+        - spin_us: 期限前最後這段時間改用忙等（微秒）；0 = 只用 sleep。
+        - sleep_fn: 睡眠函數，可換成 threading.Event.wait 讓停止要求能立即生效。
+        """
+        self.period_ns = int(round(period_s * 1e9))
+        self.spin_ns = int(spin_us * 1000)
+        self.sleep_fn = sleep_fn
+        self.reset()
+
+    def reset(self):
+        """清除統計，並以現在時間作為下一個期限的起點。"""
+        self.deadline_ns = time.monotonic_ns()
+        self.ticks = 0
+        self.late_ticks = 0
+        self.missed_periods = 0
+        self._histogram = [0] * (len(JITTER_BINS_US) + 1)
+        self._jitter_sum_ns = 0
+        self._jitter_max_ns = 0
+
+    def wait(self):
+        """
+        等到下一個期限。
+
+        返回: 這次跳過的週期數（正常為 0）。
+
+        行為:
+        - 期限 = 上一個期限 + period，不受這一圈實際耗時影響，不會漂移。
+        - 超時超過一整個週期時，把期限往後推到未來，並把跳過的週期記下來。
+        - 記錄實際喚醒時間與期限的差（抖動）。
+        """
+        self.deadline_ns += self.period_ns
+        now = time.monotonic_ns()
+        skipped = 0
+        if now > self.deadline_ns:
+            self.late_ticks += 1
+            if now >= self.deadline_ns + self.period_ns:
+                skipped = (now - self.deadline_ns) // self.period_ns
+                self.missed_periods += skipped
+                self.deadline_ns += skipped * self.period_ns
+
+        remaining = self.deadline_ns - now - self.spin_ns
+        if remaining > 0 and self.sleep_fn(remaining / 1e9):
+            # sleep_fn 是 Event.wait 且事件已觸發（停止要求），不再忙等
+            return skipped
+        now = time.monotonic_ns()
+        while now < self.deadline_ns:
+            now = time.monotonic_ns()
+
+        self._record(now - self.deadline_ns)
+        return skipped
+
+    def _record(self, jitter_ns):
+        self.ticks += 1
+        self._jitter_sum_ns += jitter_ns
+        if jitter_ns > self._jitter_max_ns:
+            self._jitter_max_ns = jitter_ns
+        self._histogram[bisect.bisect_left(JITTER_BINS_US, jitter_ns / 1000.0)] += 1
+
+    def histogram(self):
+        """返回 [(上界字串, 次數), ...] 的抖動直方圖。"""
+        labels = [f"<={b}us" for b in JITTER_BINS_US] + [f">{JITTER_BINS_US[-1]}us"]
+        return list(zip(labels, self._histogram))
+
+    def jitter_percentile_us(self, q):
+        """由直方圖估計第 q 百分位的抖動上界（微秒）；落在最後一格時返回最大值。"""
+        if self.ticks == 0:
+            return 0.0
+        target = q / 100.0 * self.ticks
+        total = 0
+        for bound, count in zip(JITTER_BINS_US, self._histogram):
+            total += count
+            if total >= target:
+                return float(bound)
+        return self._jitter_max_ns / 1000.0
+
+    def stats(self):
+        return {
+            "ticks": self.ticks,
+            "late_ticks": self.late_ticks,
+            "missed_periods": self.missed_periods,
+            "jitter_us_mean": self._jitter_sum_ns / self.ticks / 1000.0 if self.ticks else 0.0,
+            "jitter_us_p99": self.jitter_percentile_us(99),
+            "jitter_us_max": self._jitter_max_ns / 1000.0,
+            "histogram": self.histogram(),
+        }
+
+    def report(self):
+        s = self.stats()
+        bins = ", ".join(f"{label} {count}" for label, count in s["histogram"] if count)
+        return (f"[Scheduler] {1e9 / self.period_ns:.1f} Hz, ticks {s['ticks']}, late {s['late_ticks']}, "
+                f"missed {s['missed_periods']}, jitter mean {s['jitter_us_mean']:.0f} us, "
+                f"p99 <= {s['jitter_us_p99']:.0f} us, max {s['jitter_us_max']:.0f} us | {bins}")
+
+
+def _busy(stop):
+    x = 0
+    while not stop.is_set():
+        x = (x * 31 + 7) % 1000003
+
+
+def main(argv):
+    seconds = float(argv[1]) if len(argv) > 1 else 5.0
+    load_threads = int(argv[2]) if len(argv) > 2 else 0
+
+    stop = threading.Event()
+    for _ in range(load_threads):
+        threading.Thread(target=_busy, args=(stop,), daemon=True).start()
+
+    for spin_us in (0, 500):
+        scheduler = DeadlineScheduler(1.0 / 60.0, spin_us=spin_us)
+        start = time.monotonic_ns()
+        while time.monotonic_ns() - start < seconds * 1e9:
+            scheduler.wait()
+        rate = scheduler.ticks / ((time.monotonic_ns() - start) / 1e9)
+        print(f"spin {spin_us:>3} us, load {load_threads}: {rate:.2f} Hz")
+        print("  " + scheduler.report())
+    stop.set()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
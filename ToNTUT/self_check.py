@@ -1,4 +1,15 @@
 # self_check.py
+"""
+硬體自檢。
+
+分兩層:
+- quick_self_check(): 讀 BMP280 的晶片 ID、短暫切換 en 腳位（方向腳位保持 LOW，
+  馬達不會動），只需幾毫秒，rpi_server 啟動時用它決定能不能啟動。
+- full_self_check(): 讀取壓力並讓致動器實際伸出、縮回（約 7 秒），
+  rpi_server 在背景或收到 SELF_CHECK FULL 指令時執行。
+
+兩者都返回帶時間戳的結果（dict），由呼叫端快取並回報給客戶端。
+"""
 import time
 import sys
 import RPi.GPIO as GPIO
@@ -8,6 +19,7 @@ try:
 except ImportError:
     from smbus import SMBus
 from bmp280 import BMP280
+from bmp280_driver import REG_CHIP_ID, CHIP_ID
 
 I2C_BUS_ID = 1             
 BMP280_I2C_ADDR = 0x76     
@@ -15,15 +27,20 @@ BMP280_I2C_ADDR = 0x76
 IN1_PIN = 23   
 IN2_PIN = 24   
 ENA_PIN = 25   
+DEFAULT_PINS = (IN1_PIN, IN2_PIN, ENA_PIN)
 
 EXTEND_TIME = 3  
 RETRACT_TIME = 3 
 TEST_SPEED = 80    
+QUICK_TOGGLES = 2          # 快速自檢時 en 腳位 HIGH/LOW 切換的次數
 
-def self_check_bmp280():
+def self_check_bmp280(i2c_bus=I2C_BUS_ID, i2c_addr=BMP280_I2C_ADDR):
     """
     檢查 BMP280 壓力感測器是否正常工作。
     
+    參數:
+    - i2c_bus / i2c_addr: 感測器所在的 bus 與位址。
+
     行為:
     - 印出檢查訊息。
     - 嘗試創建 SMBus 和 BMP280 實例，讀取壓力值。
@@ -33,8 +50,8 @@ def self_check_bmp280():
     print("[SELF-CHECK] Checking BMP280...")
 
     try:
-        bus = SMBus(I2C_BUS_ID)
-        bmp280 = BMP280(i2c_dev=bus, i2c_addr=BMP280_I2C_ADDR)
+        bus = SMBus(i2c_bus)
+        bmp280 = BMP280(i2c_dev=bus, i2c_addr=i2c_addr)
         pressure = bmp280.get_pressure()
         print(f"[SELF-CHECK] BMP280 reads data successfully: {pressure:.2f} hPa")
         return True
@@ -44,94 +61,104 @@ def self_check_bmp280():
         return False
 
 
-def setup_motor_gpio():
+def setup_motor_gpio(pins=DEFAULT_PINS):
     """
     設置馬達控制的 GPIO 引腳和 PWM。
     
+    參數:
+    - pins: (in1, in2, en)，預設為 IN1_PIN、IN2_PIN、ENA_PIN。
+
     返回: PWM 實例，用於控制馬達速度。
     
     行為:
     - 設置 GPIO 模式為 BCM。
-    - 配置 IN1_PIN、IN2_PIN 和 ENA_PIN 為輸出。
-    - 創建 PWM 實例在 ENA_PIN 上，頻率 800Hz，啟動占空比 100%。
+    - 配置 in1、in2 和 en 為輸出。
+    - 創建 PWM 實例在 en 上，頻率 800Hz，啟動占空比 100%。
     - 返回 PWM 實例供後續使用。
     """
+    in1, in2, en = pins
     GPIO.setmode(GPIO.BCM)
-    GPIO.setup(IN1_PIN, GPIO.OUT)
-    GPIO.setup(IN2_PIN, GPIO.OUT)
-    GPIO.setup(ENA_PIN, GPIO.OUT)
+    GPIO.setup(in1, GPIO.OUT)
+    GPIO.setup(in2, GPIO.OUT)
+    GPIO.setup(en, GPIO.OUT)
 
-    pwm = GPIO.PWM(ENA_PIN, 800) 
+    pwm = GPIO.PWM(en, 800) 
     pwm.start(100)
     return pwm
 
 
-def motor_stop(pwm):
+def motor_stop(pwm, pins=DEFAULT_PINS):
     """
     停止馬達運動。
     
     參數:
     - pwm: PWM 實例。
+    - pins: (in1, in2, en)。
     
     行為:
-    - 設置 IN1_PIN 和 IN2_PIN 為低電平，停止馬達。
+    - 設置 in1 和 in2 為低電平，停止馬達。
     - 設置 PWM 占空比為 0，關閉電源。
     """
-    GPIO.output(IN1_PIN, GPIO.LOW)
-    GPIO.output(IN2_PIN, GPIO.LOW)
+    GPIO.output(pins[0], GPIO.LOW)
+    GPIO.output(pins[1], GPIO.LOW)
     pwm.ChangeDutyCycle(0)
 
 
-def motor_extend(pwm, seconds):
+def motor_extend(pwm, seconds, pins=DEFAULT_PINS):
     """
     讓馬達伸出指定時間。
     
     參數:
     - pwm: PWM 實例。
     - seconds: 伸出持續時間（秒）。
+    - pins: (in1, in2, en)。
     
     行為:
     - 印出伸出訊息。
-    - 設置 IN1_PIN 高、IN2_PIN 低，啟動伸出。
+    - 設置 in1 高、in2 低，啟動伸出。
     - 設置 PWM 占空比為 TEST_SPEED。
     - 等待指定時間。
     - 調用 motor_stop 停止。
     """
     print("[SELF-CHECK] Motor: extending...")
-    GPIO.output(IN1_PIN, GPIO.HIGH)
-    GPIO.output(IN2_PIN, GPIO.LOW)
+    GPIO.output(pins[0], GPIO.HIGH)
+    GPIO.output(pins[1], GPIO.LOW)
     pwm.ChangeDutyCycle(TEST_SPEED)
     time.sleep(seconds)
-    motor_stop(pwm)
+    motor_stop(pwm, pins)
 
 
-def motor_retract(pwm, seconds):
+def motor_retract(pwm, seconds, pins=DEFAULT_PINS):
     """
     讓馬達縮回指定時間。
     
     參數:
     - pwm: PWM 實例。
     - seconds: 縮回持續時間（秒）。
+    - pins: (in1, in2, en)。
     
     行為:
     - 印出縮回訊息。
-    - 設置 IN1_PIN 低、IN2_PIN 高，啟動縮回。
+    - 設置 in1 低、in2 高，啟動縮回。
     - 設置 PWM 占空比為 TEST_SPEED。
     - 等待指定時間。
     - 調用 motor_stop 停止。
     """
     print("[SELF-CHECK] Motor: Retracting...")
-    GPIO.output(IN1_PIN, GPIO.LOW)
-    GPIO.output(IN2_PIN, GPIO.HIGH)
+    GPIO.output(pins[0], GPIO.LOW)
+    GPIO.output(pins[1], GPIO.HIGH)
     pwm.ChangeDutyCycle(TEST_SPEED)
     time.sleep(seconds)
-    motor_stop(pwm)
+    motor_stop(pwm, pins)
 
 
-def self_check_actuator():
+def self_check_actuator(pins=DEFAULT_PINS):
     """
     檢查線性致動器（馬達）是否正常工作。
     
+    參數:
+    - pins: (in1, in2, en)。
+
     返回: 如果檢查通過，返回 True；否則 False。
     
     行為:
@@ -144,21 +171,21 @@ def self_check_actuator():
     - 等待 0.5 秒。
     - 印出成功訊息並返回 True。
     - 如果異常，印出錯誤並返回 False。
-    - 最終停止 PWM 並清理 GPIO。
+    - 最終停止 PWM 並只清理這組腳位（其他 rig 可能正在執行）。
     """
-    print("[SELF-CHECK] Check L298N Actuator...")
+    print(f"[SELF-CHECK] Check L298N Actuator (GPIO {pins})...")
 
     pwm = None
     try:
-        pwm = setup_motor_gpio()
+        pwm = setup_motor_gpio(pins)
 
-        motor_stop(pwm)
+        motor_stop(pwm, pins)
         time.sleep(0.5)
 
-        motor_extend(pwm, EXTEND_TIME)
+        motor_extend(pwm, EXTEND_TIME, pins)
         time.sleep(0.5)
 
-        motor_retract(pwm, RETRACT_TIME)
+        motor_retract(pwm, RETRACT_TIME, pins)
         time.sleep(0.5)
 
         print("[SELF-CHECK] Linear actuator operates successfully.")
@@ -171,7 +198,110 @@ def self_check_actuator():
     finally:
         if pwm is not None:
             pwm.stop()
-        GPIO.cleanup()
+        GPIO.cleanup(list(pins))
+
+
+def quick_check_bmp280(i2c_bus=I2C_BUS_ID, i2c_addr=BMP280_I2C_ADDR):
+    """
+    只讀 BMP280 的晶片 ID 暫存器（一次 I2C 讀取，不設定感測器）。
+
+    返回: (ok, detail)
+    """
+    bus = None
+    try:
+        bus = SMBus(i2c_bus)
+        chip = bus.read_byte_data(i2c_addr, REG_CHIP_ID)
+        if chip != CHIP_ID:
+            return False, f"unexpected chip id 0x{chip:02X} at 0x{i2c_addr:02X}"
+        return True, f"chip id 0x{chip:02X} at 0x{i2c_addr:02X}"
+    except Exception as e:
+        return False, f"no response at 0x{i2c_addr:02X}: {e}"
+    finally:
+        if bus is not None:
+            bus.close()
+
+
+def quick_check_gpio(pins=DEFAULT_PINS):
+    """
+    設定腳位並短暫切換 en，確認 GPIO 可以寫入與讀回。
+
+    返回: (ok, detail)
+
+    行為:
+    - in1、in2 一直保持 LOW（L298N 停止），en 切換時馬達不會動。
+    - 最後只清理這組腳位。
+    """
+    in1, in2, en = pins
+    try:
+        GPIO.setmode(GPIO.BCM)
+        for pin in pins:
+            GPIO.setup(pin, GPIO.OUT)
+        GPIO.output(in1, GPIO.LOW)
+        GPIO.output(in2, GPIO.LOW)
+        for _ in range(QUICK_TOGGLES):
+            for level in (GPIO.HIGH, GPIO.LOW):
+                GPIO.output(en, level)
+                if GPIO.input(en) != level:
+                    return False, f"GPIO {en} did not read back {level}"
+        return True, f"GPIO {pins} toggled"
+    except Exception as e:
+        return False, f"GPIO {pins}: {e}"
+    finally:
+        try:
+            GPIO.cleanup(list(pins))
+        except Exception:
+            pass
+
+
+def _check_result(level, checks, start):
+    return {
+        "level": level,
+        "ok": all(ok for ok, _ in checks.values()),
+        "checked_at": time.time(),
+        "duration_ms": (time.perf_counter() - start) * 1000,
+        "checks": checks,
+    }
+
+
+def quick_self_check(pins=DEFAULT_PINS, i2c_bus=I2C_BUS_ID, i2c_addr=BMP280_I2C_ADDR):
+    """
+    啟動用的快速自檢（晶片 ID + GPIO 切換，幾毫秒）。
+
+    參數:
+    - pins: 致動器腳位 (in1, in2, en)。
+    - i2c_bus / i2c_addr: BMP280 所在的 bus 與位址。
+
+    返回: dict，level / ok / checked_at（time.time()）/ duration_ms / checks（名稱 -> (ok, detail)）。
+    """
+    start = time.perf_counter()
+    checks = {"bmp280": quick_check_bmp280(i2c_bus, i2c_addr), "gpio": quick_check_gpio(pins)}
+    result = _check_result("quick", checks, start)
+    print(f"[SELF-CHECK] {format_self_check(result)}")
+    return result
+
+
+def full_self_check(pins=DEFAULT_PINS, i2c_bus=I2C_BUS_ID, i2c_addr=BMP280_I2C_ADDR):
+    """
+    完整自檢：讀取壓力並讓致動器實際伸出、縮回（約 7 秒，會阻塞呼叫的執行緒）。
+
+    參數與返回值同 quick_self_check()。
+    """
+    start = time.perf_counter()
+    bmp_ok = self_check_bmp280(i2c_bus, i2c_addr)
+    motor_ok = self_check_actuator(pins)
+    checks = {"bmp280": (bmp_ok, "pressure read" if bmp_ok else "pressure read failed"),
+              "actuator": (motor_ok, "extend/retract" if motor_ok else "extend/retract failed")}
+    result = _check_result("full", checks, start)
+    print(f"[SELF-CHECK] {format_self_check(result)}")
+    return result
+
+
+def format_self_check(result):
+    """一行文字：等級、結果、時間、耗時與各項細節。"""
+    when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(result["checked_at"]))
+    details = ", ".join(f"{name} {'ok' if ok else 'FAIL'} ({detail})" for name, (ok, detail) in result["checks"].items())
+    return (f"{result['level']} {'PASS' if result['ok'] else 'FAIL'} at {when} "
+            f"({result['duration_ms']:.0f} ms): {details}")
 
 
 def run_self_check():
@@ -215,6 +345,9 @@ def run_self_check():
 
 
 if __name__ == "__main__":
-    ok = run_self_check()
+    if "--quick" in sys.argv[1:]:
+        ok = quick_self_check()["ok"]
+    else:
+        ok = run_self_check()
     if not ok:
         sys.exit(1)
\ No newline at end of file
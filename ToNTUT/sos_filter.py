@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+串流二階節 (SOS, biquad) 濾波引擎。
+
+每個 60 Hz tick 只處理一個樣本時，scipy.signal.lfilter 的成本幾乎都花在
+呼叫與陣列配置上，而不是乘加運算本身。這裡把係數與狀態預先展開成
+Python float，單樣本路徑只做純量運算，輸出與原本的 lfilter 實作一致。
+"""
+
+import numpy as np
+
+from filter_design import get_filter
+
+_sosfilt = None
+
+
+def _get_sosfilt():
+    """延遲載入 scipy.signal.sosfilt，單樣本路徑完全不需要 scipy。"""
+    global _sosfilt
+    if _sosfilt is None:
+        try:
+            from scipy.signal import sosfilt
+        except ImportError:
+            sosfilt = False
+        _sosfilt = sosfilt
+    return _sosfilt
+
+
+class SosFilter:
+    """
+    串流 SOS 濾波器（Direct Form II transposed，與 scipy.signal.sosfilt 相同結構）。
+
+    屬性:
+    - sos: (n_sections, 6) 係數陣列，每列為 [b0, b1, b2, a0, a1, a2]，a0 已正規化為 1。
+    - zi: (n_sections, 2) 目前的濾波器狀態（唯讀副本）。
+    """
+    def __init__(self, sos, zi=None, initial_value=0.0):
+        """
+        初始化濾波器。
+
+        參數:
+        - sos: 二階節係數，形狀 (n_sections, 6)。
+        - zi: 單位階躍的穩態狀態模板，形狀 (n_sections, 2)；None 表示從零開始。
+        - initial_value: 初始輸入值，狀態會設成 zi * initial_value。
+
+        行為:
+        - 把係數展開成 (b0, b1, b2, a1, a2) 的 Python float tuple。
+        - 預先配置一個平坦的狀態 list，之後只做原地更新。
+        """
+        sos = np.atleast_2d(np.asarray(sos, dtype=float))
+        if sos.shape[1] != 6:
+            raise ValueError("sos must have shape (n_sections, 6)")
+        sos = sos / sos[:, 3:4]
+        self.sos = sos
+        self._sections = [
+            (float(s[0]), float(s[1]), float(s[2]), float(s[4]), float(s[5]))
+            for s in sos
+        ]
+        if zi is None:
+            self._zi_template = np.zeros((len(sos), 2))
+        else:
+            self._zi_template = np.array(zi, dtype=float).reshape(len(sos), 2)
+        self._z = [0.0] * (2 * len(sos))
+        self.reset(initial_value)
+
+    @property
+    def zi(self):
+        return np.array(self._z).reshape(-1, 2)
+
+    def reset(self, initial_value=0.0):
+        """
+        重置濾波器狀態為輸入 initial_value 的穩態。
+
+        參數:
+        - initial_value: 穩態輸入值（浮點數）。
+        """
+        self._z[:] = [float(v) for v in (self._zi_template * initial_value).ravel()]
+
+    def process(self, value):
+        """
+        處理單個輸入值，返回濾波後的值（純量快速路徑）。
+
+        參數:
+        - value: 輸入的原始值（浮點數）。
+
+        返回: 濾波後的值（浮點數）。
+        """
+        z = self._z
+        y = float(value)
+        k = 0
+        for b0, b1, b2, a1, a2 in self._sections:
+            x = y
+            y = b0 * x + z[k]
+            z[k] = b1 * x - a1 * y + z[k + 1]
+            z[k + 1] = b2 * x - a2 * y
+            k += 2
+        return y
+
+    def process_block(self, samples):
+        """
+        一次濾波一整段樣本（例如 GC 停頓或 I2C 變慢後累積的一批讀值）。
+
+        參數:
+        - samples: 原始值的序列或 1-D 陣列。
+
+        返回: 濾波後的 numpy 陣列，長度與輸入相同。
+
+        行為:
+        - 以目前狀態作為 zi 呼叫 sosfilt，並把結束狀態寫回，
+          因此與逐一呼叫 process 的結果與狀態完全銜接。
+        - 沒有 scipy 時退回逐樣本的純量路徑。
+        """
+        x = np.asarray(samples, dtype=float).ravel()
+        if x.size == 0:
+            return np.empty(0)
+
+        sosfilt = _get_sosfilt()
+        if not sosfilt:
+            return np.array([self.process(v) for v in x])
+
+        y, zf = sosfilt(self.sos, x, zi=self.zi)
+        self._z[:] = zf.ravel().tolist()
+        return y
+
+
+class RealTimeFilter(SosFilter):
+    """
+    實時低通濾波器類別，用於平滑壓力感測器數據，減少噪聲。
+
+    與各控制迴圈原本的 RealTimeFilter 介面相同（process 一次一個樣本），
+    但內部改用 SOS 串流引擎，不再每個 tick 呼叫 lfilter。
+    """
+    def __init__(self, order, cutoff, fs, initial_value=0.0):
+        """
+        初始化濾波器。
+
+        參數:
+        - order: 濾波器階數（整數）。
+        - cutoff: 截止頻率（Hz）。
+        - fs: 採樣頻率（Hz）。
+        - initial_value: 初始值，用於設置 zi。
+
+        行為:
+        - 係數與 zi 模板從 filter_design 登錄表取得，同樣的參數只設計一次。
+        """
+        design = get_filter(order, cutoff, fs, "low")
+        super().__init__(design.sos, zi=design.sos_zi, initial_value=initial_value)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步資料的發佈/訂閱中心。
+
+rpi_server 原本只把同步資料送給唯一的 active client。研究人員的筆電
+儀表板、記錄程式也想同時看即時資料，但它們不能拖慢 Quest：
+每個訂閱者有自己的有界佇列與送出 task，佇列滿時丟掉最舊的資料，
+發佈端（讀取引擎輸出的 monitor）永遠不會等待任何訂閱者。
+
+控制端（Quest）也使用同樣的 Subscriber 送出：monitor 只把訊框放進佇列，
+對方 TCP window 滿了也不會停止讀取引擎的 pipe。逐樣本的進度只需要
+最新值，還沒送出的舊進度會直接被新的取代（coalesce）。
+"""
+
+import asyncio
+from collections import deque
+
+from sync_protocol import TYPE_PROGRESS, frame_type
+
+SEND_TIMEOUT = 2.0  # 寫入的 buffer 排不出去超過這個時間（秒），就視為斷線（rpi_server 共用）
+
+
+class Subscriber:
+    """
+    一個接收同步資料的連線（控制端或唯讀觀察者），有自己的有界佇列與送出 task。
+
+    屬性:
+    - queued / sent: 放進佇列、實際送出的數量。
+    - coalesced: 還沒送出就被較新的進度取代的數量。
+    - dropped: 因佇列滿而丟棄（最舊的）的數量。
+    - closed: 送出失敗或取消訂閱後為 True。
+    """
+    def __init__(self, writer, addr, encode, capacity=32, send_datagram=None, on_error=None, role="Observer"):
+        """
+        參數:
+        - writer: asyncio.StreamWriter。
+        - addr: 對方位址（只用於 log）。
+        - encode: encode(frame) -> bytes 或 None（這個訂閱者不需要這種訊框）。
+        - capacity: 佇列長度上限。
+        - send_datagram: send_datagram(data) -> bool；返回 True 表示已經以 UDP 送出，不經過佇列。
+        - on_error: on_error(subscriber)，送出失敗（逾時或斷線）時呼叫一次。
+        - role: log 用的名稱。
+        """
+        self.writer = writer
+        self.addr = addr
+        self.encode = encode
+        self.send_datagram = send_datagram
+        self.on_error = on_error
+        self.role = role
+        self.queue = deque(maxlen=capacity)
+        self._pending = {}      # coalesce key -> 佇列中尚未送出的項目 [key, data]
+        self.queued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def offer(self, frame):
+        """放入一個訊框（不等待）。逐樣本的進度訊框只保留最新一筆。"""
+        if self.closed:
+            return
+        data = self.encode(frame)
+        if data is None:
+            return
+        self.offer_data(data, TYPE_PROGRESS if frame_type(frame) == TYPE_PROGRESS else None)
+
+    def offer_data(self, data, key=None):
+        """
+        放入已編碼的資料（不等待）。
+
+        參數:
+        - key: 相同 key 的資料只保留最新一筆（None = 不合併）。
+
+        行為:
+        - 有 UDP 路徑時直接送出。
+        - 佇列中已有同 key、尚未送出的項目時，直接換成新的資料。
+        - 佇列滿時 deque 會丟掉最舊的一筆。
+        """
+        if self.closed:
+            return
+        if self.send_datagram is not None and self.send_datagram(data):
+            self.sent += 1
+            return
+        if key is not None:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry[1] = data
+                self.coalesced += 1
+                return
+        if len(self.queue) == self.queue.maxlen:
+            old_key, _ = self.queue[0]
+            if old_key is not None and self._pending.get(old_key) is self.queue[0]:
+                del self._pending[old_key]
+            self.dropped += 1
+        entry = [key, data]
+        self.queue.append(entry)
+        if key is not None:
+            self._pending[key] = entry
+        self.queued += 1
+        self._ready.set()
+
+    async def _run(self):
+        # 除了 cancel 也檢查 closed：3.11 的 wait_for 在 drain() 剛好完成時會吞掉取消，
+        # 只靠 CancelledError 的話 task 會回到 _ready.wait() 永遠等下去
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                self._ready.clear()
+                while self.queue and not self.closed:
+                    entry = self.queue.popleft()
+                    if entry[0] is not None and self._pending.get(entry[0]) is entry:
+                        del self._pending[entry[0]]
+                    self.writer.write(entry[1])
+                    self.sent += 1
+                    await asyncio.wait_for(self.writer.drain(), SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[HUB] {self.role} {self.addr} dropped: {e!r}")
+            self.closed = True
+            self.writer.close()
+            if self.on_error is not None:
+                self.on_error(self)
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+        self._task.cancel()
+
+    def stats(self):
+        return {"depth": len(self.queue), "queued": self.queued, "sent": self.sent,
+                "coalesced": self.coalesced, "dropped": self.dropped}
+
+    def report(self):
+        s = self.stats()
+        return (f"{self.role} {self.addr}: depth {s['depth']}/{self.queue.maxlen}, sent {s['sent']}, "
+                f"coalesced {s['coalesced']}, dropped {s['dropped']}")
+
+
+class SyncHub:
+    """
+    把每個同步訊框分送給所有訂閱者。
+
+    行為:
+    - publish() 只把訊框放進各訂閱者的佇列，不做任何 I/O 等待。
+    - 送出失敗的訂閱者會被移除。
+    """
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.subscribers = {}
+        self.published = 0
+
+    def subscribe(self, writer, addr, encode, send_datagram=None):
+        self.unsubscribe(writer)
+        sub = Subscriber(writer, addr, encode, self.capacity, send_datagram)
+        self.subscribers[writer] = sub
+        return sub
+
+    def unsubscribe(self, writer):
+        sub = self.subscribers.pop(writer, None)
+        if sub is not None:
+            sub.close()
+        return sub is not None
+
+    def publish(self, frame):
+        self.published += 1
+        for writer, sub in list(self.subscribers.items()):
+            if sub.closed:
+                del self.subscribers[writer]
+                continue
+            sub.offer(frame)
+
+    def close(self):
+        for writer in list(self.subscribers):
+            self.unsubscribe(writer)
+
+    def report(self):
+        subs = "; ".join(sub.report() for sub in self.subscribers.values())
+        return f"[Hub] published {self.published}, observers {len(self.subscribers)}" + (f" | {subs}" if subs else "")
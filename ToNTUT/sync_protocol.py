@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+呼吸引擎 → 伺服器 → Unity 的二進位同步訊框（版本 1）。
+
+原本每個樣本批次印出 "SYNC_PROGRESS:0.523\\n"：引擎要格式化字串、伺服器要
+strip、搜尋 "SYNC_"、再編碼一次，Unity 再逐字元 float.TryParse，而且看不出
+掉了幾筆、延遲多少。
+
+訊框格式（little-endian）:
+    magic   u8   0xBF（不可能是 UTF-8 文字行的第一個 byte，可與文字回覆混在同一條 TCP 流）
+    version u8   1
+    type    u8   TYPE_PROGRESS = 1
+    length  u8   之後 body 的長度
+    body    PROGRESS:
+            seq            u32  每條連線、每種 type 各自加一（可偵測掉包；見 FrameSequencer）
+            t_ns           i64  該批最後一個樣本的 monotonic 時間（奈秒，Pi 的時鐘）
+            progress       f32  0.3（全縮）~ 0.7（全伸）
+            target_period  f32  目前目標呼吸週期（秒）
+            machine_state  i8   MachineState 值（-1 WARMUP、0 MIRROR、1 GUIDE）
+            user_state     u8   UserState 值（0 INHALE、1 EXHALE）
+
+    type    TYPE_CYCLE = 2（週期參數模式，客戶端自行外插進度）
+    body    CYCLE:
+            seq            u32
+            sent_ns        i64  送出時的樣本時間（Pi 的 monotonic 奈秒），用來估計兩端時鐘差
+            cycle_start_ns i64  目前引導週期的起點（計時器為 0 的時間）
+            period         f32  目標呼吸週期（秒）
+            progress       f32  sent_ns 時實際的進度（校正用）
+            progress_min   f32  全縮時的進度（0.3）
+            progress_range f32  全伸 - 全縮（0.4）
+            machine_state  i8
+            user_state     u8
+            direction      i8   致動器目前方向（1 伸出、-1 縮回、0 停止）
+            reason         u8   CYCLE_START / CYCLE_WRAP / CYCLE_PERIOD / CYCLE_CORRECTION / CYCLE_STOP
+            period 為 0、reason 為 CYCLE_STOP 時表示引擎已停止（馬達停下），客戶端要停止外插
+
+    type    TYPE_STOP = 3（只在引擎 → 伺服器之間，不轉送給客戶端）
+    body    STOP:
+            seq            u32
+            t_ns           i64  這個階段完成的 monotonic 時間
+            requested_ns   i64  引擎收到停止要求的時間（引擎自行結束時為 0）
+            stage          u8   STOP_ACK（看到停止要求）/ STOP_PARKED（馬達已停）/ STOP_RELEASED（GPIO 已釋放）
+
+兩段傳輸使用相同格式，伺服器不需要重新編碼，只有舊的文字客戶端才轉成
+SYNC_PROGRESS 文字行。週期模式下伺服器只轉送 CYCLE 訊框：每個週期開始、
+目標週期改變時各一個，另外每隔幾秒一個校正；引擎停止時伺服器再送一個 CYCLE_STOP。
+
+引擎每次啟動 seq 都從 1 開始，但同一條連線可能經歷多次 DEACTIVATE→ACTIVATE
+或換 rig；伺服器送出前以 FrameSequencer 依連線重新編號，接收端看到的 seq
+才會一直遞增。PROGRESS 與 CYCLE 各有自己的 seq，接收端也分開追蹤。伺服器停止引擎時等待 STOP_RELEASED，
+不必等整個程序結束，也能量測每個停止階段的延遲。
+
+用法（比較文字與二進位的編碼/轉送成本，以及週期模式的流量與外插誤差）:
+    python3 sync_protocol.py [訊框數]
+"""
+
+import asyncio
+import struct
+import sys
+import time
+from collections import namedtuple
+
+MAGIC = 0xBF
+VERSION = 1
+TYPE_PROGRESS = 1
+TYPE_CYCLE = 2
+TYPE_STOP = 3
+
+CYCLE_START = 1         # 進入 GUIDE
+CYCLE_WRAP = 2          # 新的引導週期開始
+CYCLE_PERIOD = 3        # 目標週期改變
+CYCLE_CORRECTION = 4    # 定期校正
+CYCLE_STOP = 5          # 引擎已停止（伺服器送出，period 為 0）
+
+STOP_ACK = 1            # 引擎看到停止要求，離開主循環
+STOP_PARKED = 2         # 馬達已停止
+STOP_RELEASED = 3       # PWM 已停止、GPIO 腳位已釋放
+
+HEADER = struct.Struct("<BBBB")
+PROGRESS_BODY = struct.Struct("<IqffbB")
+PROGRESS_FRAME = struct.Struct("<BBBBIqffbB")
+PROGRESS_FRAME_SIZE = PROGRESS_FRAME.size
+CYCLE_BODY = struct.Struct("<IqqffffbBbB")
+CYCLE_FRAME = struct.Struct("<BBBBIqqffffbBbB")
+CYCLE_FRAME_SIZE = CYCLE_FRAME.size
+STOP_BODY = struct.Struct("<IqqB")
+STOP_FRAME = struct.Struct("<BBBBIqqB")
+STOP_FRAME_SIZE = STOP_FRAME.size
+SEQ = struct.Struct("<I")   # 每種 body 的第一個欄位
+
+ProgressFrame = namedtuple("ProgressFrame", ["seq", "t_ns", "progress", "target_period",
+                                             "machine_state", "user_state"])
+CycleFrame = namedtuple("CycleFrame", ["seq", "sent_ns", "cycle_start_ns", "period", "progress",
+                                       "progress_min", "progress_range", "machine_state", "user_state",
+                                       "direction", "reason"])
+StopFrame = namedtuple("StopFrame", ["seq", "t_ns", "requested_ns", "stage"])
+
+
+class FrameError(ValueError):
+    """訊框 magic、版本或長度不符。"""
+
+
+class ProgressFrameWriter:
+    """
+    以預先配置的 buffer 產生 PROGRESS 訊框。
+
+    行為:
+    - pack() 用 struct.pack_into 寫入同一塊 bytearray，返回指向它的 memoryview；
+      熱路徑不做字串格式化。下一次 pack() 會覆寫內容，需要保留時呼叫端自行 bytes()。
+    """
+    def __init__(self):
+        self.buffer = bytearray(PROGRESS_FRAME_SIZE)
+        self.view = memoryview(self.buffer)
+        self.seq = 0
+
+    def pack(self, t_ns, progress, target_period, machine_state, user_state):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        PROGRESS_FRAME.pack_into(self.buffer, 0, MAGIC, VERSION, TYPE_PROGRESS, PROGRESS_BODY.size,
+                                 self.seq, t_ns, progress, target_period, machine_state, user_state)
+        return self.view
+
+
+class CycleFrameWriter:
+    """以預先配置的 buffer 產生 CYCLE 訊框（同 ProgressFrameWriter）。"""
+    def __init__(self):
+        self.buffer = bytearray(CYCLE_FRAME_SIZE)
+        self.view = memoryview(self.buffer)
+        self.seq = 0
+
+    def pack(self, sent_ns, cycle_start_ns, period, progress, progress_min, progress_range,
+             machine_state, user_state, direction, reason):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        CYCLE_FRAME.pack_into(self.buffer, 0, MAGIC, VERSION, TYPE_CYCLE, CYCLE_BODY.size,
+                              self.seq, sent_ns, cycle_start_ns, period, progress, progress_min,
+                              progress_range, machine_state, user_state, direction, reason)
+        return self.view
+
+
+class StopFrameWriter:
+    """以預先配置的 buffer 產生 STOP 訊框（同 ProgressFrameWriter）。"""
+    def __init__(self):
+        self.buffer = bytearray(STOP_FRAME_SIZE)
+        self.view = memoryview(self.buffer)
+        self.seq = 0
+
+    def pack(self, t_ns, requested_ns, stage):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        STOP_FRAME.pack_into(self.buffer, 0, MAGIC, VERSION, TYPE_STOP, STOP_BODY.size,
+                             self.seq, t_ns, requested_ns, stage)
+        return self.view
+
+
+class FrameSequencer:
+    """
+    替一條連線送出的訊框重新編 seq（每種 type 各自遞增）。
+
+    行為:
+    - stamp() 返回 seq 換成這條連線下一個編號的複本（bytes），原訊框不變。
+    - 引擎重啟、換 rig 都不影響編號。編號在放進送出佇列前完成，之後被合併或丟棄的
+      訊框在接收端顯示為跳號，就是實際沒送到的數量。
+    """
+    def __init__(self):
+        self.seqs = {}
+
+    def stamp(self, frame):
+        kind = frame[2]
+        seq = (self.seqs.get(kind, 0) + 1) & 0xFFFFFFFF
+        self.seqs[kind] = seq
+        out = bytearray(frame)
+        SEQ.pack_into(out, HEADER.size, seq)
+        return bytes(out)
+
+
+def frame_type(frame):
+    """訊框的 type（TYPE_PROGRESS / TYPE_CYCLE / TYPE_STOP）。"""
+    return frame[2]
+
+
+def decode_progress(frame):
+    """把完整的 PROGRESS 訊框（含 header）解成 ProgressFrame。"""
+    magic, version, frame_type, length = HEADER.unpack_from(frame, 0)
+    if magic != MAGIC or version != VERSION or frame_type != TYPE_PROGRESS or length != PROGRESS_BODY.size:
+        raise FrameError(f"Not a v{VERSION} progress frame: {bytes(frame[:HEADER.size]).hex()}")
+    return ProgressFrame._make(PROGRESS_BODY.unpack_from(frame, HEADER.size))
+
+
+def decode_cycle(frame):
+    """把完整的 CYCLE 訊框（含 header）解成 CycleFrame。"""
+    magic, version, frame_type, length = HEADER.unpack_from(frame, 0)
+    if magic != MAGIC or version != VERSION or frame_type != TYPE_CYCLE or length != CYCLE_BODY.size:
+        raise FrameError(f"Not a v{VERSION} cycle frame: {bytes(frame[:HEADER.size]).hex()}")
+    return CycleFrame._make(CYCLE_BODY.unpack_from(frame, HEADER.size))
+
+
+def decode_stop(frame):
+    """把完整的 STOP 訊框（含 header）解成 StopFrame。"""
+    magic, version, frame_type, length = HEADER.unpack_from(frame, 0)
+    if magic != MAGIC or version != VERSION or frame_type != TYPE_STOP or length != STOP_BODY.size:
+        raise FrameError(f"Not a v{VERSION} stop frame: {bytes(frame[:HEADER.size]).hex()}")
+    return StopFrame._make(STOP_BODY.unpack_from(frame, HEADER.size))
+
+
+def cycle_progress(cycle, now_ns):
+    """
+    由 CYCLE 參數外插 now_ns（Pi 的時鐘）時的進度：前半週期線性伸出、後半週期線性縮回。
+
+    與 Rpi_Client.cs 使用同一個模型，放在這裡方便量測誤差。
+    """
+    phase = ((now_ns - cycle.cycle_start_ns) / 1e9 % cycle.period) / cycle.period
+    ratio = 2.0 * phase if phase < 0.5 else 2.0 * (1.0 - phase)
+    return cycle.progress_min + cycle.progress_range * ratio
+
+
+def progress_text(frame):
+    """給舊文字客戶端的 SYNC_PROGRESS 行（bytes）。"""
+    _, _, progress, _, _, _ = PROGRESS_BODY.unpack_from(frame, HEADER.size)
+    return b"SYNC_PROGRESS:%.3f\n" % progress
+
+
+class FrameStream:
+    """
+    從 asyncio.StreamReader 逐一讀出完整訊框。
+
+    行為:
+    - read_frame() 返回含 header 的 bytes；對方關閉時返回 b""。
+    - magic 或版本不符時拋出 FrameError（資料流已無法對齊）。
+    """
+    def __init__(self, reader):
+        self.reader = reader
+
+    async def read_frame(self):
+        try:
+            header = await self.reader.readexactly(HEADER.size)
+            magic, version, _, length = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise FrameError(f"Bad frame header {header.hex()}")
+            return header + await self.reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return b""
+
+
+class SequenceTracker:
+    """
+    接收端的掉包與延遲統計。
+
+    屬性:
+    - last_seq: 訊框種類（ProgressFrame / CycleFrame）-> 最後收到的 seq；各種類的 seq 分開追蹤。
+    - received / dropped: 收到的訊框數與由 seq 跳號推算的遺失數。
+    - stale: 比已收到的訊框還舊或重複（UDP 亂序）而丟棄的數量。
+    - latency_ms: 相對延遲（目前的 接收時間 - t_ns 減去觀察到的最小值）；
+      兩端時鐘不同，最小值包含了時鐘差與最小傳輸延遲。
+    """
+    def __init__(self):
+        self.last_seq = {}
+        self.received = 0
+        self.dropped = 0
+        self.stale = 0
+        self._min_offset_ns = None
+        self.latency_ms = 0.0
+        self.latency_ms_max = 0.0
+
+    def update(self, frame, recv_ns=None):
+        """
+        記錄一個訊框。
+
+        返回: 是否為最新的訊框；False 表示比已收到的舊（應丟棄，只保留最新值）。
+        """
+        if recv_ns is None:
+            recv_ns = time.monotonic_ns()
+        last_seq = self.last_seq.get(type(frame))
+        if last_seq is not None:
+            gap = (frame.seq - last_seq) & 0xFFFFFFFF
+            if gap == 0 or gap >= 0x80000000:
+                self.stale += 1
+                return False
+            if gap > 1:
+                self.dropped += gap - 1
+        self.last_seq[type(frame)] = frame.seq
+        self.received += 1
+        offset = recv_ns - (frame.sent_ns if isinstance(frame, CycleFrame) else frame.t_ns)
+        if self._min_offset_ns is None or offset < self._min_offset_ns:
+            self._min_offset_ns = offset
+        self.latency_ms = (offset - self._min_offset_ns) / 1e6
+        if self.latency_ms > self.latency_ms_max:
+            self.latency_ms_max = self.latency_ms
+        return True
+
+    def report(self):
+        return (f"[Sync] frames {self.received}, dropped {self.dropped}, stale {self.stale}, "
+                f"relative latency {self.latency_ms:.1f} ms (max {self.latency_ms_max:.1f} ms)")
+
+
+def main(argv):
+    n = int(argv[1]) if len(argv) > 1 else 100000
+    values = [0.3 + 0.4 * (i % 240) / 240.0 for i in range(n)]
+
+    # 引擎端：格式化
+    start = time.perf_counter_ns()
+    for p in values:
+        line = f"SYNC_PROGRESS:{p:.3f}"
+    text_pack_ns = (time.perf_counter_ns() - start) / n
+
+    writer = ProgressFrameWriter()
+    start = time.perf_counter_ns()
+    t_ns = time.monotonic_ns()
+    for p in values:
+        frame = writer.pack(t_ns, p, 4.0, 1, 0)
+    frame_pack_ns = (time.perf_counter_ns() - start) / n
+
+    # 伺服器端：原本 decode/strip/搜尋/再編碼，改為原封不動轉送
+    raws = [(f"SYNC_PROGRESS:{p:.3f}\n").encode("utf-8") for p in values]
+    start = time.perf_counter_ns()
+    for raw in raws:
+        line = raw.decode("utf-8", errors="replace").strip()
+        if "SYNC_" in line:
+            msg = (line + "\n").encode("utf-8")
+    text_forward_ns = (time.perf_counter_ns() - start) / n
+
+    frames = [bytes(writer.pack(t_ns, p, 4.0, 1, 0)) for p in values]
+    tracker = SequenceTracker()
+    start = time.perf_counter_ns()
+    for frame in frames:
+        tracker.update(decode_progress(frame), t_ns)
+    frame_decode_ns = (time.perf_counter_ns() - start) / n
+
+    print(f"engine  : text format {text_pack_ns:.0f} ns, frame pack {frame_pack_ns:.0f} ns")
+    print(f"server  : text decode/strip/encode {text_forward_ns:.0f} ns, frame forward 0 ns "
+          f"(client-side decode + seq tracking {frame_decode_ns:.0f} ns)")
+    print(f"wire    : text {len(raws[-1])} bytes, frame {len(frames[-1])} bytes (with seq, timestamp, state)")
+    print("  " + tracker.report())
+
+    # 同一條連線經歷 DEACTIVATE→ACTIVATE：第二次啟動的引擎 seq 從 1 重新開始，
+    # PROGRESS 與 CYCLE 混在同一條流上；伺服器重新編號後不應有 stale 或假的掉包
+    sequencer = FrameSequencer()
+    tracker = SequenceTracker()
+    for run in range(2):
+        progress_writer, cycle_writer = ProgressFrameWriter(), CycleFrameWriter()
+        for i in range(300):
+            t_ns += 1
+            tracker.update(decode_progress(sequencer.stamp(progress_writer.pack(t_ns, 0.5, 4.0, 1, 0))), t_ns)
+            if i % 60 == 0:
+                frame = cycle_writer.pack(t_ns, t_ns, 4.0, 0.5, 0.3, 0.4, 1, 0, 1, CYCLE_CORRECTION)
+                tracker.update(decode_cycle(sequencer.stamp(frame)), t_ns)
+    assert (tracker.received, tracker.stale, tracker.dropped) == (610, 0, 0), tracker.report()
+    print(f"restart : 2 engine runs on one connection, mixed PROGRESS/CYCLE -> {tracker.report()}")
+
+    # 週期模式：60 秒、60 Hz 的引導，比較流量與外插誤差
+    from guide_table import GuidePlayer, PROGRESS_MIN, PROGRESS_RANGE
+    fs = 60.0
+    correction_s = 2.0
+    for period in (3.0, 4.0, 6.0):
+        guide = GuidePlayer(period, 1.0 / fs, 10.0, 12.0)
+        cycles = CycleFrameWriter()
+        cycle = None
+        cycle_bytes = 0
+        cycle_count = 0
+        last_sent = None
+        errors = []
+        for i in range(int(60 * fs)):
+            t_ns = int(i * 1e9 / fs)
+            before = guide.timer
+            _, _, progress = guide.step(1.0 / fs)
+            reason = CYCLE_START if cycle is None else CYCLE_WRAP if guide.timer < before else 0
+            if not reason and t_ns - last_sent >= correction_s * 1e9:
+                reason = CYCLE_CORRECTION
+            if reason:
+                frame = cycles.pack(t_ns, t_ns - int(guide.timer * 1e9), period, progress,
+                                    PROGRESS_MIN, PROGRESS_RANGE, 1, 0, 0, reason)
+                cycle = decode_cycle(frame)
+                cycle_bytes += len(frame)
+                cycle_count += 1
+                last_sent = t_ns
+            errors.append(abs(cycle_progress(cycle, t_ns) - progress))
+        stream_bytes = int(60 * fs) * PROGRESS_FRAME_SIZE
+        errors.sort()
+        print(f"cycle {period:.0f} s: {cycle_count} frames / {cycle_bytes} bytes vs stream {int(60 * fs)} frames / "
+              f"{stream_bytes} bytes ({stream_bytes / cycle_bytes:.0f}x less); extrapolation error "
+              f"p50 {errors[len(errors) // 2]:.3f}, max {errors[-1]:.3f} (progress 0.3-0.7)")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
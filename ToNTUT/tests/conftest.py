@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""讓測試可以直接 import ToNTUT 底下的模組（程式都是扁平的單檔模組，沒有套件）。"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""breath_cycles：向量化擷取要與 init_guide_phase / validate_stable 原本的逐樣本迴圈結果相同。"""
+
+import numpy as np
+import pytest
+
+from breath_cycles import EXHALE, INHALE, extract_breath_cycles, find_transitions
+
+SAMPLING_RATE = 1.0 / 60.0
+
+
+def loop_breath_cycles(filtered, sampling_rate, initial_state=INHALE):
+    """
+    原本 thesis_0625.validate_stable 的迴圈（加上吸氣 -> 吐氣 轉換的記錄），作為對照組。
+
+    返回: (onsets, exhale_starts, durations, inhale_durations, exhale_durations)
+    """
+    state = initial_state
+    count = 0
+    start = 1
+    last_exhale = None
+    onsets, exhale_starts, durations, inhale, exhale = [], [], [], [], []
+    for i in range(1, len(filtered)):
+        if filtered[i] < filtered[i - 1]:
+            if state == INHALE:
+                state = EXHALE
+                exhale_starts.append(i)
+                last_exhale = i
+        elif filtered[i] > filtered[i - 1]:
+            if state == EXHALE:
+                state = INHALE
+                onsets.append(i)
+                durations.append(float(count) * float(sampling_rate))
+                split = last_exhale if last_exhale is not None else start
+                inhale.append((split - start) * sampling_rate)
+                exhale.append((i - split) * sampling_rate)
+                start = i
+                count = 0
+        count += 1
+    return onsets, exhale_starts, durations, inhale, exhale
+
+
+def breathing(seconds, period, seed=None):
+    t = np.arange(int(seconds * 60)) / 60.0
+    x = 1006.5 + 0.3 * np.sin(2 * np.pi * t / period)
+    if seed is not None:
+        x = x + 0.01 * np.random.default_rng(seed).standard_normal(len(t))
+    return x
+
+
+def with_plateaus(x):
+    """在波峰、波谷與中段插入數值完全相同的平坦段（相鄰差為 0，不產生動作）。"""
+    x = np.round(x, 2)
+    return np.concatenate([x[:50], np.full(30, x[49]), x[50:200], np.full(45, x[199]), x[200:]])
+
+
+SIGNALS = {
+    "sine": breathing(30, 4.0),
+    "fast": breathing(20, 1.2),
+    "noisy": breathing(30, 3.5, seed=3),
+    "plateaus": with_plateaus(breathing(30, 4.0)),
+    "quantized": np.round(breathing(30, 5.0, seed=4), 2),
+    "constant": np.full(300, 1006.5),
+    "rising": np.linspace(1006.0, 1007.0, 300),
+    "falling": np.linspace(1007.0, 1006.0, 300),
+    "single_fall_then_rise": np.concatenate([np.linspace(1007, 1006, 100), np.linspace(1006, 1007, 100)]),
+    "empty": np.array([]),
+    "one_sample": np.array([1006.5]),
+}
+
+
+@pytest.mark.parametrize("initial_state", [INHALE, EXHALE])
+@pytest.mark.parametrize("name", sorted(SIGNALS))
+def test_matches_loop(name, initial_state):
+    filtered = SIGNALS[name]
+    onsets, exhale_starts, durations, inhale, exhale = loop_breath_cycles(filtered, SAMPLING_RATE, initial_state)
+
+    cycles = extract_breath_cycles(filtered, SAMPLING_RATE, initial_state=initial_state)
+
+    assert cycles.onsets.tolist() == onsets
+    assert cycles.exhale_starts.tolist() == exhale_starts
+    np.testing.assert_allclose(cycles.durations, durations, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(cycles.inhale_durations, inhale, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(cycles.exhale_durations, exhale, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("name", ["constant", "rising", "falling", "empty", "one_sample"])
+def test_no_transitions_gives_no_breaths(name):
+    cycles = extract_breath_cycles(SIGNALS[name], SAMPLING_RATE)
+    assert cycles.onsets.size == 0
+    assert cycles.durations.size == 0
+    assert cycles.inhale_durations.size == 0
+
+
+def test_timestamps_use_measured_time():
+    filtered = SIGNALS["sine"]
+    t = np.arange(len(filtered)) * 0.02
+    cycles = extract_breath_cycles(filtered, SAMPLING_RATE, timestamps=t)
+    by_count = extract_breath_cycles(filtered, 0.02)
+    np.testing.assert_allclose(cycles.durations, by_count.durations, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(cycles.inhale_durations + cycles.exhale_durations, cycles.durations,
+                               rtol=0, atol=1e-9)
+
+
+def test_find_transitions_skips_repeats_and_zeros():
+    actions = [0, 1, 1, 0, -1, -1, 0, 0, 1, -1, 0]
+    idx, states = find_transitions(actions, initial_state=INHALE)
+    assert idx.tolist() == [4, 8, 9]
+    assert states.tolist() == [EXHALE, INHALE, EXHALE]
+
+    idx, states = find_transitions([0, 0, 0], initial_state=EXHALE)
+    assert idx.size == 0 and states.size == 0
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""PressureWindow：容量滿了以後的自動丟棄要記在 evicted，discard() 與 smoothed() 都以目前視窗為準。"""
+
+import numpy as np
+from scipy.signal import butter, sosfiltfilt
+
+from pressure_window import PressureWindow
+
+CAPACITY = 100
+
+
+def make_window():
+    return PressureWindow(4, 2.0, 60.0, CAPACITY)
+
+
+def samples(n):
+    t = np.arange(n) / 60.0
+    return 1006.5 + 0.3 * np.sin(2 * np.pi * t / 4.0)
+
+
+def test_fill_past_capacity_counts_evicted():
+    window = make_window()
+    x = samples(3 * CAPACITY + 7)
+    for i, v in enumerate(x):
+        window.append(v)
+        assert window.evicted == max(0, i + 1 - CAPACITY)
+
+    assert len(window) == CAPACITY
+    np.testing.assert_array_equal(window.raw(), x[-CAPACITY:])
+    assert window[-1] == x[-1]
+    assert window[0] == x[-CAPACITY]
+
+
+def test_discard_resets_evicted_and_realigns():
+    window = make_window()
+    x = samples(CAPACITY + 30)
+    for v in x:
+        window.append(v)
+    assert window.evicted == 30
+
+    window.discard(40)
+    assert window.evicted == 0
+    assert len(window) == CAPACITY - 40
+    np.testing.assert_array_equal(window.raw(), x[-(CAPACITY - 40):])
+
+    # 再加樣本直到滿，evicted 從 0 重新計數
+    more = samples(50) + 1.0
+    for v in more:
+        window.append(v)
+    assert len(window) == CAPACITY
+    assert window.evicted == 10
+    np.testing.assert_array_equal(window.raw(), np.concatenate([x, more])[-CAPACITY:])
+
+
+def test_discard_clamps_count():
+    window = make_window()
+    for v in samples(20):
+        window.append(v)
+    window.discard(-5)
+    assert len(window) == 20
+    window.discard(500)
+    assert len(window) == 0
+
+
+def test_smoothed_uses_only_the_window():
+    window = make_window()
+    x = samples(2 * CAPACITY + 13)
+    for v in x:
+        window.append(v)
+
+    sos = butter(4, 2.0, btype="low", fs=60.0, output="sos")
+    smoothed = window.smoothed()
+    assert len(smoothed) == CAPACITY
+    np.testing.assert_allclose(smoothed, sosfiltfilt(sos, x[-CAPACITY:]), rtol=0, atol=1e-9)
+
+
+def test_smoothed_too_short_returns_raw_copy():
+    window = make_window()
+    for v in samples(5):
+        window.append(v)
+    smoothed = window.smoothed()
+    np.testing.assert_array_equal(smoothed, window.raw())
+    smoothed[0] = 0.0
+    assert window[0] != 0.0
+
+
+def test_clear_resets_evicted_and_causal_filter():
+    window = make_window()
+    for v in samples(CAPACITY + 5):
+        window.append(v)
+    window.clear()
+    assert len(window) == 0
+    assert window.evicted == 0
+    assert window.latest is None
+    # 重新初始化的因果濾波器從第一個樣本的穩態開始
+    assert abs(window.append(1000.0) - 1000.0) < 1e-9
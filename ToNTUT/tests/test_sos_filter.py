@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""sos_filter：逐樣本與整批路徑都要與 scipy.signal.sosfilt 一致，且狀態可以互相銜接。"""
+
+import numpy as np
+import pytest
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+from sos_filter import RealTimeFilter, SosFilter
+
+
+def pressure_like(n, seed=0):
+    """約 1006 hPa 上下、週期 4 秒的呼吸波形加雜訊（60 Hz）。"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / 60.0
+    return 1006.5 + 0.3 * np.sin(2 * np.pi * t / 4.0) + 0.02 * rng.standard_normal(n)
+
+
+@pytest.fixture
+def sos():
+    return butter(4, 2.0, btype="low", fs=60.0, output="sos")
+
+
+def test_process_matches_sosfilt(sos):
+    x = pressure_like(600)
+    zi = sosfilt_zi(sos)
+    expected, _ = sosfilt(sos, x, zi=zi * x[0])
+
+    f = SosFilter(sos, zi=zi, initial_value=x[0])
+    got = np.array([f.process(v) for v in x])
+
+    np.testing.assert_allclose(got, expected, rtol=0, atol=1e-9)
+
+
+def test_process_block_matches_sosfilt(sos):
+    x = pressure_like(600, seed=1)
+    zi = sosfilt_zi(sos)
+    expected, expected_zf = sosfilt(sos, x, zi=zi * x[0])
+
+    f = SosFilter(sos, zi=zi, initial_value=x[0])
+    got = f.process_block(x)
+
+    np.testing.assert_allclose(got, expected, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(f.zi, expected_zf, rtol=0, atol=1e-9)
+
+
+def test_process_block_continues_per_sample_state(sos):
+    # 交錯使用兩條路徑（如同引擎在小批次逐樣本、大批次整批），結果要與全程逐樣本相同
+    x = pressure_like(500, seed=2)
+    zi = sosfilt_zi(sos)
+    scalar = SosFilter(sos, zi=zi, initial_value=x[0])
+    mixed = SosFilter(sos, zi=zi, initial_value=x[0])
+
+    expected = np.array([scalar.process(v) for v in x])
+    got = np.concatenate([
+        [mixed.process(v) for v in x[:37]],
+        mixed.process_block(x[37:240]),
+        [mixed.process(v) for v in x[240:241]],
+        mixed.process_block(x[241:]),
+    ])
+
+    np.testing.assert_allclose(got, expected, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(mixed.zi, scalar.zi, rtol=0, atol=1e-9)
+
+
+def test_process_block_empty_keeps_state(sos):
+    f = SosFilter(sos, zi=sosfilt_zi(sos), initial_value=1006.5)
+    before = f.zi
+    assert f.process_block([]).size == 0
+    np.testing.assert_array_equal(f.zi, before)
+
+
+def test_real_time_filter_starts_at_steady_state():
+    f = RealTimeFilter(4, 2.0, 60.0, initial_value=1006.5)
+    out = f.process_block(np.full(120, 1006.5))
+    np.testing.assert_allclose(out, 1006.5, rtol=0, atol=1e-9)
+
+
+def test_rejects_bad_shape():
+    with pytest.raises(ValueError):
+        SosFilter(np.ones((2, 5)))
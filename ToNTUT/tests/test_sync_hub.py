@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""sync_hub.Subscriber：對方不讀（drain 一直不完成）時，進度要合併成最新一筆、佇列滿時丟最舊的。"""
+
+import asyncio
+
+import sync_hub
+from sync_hub import Subscriber
+
+PROGRESS = 1
+
+
+class StuckWriter:
+    """drain() 在 release() 之前永遠不完成的 StreamWriter 替身，記錄所有寫入。"""
+    def __init__(self):
+        self.written = []
+        self.closed = False
+        self._gate = asyncio.Event()
+
+    def write(self, data):
+        self.written.append(data)
+
+    async def drain(self):
+        await self._gate.wait()
+
+    def release(self):
+        self._gate.set()
+
+    def close(self):
+        self.closed = True
+
+
+async def settle(sub=None):
+    """讓送出 task 跑到下一個 await；給定 sub 時等到它的佇列送完（每次 wait_for(drain) 要多跑幾輪事件迴圈）。"""
+    for _ in range(100):
+        await asyncio.sleep(0)
+        if sub is None or not sub.queue:
+            break
+    await asyncio.sleep(0)
+
+
+def test_offer_data_coalesces_and_drops_oldest_while_drain_is_stuck():
+    async def run():
+        writer = StuckWriter()
+        sub = Subscriber(writer, ("test", 0), encode=bytes, capacity=4)
+
+        sub.offer_data(b"progress 0", PROGRESS)
+        await settle()
+        # 第一筆已寫出，送出 task 卡在 drain()
+        assert writer.written == [b"progress 0"]
+
+        for i in range(1, 11):
+            sub.offer_data(b"progress %d" % i, PROGRESS)
+        assert sub.coalesced == 9
+        assert len(sub.queue) == 1
+
+        for i in range(5):
+            sub.offer_data(b"cycle %d" % i)
+        # 佇列容量 4：progress 10 與 cycle 0 依序被擠掉
+        assert sub.dropped == 2
+        assert [data for _, data in sub.queue] == [b"cycle 1", b"cycle 2", b"cycle 3", b"cycle 4"]
+
+        # 被擠掉的進度不再是合併目標，新的進度重新排入（又擠掉最舊的 cycle 1）
+        sub.offer_data(b"progress 11", PROGRESS)
+        sub.offer_data(b"progress 12", PROGRESS)
+        assert sub.dropped == 3
+        assert sub.coalesced == 10
+        assert writer.written == [b"progress 0"]
+
+        writer.release()
+        await settle(sub)
+        assert writer.written == [b"progress 0", b"cycle 2", b"cycle 3", b"cycle 4", b"progress 12"]
+        assert writer.written[-1] == b"progress 12"
+        assert sub.stats() == {"depth": 0, "queued": 8, "sent": 5, "coalesced": 10, "dropped": 3}
+        assert not sub.closed
+        sub.close()
+
+    asyncio.run(run())
+
+
+def test_newest_progress_is_written_after_stuck_drain():
+    async def run():
+        writer = StuckWriter()
+        sub = Subscriber(writer, ("test", 0), encode=bytes, capacity=8)
+        sub.offer_data(b"0.300", PROGRESS)
+        await settle()
+        for i in range(1, 200):
+            sub.offer_data(b"%.3f" % (0.3 + i * 0.001), PROGRESS)
+        assert sub.coalesced == 198
+        assert sub.dropped == 0
+
+        writer.release()
+        await settle(sub)
+        assert writer.written == [b"0.300", b"0.499"]
+        sub.close()
+
+    asyncio.run(run())
+
+
+def test_drain_that_never_completes_closes_after_send_timeout(monkeypatch):
+    monkeypatch.setattr(sync_hub, "SEND_TIMEOUT", 0.05)
+    errors = []
+
+    async def run():
+        writer = StuckWriter()
+        sub = Subscriber(writer, ("test", 0), encode=bytes, capacity=4, on_error=errors.append)
+        sub.offer_data(b"progress 0", PROGRESS)
+        await asyncio.sleep(0.2)
+        assert sub.closed
+        assert writer.closed
+        assert errors == [sub]
+        # 關閉後的資料直接忽略
+        sub.offer_data(b"progress 1", PROGRESS)
+        assert sub.queued == 1
+
+    asyncio.run(run())
+
+
+def test_udp_path_bypasses_queue():
+    sent = []
+
+    async def run():
+        writer = StuckWriter()
+        sub = Subscriber(writer, ("test", 0), encode=bytes, send_datagram=lambda d: sent.append(d) or True)
+        for i in range(3):
+            sub.offer_data(b"%d" % i, PROGRESS)
+        await settle()
+        assert sent == [b"0", b"1", b"2"]
+        assert writer.written == []
+        assert (sub.sent, sub.coalesced, sub.queued) == (3, 0, 0)
+        sub.close()
+
+    asyncio.run(run())
+
+
+def test_close_while_drain_completes_stops_the_task():
+    # drain() 與 close() 在同一輪事件迴圈完成時，wait_for 可能吞掉取消；task 仍要結束
+    async def run():
+        writer = StuckWriter()
+        sub = Subscriber(writer, ("test", 0), encode=bytes)
+        sub.offer_data(b"progress 0", PROGRESS)
+        await settle()
+        writer.release()
+        await asyncio.sleep(0)
+        sub.close()
+        await asyncio.wait_for(asyncio.shield(sub._task), 1.0)
+        assert sub._task.done()
+
+    asyncio.run(run())
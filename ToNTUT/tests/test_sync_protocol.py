@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""sync_protocol：訊框編解碼、FrameSequencer 重新編號、SequenceTracker 跳號/過期統計與 FrameStream 切框。"""
+
+import asyncio
+
+import pytest
+
+from sync_protocol import (CYCLE_FRAME_SIZE, CYCLE_STOP, CYCLE_WRAP, PROGRESS_FRAME_SIZE, STOP_FRAME_SIZE,
+                           STOP_PARKED, TYPE_CYCLE, TYPE_PROGRESS, TYPE_STOP, CycleFrameWriter, FrameError,
+                           FrameSequencer, FrameStream, ProgressFrameWriter, SequenceTracker, StopFrameWriter,
+                           decode_cycle, decode_progress, decode_stop, frame_type, progress_text)
+
+
+def progress_frame(writer, t_ns=1000, progress=0.5):
+    return bytes(writer.pack(t_ns, progress, 4.0, 1, 0))
+
+
+def cycle_frame(writer, t_ns=1000):
+    return bytes(writer.pack(t_ns, t_ns - 500, 4.0, 0.45, 0.3, 0.4, 1, 0, -1, CYCLE_WRAP))
+
+
+def test_progress_round_trip():
+    frame = ProgressFrameWriter().pack(123456789, 0.625, 3.5, 1, 0)
+    assert len(frame) == PROGRESS_FRAME_SIZE
+    assert frame_type(frame) == TYPE_PROGRESS
+    decoded = decode_progress(frame)
+    assert decoded.seq == 1
+    assert decoded.t_ns == 123456789
+    assert decoded.progress == pytest.approx(0.625)
+    assert decoded.target_period == pytest.approx(3.5)
+    assert (decoded.machine_state, decoded.user_state) == (1, 0)
+    assert progress_text(frame) == b"SYNC_PROGRESS:0.625\n"
+
+
+def test_cycle_round_trip():
+    frame = CycleFrameWriter().pack(2_000_000_000, 1_500_000_000, 4.25, 0.55, 0.3, 0.4, 1, 1, -1, CYCLE_WRAP)
+    assert len(frame) == CYCLE_FRAME_SIZE
+    assert frame_type(frame) == TYPE_CYCLE
+    decoded = decode_cycle(frame)
+    assert decoded.seq == 1
+    assert (decoded.sent_ns, decoded.cycle_start_ns) == (2_000_000_000, 1_500_000_000)
+    assert decoded.period == pytest.approx(4.25)
+    assert decoded.progress == pytest.approx(0.55)
+    assert (decoded.progress_min, decoded.progress_range) == (pytest.approx(0.3), pytest.approx(0.4))
+    assert (decoded.machine_state, decoded.user_state, decoded.direction, decoded.reason) == (1, 1, -1, CYCLE_WRAP)
+
+
+def test_cycle_stop_round_trip():
+    decoded = decode_cycle(CycleFrameWriter().pack(5, 0, 0.0, 0.0, 0.0, 0.0, -1, 0, 0, CYCLE_STOP))
+    assert decoded.period == 0.0
+    assert decoded.reason == CYCLE_STOP
+
+
+def test_stop_round_trip():
+    frame = StopFrameWriter().pack(900, 800, STOP_PARKED)
+    assert len(frame) == STOP_FRAME_SIZE
+    assert frame_type(frame) == TYPE_STOP
+    assert tuple(decode_stop(frame)) == (1, 900, 800, STOP_PARKED)
+
+
+def test_writer_seq_increments_and_reuses_buffer():
+    writer = ProgressFrameWriter()
+    first = writer.pack(1, 0.3, 4.0, 1, 0)
+    second = writer.pack(2, 0.4, 4.0, 1, 0)
+    assert first is second
+    assert decode_progress(second).seq == 2
+
+
+def test_decode_rejects_wrong_type_and_magic():
+    progress = progress_frame(ProgressFrameWriter())
+    with pytest.raises(FrameError):
+        decode_cycle(progress)
+    with pytest.raises(FrameError):
+        decode_progress(b"\x00" + progress[1:])
+
+
+def test_sequencer_numbers_each_type_independently():
+    sequencer = FrameSequencer()
+    progress = progress_frame(ProgressFrameWriter())
+    cycle = cycle_frame(CycleFrameWriter())
+
+    seqs = []
+    for frame in (progress, progress, cycle, progress, cycle):
+        decode = decode_progress if frame_type(frame) == TYPE_PROGRESS else decode_cycle
+        seqs.append((frame_type(frame), decode(sequencer.stamp(frame)).seq))
+    assert seqs == [(TYPE_PROGRESS, 1), (TYPE_PROGRESS, 2), (TYPE_CYCLE, 1), (TYPE_PROGRESS, 3), (TYPE_CYCLE, 2)]
+    # 只改 seq，原訊框與其他欄位不變
+    assert decode_progress(progress).seq == 1
+    stamped = sequencer.stamp(progress)
+    assert stamped[:4] == progress[:4] and stamped[8:] == progress[8:]
+
+
+def test_sequencer_wraps_at_32_bits():
+    sequencer = FrameSequencer()
+    sequencer.seqs[TYPE_PROGRESS] = 0xFFFFFFFF
+    frame = progress_frame(ProgressFrameWriter())
+    assert decode_progress(sequencer.stamp(frame)).seq == 0
+
+
+def test_restarted_engine_keeps_connection_seq_continuous():
+    # 兩次 ACTIVATE：引擎端 seq 都從 1 開始，經過同一個 sequencer 後接收端沒有 stale 也沒有假的掉包
+    sequencer = FrameSequencer()
+    tracker = SequenceTracker()
+    for _ in range(2):
+        progress_writer, cycle_writer = ProgressFrameWriter(), CycleFrameWriter()
+        for i in range(50):
+            tracker.update(decode_progress(sequencer.stamp(progress_frame(progress_writer, t_ns=i))), recv_ns=i)
+            if i % 10 == 0:
+                tracker.update(decode_cycle(sequencer.stamp(cycle_frame(cycle_writer, t_ns=i))), recv_ns=i)
+    assert tracker.received == 110
+    assert tracker.stale == 0
+    assert tracker.dropped == 0
+
+
+def test_tracker_counts_gaps_and_stale_per_type():
+    progress_writer, cycle_writer = ProgressFrameWriter(), CycleFrameWriter()
+    progress = [decode_progress(progress_frame(progress_writer, t_ns=i)) for i in range(10)]
+    cycles = [decode_cycle(cycle_frame(cycle_writer, t_ns=i)) for i in range(3)]
+    tracker = SequenceTracker()
+
+    assert tracker.update(progress[0], recv_ns=0)
+    assert tracker.update(cycles[0], recv_ns=0)        # 不同種類，不算跳號
+    assert tracker.update(progress[4], recv_ns=4)      # seq 1 -> 5：遺失 3 個
+    assert tracker.dropped == 3
+    assert not tracker.update(progress[2], recv_ns=5)  # 亂序的舊訊框
+    assert not tracker.update(progress[4], recv_ns=5)  # 重複
+    assert tracker.stale == 2
+    assert tracker.update(cycles[2], recv_ns=6)        # CYCLE seq 1 -> 3：遺失 1 個
+    assert tracker.dropped == 4
+    assert tracker.last_seq == {type(progress[0]): 5, type(cycles[0]): 3}
+    assert tracker.received == 4
+
+
+def test_tracker_handles_seq_wraparound():
+    sequencer = FrameSequencer()
+    sequencer.seqs[TYPE_PROGRESS] = 0xFFFFFFFE
+    writer = ProgressFrameWriter()
+    frames = [decode_progress(sequencer.stamp(progress_frame(writer))) for _ in range(3)]
+    assert [f.seq for f in frames] == [0xFFFFFFFF, 0, 1]
+
+    tracker = SequenceTracker()
+    assert all(tracker.update(f, recv_ns=0) for f in frames)
+    assert tracker.dropped == 0 and tracker.stale == 0
+
+
+def test_tracker_relative_latency():
+    writer = ProgressFrameWriter()
+    tracker = SequenceTracker()
+    tracker.update(decode_progress(progress_frame(writer, t_ns=1_000_000)), recv_ns=6_000_000)
+    tracker.update(decode_progress(progress_frame(writer, t_ns=2_000_000)), recv_ns=9_000_000)
+    assert tracker.latency_ms == pytest.approx(2.0)
+    assert tracker.latency_ms_max == pytest.approx(2.0)
+
+
+def read_all(data, chunk=None):
+    """把 data 餵進 StreamReader（可切成小塊），讀到 EOF 為止。"""
+    async def run():
+        reader = asyncio.StreamReader()
+        step = chunk or len(data) or 1
+        for i in range(0, len(data), step):
+            reader.feed_data(data[i:i + step])
+        reader.feed_eof()
+        stream = FrameStream(reader)
+        frames = []
+        while True:
+            frame = await stream.read_frame()
+            if not frame:
+                return frames
+            frames.append(frame)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("chunk", [None, 1, 7])
+def test_frame_stream_splits_mixed_frames(chunk):
+    frames = [progress_frame(ProgressFrameWriter()), cycle_frame(CycleFrameWriter()),
+              bytes(StopFrameWriter().pack(1, 0, STOP_PARKED)), progress_frame(ProgressFrameWriter(), progress=0.7)]
+    assert read_all(b"".join(frames), chunk) == frames
+
+
+def test_frame_stream_truncated_frame_is_eof():
+    frame = progress_frame(ProgressFrameWriter())
+    assert read_all(frame + frame[:-3]) == [frame]
+    assert read_all(b"") == []
+
+
+def test_frame_stream_rejects_bad_header():
+    with pytest.raises(FrameError):
+        read_all(b"SYNC_PROGRESS:0.500\n")